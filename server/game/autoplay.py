@@ -0,0 +1,98 @@
+"""
+Простая стратегия «бота» поверх состояния из get_game_state().
+
+Используется бенчмарками и нагрузочным тестом: по состоянию, которое видит
+игрок, выбирает легальный ход в формате тела запроса make_move_view.
+"""
+import typing
+
+RANK_VALUES = {'6': 6, '7': 7, '8': 8, '9': 9, '10': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 14}
+
+
+def _rank_suit(card) -> tuple[str, str]:
+    """Карта из состояния: словарь с rank/suit или строковый id вида '10-hearts'."""
+    if isinstance(card, dict):
+        if 'rank' in card:
+            return card['rank'], card['suit']
+        card = card['id']
+    rank, _, suit = card.partition('-')
+    return rank, suit
+
+
+def _can_beat(attack_card, defense_card, trump_suit) -> bool:
+    attack_rank, attack_suit = _rank_suit(attack_card)
+    defense_rank, defense_suit = _rank_suit(defense_card)
+    if defense_suit == attack_suit:
+        return RANK_VALUES[defense_rank] > RANK_VALUES[attack_rank]
+    return defense_suit == trump_suit and attack_suit != trump_suit
+
+
+def _cheapest(indices, hand, trump_suit) -> int:
+    def weight(i):
+        rank, suit = _rank_suit(hand[i])
+        return (suit == trump_suit, RANK_VALUES[rank])
+    return min(indices, key=weight)
+
+
+def choose_move(state: dict, player_id: int) -> typing.Optional[dict]:
+    """Тело запроса хода для player_id или None, если сейчас ходить не ему."""
+    if state.get('status') != 'playing' or not state.get('is_game_initialized'):
+        return None
+
+    me = next((p for p in state['players'] if p['id'] == player_id), None)
+    if me is None:
+        return None
+    hand = me['cards']
+    trump_suit = state.get('trump_suit')
+    table = state.get('table') or []
+
+    if player_id == state.get('defender_id'):
+        unbeaten = [i for i, pair in enumerate(table) if not pair.get('defense_card')]
+        if not unbeaten:
+            return None
+        attack_card = table[unbeaten[0]]['attack_card']
+        options = [i for i, card in enumerate(hand) if _can_beat(attack_card, card, trump_suit)]
+        if not options:
+            return {'action_type': 'take'}
+        return {
+            'action_type': 'defend',
+            'attack_card_table_index': unbeaten[0],
+            'defense_card_hand_index': _cheapest(options, hand, trump_suit),
+        }
+
+    if player_id != state.get('attacker_id'):
+        return None
+
+    if not table:
+        if not hand:
+            return None
+        return {'action_type': 'attack', 'card_indices': [_cheapest(range(len(hand)), hand, trump_suit)]}
+
+    if any(not pair.get('defense_card') for pair in table):
+        # Ждем защиту
+        return None
+
+    ranks_on_table = set()
+    for pair in table:
+        ranks_on_table.add(_rank_suit(pair['attack_card'])[0])
+        ranks_on_table.add(_rank_suit(pair['defense_card'])[0])
+    defender = next((p for p in state['players'] if p['id'] == state.get('defender_id')), None)
+    throw_ins = [
+        i for i, card in enumerate(hand)
+        if _rank_suit(card)[0] in ranks_on_table and _rank_suit(card)[1] != trump_suit
+    ]
+    if throw_ins and len(table) < 6 and defender and defender['card_count'] > 0:
+        return {'action_type': 'attack', 'card_indices': [throw_ins[0]]}
+    return {'action_type': 'pass_bito'}
+
+
+def apply_move(game_logic, player_user, move: dict) -> dict:
+    """Выполняет ход из choose_move напрямую через методы DurakGame."""
+    action_type = move['action_type']
+    if action_type == 'attack':
+        return game_logic.attack(player_user, move['card_indices'])
+    if action_type == 'defend':
+        return game_logic.defend(player_user, move['attack_card_table_index'], move['defense_card_hand_index'])
+    if action_type == 'take':
+        return game_logic.take_cards_action(player_user)
+    return game_logic.pass_or_bito_action(player_user)
@@ -0,0 +1,287 @@
+"""
+Воспроизводимые бенчмарки движка DurakGame и горячих view.
+
+Запуск: ``python manage.py bench_game`` (см. команду). Все замеры идут во
+временной SQLite-базе рядом с проектом, партии разыгрываются ботом из
+autoplay с фиксированным seed, так что числа сравнимы между прогонами.
+"""
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from . import tasks
+from .autoplay import apply_move, choose_move
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def temporary_database():
+    """Отдельная файловая SQLite-база на время замеров (рабочая БД не трогается)."""
+    fd, path = tempfile.mkstemp(prefix='durak-bench-', suffix='.sqlite3')
+    os.close(fd)
+    test_settings = settings.DATABASES['default'].setdefault('TEST', {})
+    previous_name = test_settings.get('NAME')
+    test_settings['NAME'] = path
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        # Таймеры хода и рассылку не трогаем: мерим сам движок и view. Фоновых
+        # воркеров задач нет - задачи выполняются в этом потоке (run_pending)
+        with override_settings(GAME_TURN_TIMEOUT=0, GAME_TASK_WORKERS=0, ALLOWED_HOSTS=['*']):
+            yield path
+            tasks.run_pending()
+    finally:
+        # Воркер, запущенный раньше, не должен писать в удаляемую базу
+        tasks.runner.stop()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if previous_name is None:
+            test_settings.pop('NAME', None)
+        else:
+            test_settings['NAME'] = previous_name
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+class Timings:
+    """Накопитель длительностей по именам замеров."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+
+    @contextlib.contextmanager
+    def measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append(time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        result = {}
+        for name, values in sorted(self.samples.items()):
+            ordered = sorted(values)
+            result[name] = {
+                'n': len(ordered),
+                'mean_ms': statistics.fmean(ordered) * 1000,
+                'median_ms': statistics.median(ordered) * 1000,
+                'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+            }
+        return result
+
+
+def create_room(player_count: int, prefix: str, start: bool = True):
+    from players.models import Player
+    from .models import GameRoom
+
+    players = [
+        Player.objects.create_user(username=f'{prefix}_{i}', password=None)
+        for i in range(player_count)
+    ]
+    room = GameRoom.objects.create(creator=players[0], max_players=player_count)
+    room.players.add(*players)
+    for player in players:
+        player.current_room = room
+    Player.objects.bulk_update(players, ['current_room'])
+    if start:
+        # Seed из random: при random.seed(...) прогона раздачи повторяются
+        room.start_game(seed=f'{random.getrandbits(128):032x}')
+    return room, players
+
+
+def _acting_move(game_logic):
+    """Ход того игрока, от которого сейчас ждут действия."""
+    for player_user in (game_logic.players[game_logic.defender_index], game_logic.players[game_logic.attacker_index]):
+        move = choose_move(game_logic.get_game_state(for_player_user_obj=player_user), player_user.id)
+        if move:
+            return player_user, move
+    return None, None
+
+
+def bench_engine_moves(timings: Timings, games: int, seed: int):
+    """Полные партии через методы DurakGame (с сохранением в БД, как в бою)."""
+    from .game_logic import DurakGame
+
+    method_names = {'attack': 'attack', 'defend': 'defend', 'take': 'take_cards_action', 'pass_bito': 'pass_or_bito_action'}
+    for game_no in range(games):
+        for player_count in (2, 3, 4):
+            random.seed(seed + game_no * 10 + player_count)
+            room, _ = create_room(player_count, f'eng{game_no}_{player_count}')
+            for _ in range(2000):
+                game_logic = DurakGame(room)
+                if game_logic.game_model_instance.status != 'playing':
+                    break
+                player_user, move = _acting_move(game_logic)
+                if move is None:
+                    break
+                with timings.measure(f"engine.{method_names[move['action_type']]}"):
+                    apply_move(game_logic, player_user, move)
+            # Расчет партии - вне замеров, как у воркера задач
+            tasks.run_pending()
+
+
+def bench_game_state(timings: Timings, repeat: int, seed: int):
+    from .game_logic import DurakGame
+
+    for player_count in (2, 3, 4):
+        random.seed(seed + player_count)
+        room, players = create_room(player_count, f'state_{player_count}')
+        game_logic = DurakGame(room)
+        # Немного разыгрываем, чтобы на столе были карты
+        for _ in range(3):
+            player_user, move = _acting_move(game_logic)
+            if move:
+                apply_move(game_logic, player_user, move)
+        for _ in range(repeat):
+            with timings.measure(f'engine.get_game_state.{player_count}p'):
+                game_logic.get_game_state(for_player_user_obj=players[0])
+
+
+def bench_json_encoding(timings: Timings, repeat: int, seed: int):
+    """Сериализация состояния: json из stdlib, fastjson (orjson, если есть) и MessagePack-кодек сокета."""
+    from .fastjson import dumps_bytes
+    from .game_logic import DurakGame
+    from .wire import msgpack_codec
+
+    for player_count in (2, 3, 4):
+        random.seed(seed + player_count)
+        room, players = create_room(player_count, f'json_{player_count}')
+        game_logic = DurakGame(room)
+        for _ in range(3):
+            player_user, move = _acting_move(game_logic)
+            if move:
+                apply_move(game_logic, player_user, move)
+        state = game_logic.get_game_state(for_player_user_obj=players[0])
+        for _ in range(repeat):
+            with timings.measure(f'json.stdlib.state.{player_count}p'):
+                json.dumps(state)
+            with timings.measure(f'json.fast.state.{player_count}p'):
+                dumps_bytes(state)
+            if msgpack_codec is not None:
+                with timings.measure(f'msgpack.state.{player_count}p'):
+                    msgpack_codec.encode(state)
+
+
+def bench_save_round_trip(timings: Timings, repeat: int, seed: int):
+    from .game_logic import DurakGame
+
+    random.seed(seed)
+    room, _ = create_room(4, 'save')
+    game_logic = DurakGame(room)
+    for _ in range(repeat):
+        with timings.measure('engine.save_game_state'):
+            game_logic.save_game_state()
+        with timings.measure('engine.load_game_state'):
+            game_logic = DurakGame(room)
+
+
+def bench_views(timings: Timings, games: int, seed: int):
+    """make_move_view и game_status через тестовый клиент Django (middleware, сессии, JSON)."""
+    from .game_logic import DurakGame
+
+    for game_no in range(games):
+        random.seed(seed + 100 + game_no)
+        room, players = create_room(2, f'view{game_no}')
+        clients = {}
+        for player in players:
+            client = Client()
+            client.force_login(player)
+            clients[player.id] = client
+        status_url = reverse('game:game_status', args=[room.id])
+        move_url = reverse('game:make_move', args=[room.id])
+
+        for _ in range(2000):
+            game_logic = DurakGame(room)
+            if game_logic.game_model_instance.status != 'playing':
+                break
+            player_user, move = _acting_move(game_logic)
+            if move is None:
+                break
+            client = clients[player_user.id]
+            with timings.measure('view.game_status'):
+                client.get(status_url)
+            with timings.measure('view.make_move_view'):
+                response = client.post(move_url, data=json.dumps(move), content_type='application/json')
+            if response.status_code != 200:
+                logger.warning("make_move_view returned %s: %s", response.status_code, response.content[:200])
+                break
+        tasks.run_pending()
+
+
+def bench_turn_timers(timings: Timings, timers: int, repeat: int, seed: int):
+    """`timers` одновременных таймеров хода в колесе: постановка, перестановка после хода и срабатывание всех."""
+    from .timers import TimerWheel
+
+    rng = random.Random(seed)
+    timeout = getattr(settings, 'GAME_TURN_TIMEOUT', 30) or 30
+    label = f'{timers // 1000}k' if timers >= 1000 else str(timers)
+    for _ in range(max(3, repeat // 40)):
+        wheel = TimerWheel()
+        fired = []
+        with timings.measure(f'timers.schedule.{label}'):
+            for room_id in range(timers):
+                wheel.schedule(room_id, rng.uniform(0, timeout), fired.append, room_id)
+        # Каждый ход переставляет таймер своей комнаты
+        with timings.measure(f'timers.rearm.{label}'):
+            for room_id in range(timers):
+                wheel.schedule(room_id, rng.uniform(0, timeout), fired.append, room_id)
+        with timings.measure(f'timers.expire.{label}'):
+            while wheel:
+                for timer in wheel.advance():
+                    timer.callback(*timer.args)
+        if len(fired) != timers:
+            logger.warning("Timer wheel fired %s of %s timers", len(fired), timers)
+
+
+def run_suite(games: int = 3, repeat: int = 200, seed: int = 1, timers: int = 10000) -> dict:
+    timings = Timings()
+    bench_turn_timers(timings, timers, repeat, seed)
+    with temporary_database():
+        bench_engine_moves(timings, games, seed)
+        bench_game_state(timings, repeat, seed)
+        bench_json_encoding(timings, repeat, seed)
+        bench_save_round_trip(timings, repeat, seed)
+        bench_views(timings, games, seed)
+    return {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'platform': platform.platform(),
+            'games': games,
+            'repeat': repeat,
+            'seed': seed,
+            'timers': timers,
+        },
+        'results': timings.summary(),
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float, metric: str = 'median_ms') -> list[dict]:
+    """Сравнение с базовой линией; regression=True, если замер медленнее больше чем на threshold."""
+    rows = []
+    for name, stats in sorted(current['results'].items()):
+        base = baseline.get('results', {}).get(name)
+        if not base or not base.get(metric):
+            rows.append({'name': name, 'baseline': None, 'current': stats[metric], 'change': None, 'regression': False})
+            continue
+        change = stats[metric] / base[metric] - 1
+        rows.append({
+            'name': name,
+            'baseline': base[metric],
+            'current': stats[metric],
+            'change': change,
+            'regression': change > threshold,
+        })
+    return rows
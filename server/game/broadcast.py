@@ -0,0 +1,174 @@
+"""
+Исходящий конвейер комнаты внутри процесса.
+
+Channels доставляет групповое сообщение каждому сокету отдельно, и раньше
+каждый GameConsumer сам делал json.dumps и send. Теперь копии одного события
+сводятся в RoomPipeline комнаты (дубликаты отсекаются по id конверта), события
+за один тик (GAME_BROADCAST_TICK, по умолчанию 16 мс) склеиваются в один
+кадр, кадр сериализуется один раз на кодек (JSON или MessagePack, см. wire)
+и раскладывается по ограниченным очередям
+сокетов. Если сокет не успевает читать, его очередь сбрасывается и клиенту
+уходит 'resync' — он догоняется через resume из буфера outbox.
+
+Сообщения с состоянием партии несут руки всех игроков в 'hands'. Такие
+пачки кодируются отдельно на каждого игрока (personalize): в его копии
+заполнены только его карты, а 'hands' не уходит никому.
+"""
+import asyncio
+import logging
+from collections import deque
+from django.conf import settings
+from .wire import CODECS, json_codec
+
+logger = logging.getLogger(__name__)
+
+# Неизменные кадры кодируем один раз на кодек
+RESYNC_FRAMES = {codec: codec.encode({'action': 'resync'}) for codec in CODECS.values()}
+
+
+def personalize(message: dict, player_id) -> dict:
+    """Копия сообщения для игрока: вместо 'hands' - его карты в state.players."""
+    hands = message.get('hands')
+    if hands is None:
+        return message
+    personal = {key: value for key, value in message.items() if key != 'hands'}
+    state = message.get('state')
+    hand = hands.get(str(player_id)) if player_id is not None else None
+    if state is not None and hand is not None:
+        personal['state'] = {**state, 'players': [
+            {**player, 'cards': hand, 'is_current_player_for_state': True} if player['id'] == player_id else player
+            for player in state['players']
+        ]}
+    return personal
+
+
+class SocketQueue:
+    """Ограниченная очередь кадров одного сокета и задача, которая её отправляет."""
+
+    def __init__(self, send, size: int, codec=json_codec, player_id=None):
+        self.send = send
+        self.codec = codec
+        self.player_id = player_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+        self.task = asyncio.get_running_loop().create_task(self._writer())
+
+    def put(self, frame):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Медленный клиент: не копим память, а просим его догнаться
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_FRAMES[self.codec])
+
+    def resynced(self):
+        self.overflowed = False
+
+    async def _writer(self):
+        while True:
+            frame = await self.queue.get()
+            if self.codec.binary:
+                await self.send(bytes_data=frame)
+            else:
+                await self.send(text_data=frame)
+
+    def close(self):
+        self.task.cancel()
+
+
+class RoomPipeline:
+    def __init__(self, room_id, tick: float):
+        self.room_id = room_id
+        self.tick = tick
+        self.sockets: set[SocketQueue] = set()
+        self.pending: list[dict] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # Последние id рассылок: каждая копия группового события приходит в свой consumer
+        self._seen: set = set()
+        self._seen_order: deque = deque()
+
+    def _is_duplicate(self, message: dict, message_id) -> bool:
+        # Конверт без id (старый отправитель) - ключ по (epoch, seq), если он есть
+        key = message_id
+        if key is None:
+            if message.get('seq') is None:
+                return False
+            key = (message.get('epoch'), message['seq'])
+        if key in self._seen:
+            return True
+        self._seen.add(key)
+        self._seen_order.append(key)
+        if len(self._seen_order) > 1024:
+            self._seen.discard(self._seen_order.popleft())
+        return False
+
+    def ingest(self, message: dict, message_id=None):
+        if self._is_duplicate(message, message_id):
+            return
+        self.pending.append(message)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.tick, self.flush)
+
+    def flush(self):
+        self._flush_handle = None
+        if not self.pending:
+            return
+        messages, self.pending = self.pending, []
+        private = any('hands' in message for message in messages)
+        frames = {}
+        for socket_queue in self.sockets:
+            # Без рук в пачке кадр общий для кодека, с руками - свой у каждого игрока
+            key = (socket_queue.codec, socket_queue.player_id) if private else socket_queue.codec
+            frame = frames.get(key)
+            if frame is None:
+                batch = [personalize(message, socket_queue.player_id) for message in messages] if private else messages
+                frame = frames[key] = encode_frame(batch, socket_queue.codec)
+            socket_queue.put(frame)
+
+    def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+
+def encode_frame(messages: list[dict], codec=json_codec):
+    """Один кадр на пачку: одиночное сообщение уходит как есть, несколько — как 'batch'."""
+    if len(messages) == 1:
+        return codec.encode(messages[0])
+    return codec.encode({'action': 'batch', 'messages': messages})
+
+
+class PipelineRegistry:
+    def __init__(self):
+        self._rooms: dict[str, RoomPipeline] = {}
+
+    @property
+    def tick(self) -> float:
+        return getattr(settings, 'GAME_BROADCAST_TICK', 0.016)
+
+    @property
+    def queue_size(self) -> int:
+        return getattr(settings, 'GAME_SOCKET_QUEUE_SIZE', 64)
+
+    def subscribe(self, room_id, send, codec=json_codec, player_id=None) -> tuple[RoomPipeline, SocketQueue]:
+        room_id = str(room_id)
+        pipeline = self._rooms.get(room_id)
+        if pipeline is None:
+            pipeline = self._rooms[room_id] = RoomPipeline(room_id, self.tick)
+        socket_queue = SocketQueue(send, self.queue_size, codec, player_id)
+        pipeline.sockets.add(socket_queue)
+        return pipeline, socket_queue
+
+    def unsubscribe(self, pipeline: RoomPipeline, socket_queue: SocketQueue):
+        socket_queue.close()
+        pipeline.sockets.discard(socket_queue)
+        if not pipeline.sockets and self._rooms.get(pipeline.room_id) is pipeline:
+            pipeline.close()
+            del self._rooms[pipeline.room_id]
+
+
+pipelines = PipelineRegistry()
@@ -0,0 +1,91 @@
+"""
+Карты и их спрайт-атлас.
+
+В состоянии игры карта передается только своим id вида '10-hearts'; картинку
+клиент берет из общего атласа static/cards/atlas.{webp,png} по CSS-классу
+card-<id> (см. команду build_card_atlas и тег {% card_sprite %}).
+
+Колода партии тасуется из ее seed (shuffled_deck): 128 случайных бит из
+CSPRNG ОС, развернутых в поток SHA-256 в режиме счетчика. Один и тот же seed
+всегда дает одну и ту же раздачу, а угадать раздачу, не зная seed, нельзя.
+"""
+import hashlib
+import os
+import secrets
+import typing
+from django.conf import settings
+
+SUITS = ['hearts', 'diamonds', 'clubs', 'spades']
+RANKS = ['6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+SUIT_SYMBOLS = {'hearts': '♥', 'diamonds': '♦', 'clubs': '♣', 'spades': '♠'}
+BACK_ID = 'back'
+
+ATLAS_DIR = 'cards'
+ATLAS_BASENAME = 'atlas'
+
+
+def card_id(card: typing.Optional[dict]) -> typing.Optional[str]:
+    if not card:
+        return None
+    return card.get('id') or f"{card['rank']}-{card['suit']}"
+
+
+def parse_card_id(card_id_str: str) -> tuple[str, str]:
+    rank, _, suit = card_id_str.partition('-')
+    return rank, suit
+
+
+def card_label(card_id_str: typing.Optional[str]) -> str:
+    """'10-hearts' -> '10♥' для подписей и alt."""
+    if not card_id_str or card_id_str == BACK_ID:
+        return 'рубашка'
+    rank, suit = parse_card_id(card_id_str)
+    return f"{rank}{SUIT_SYMBOLS.get(suit, suit)}"
+
+
+def all_card_ids() -> list[str]:
+    """Порядок ячеек атласа: масть - строка, ранг - столбец, рубашка - последней строкой."""
+    return [f"{rank}-{suit}" for suit in SUITS for rank in RANKS] + [BACK_ID]
+
+
+def atlas_dir() -> str:
+    return os.path.join(settings.STATICFILES_DIRS[0], ATLAS_DIR)
+
+
+
+def new_seed() -> str:
+    return secrets.token_hex(16)
+
+
+class SeedStream:
+    """Детерминированные случайные числа из seed: SHA-256(seed || номер блока)."""
+
+    def __init__(self, seed: str):
+        self._seed = bytes.fromhex(seed)
+        self._counter = 0
+        self._buffer = b''
+
+    def _next_u64(self) -> int:
+        if len(self._buffer) < 8:
+            self._buffer += hashlib.sha256(self._seed + self._counter.to_bytes(8, 'big')).digest()
+            self._counter += 1
+        value, self._buffer = int.from_bytes(self._buffer[:8], 'big'), self._buffer[8:]
+        return value
+
+    def randbelow(self, n: int) -> int:
+        """Равномерно из [0, n): значения из "хвоста" 2**64 отбрасываются, чтобы не было смещения."""
+        limit = (1 << 64) - (1 << 64) % n
+        while True:
+            value = self._next_u64()
+            if value < limit:
+                return value % n
+
+
+def shuffled_deck(seed: str) -> list[dict]:
+    """Колода, перетасованная Фишером-Йетсом по потоку из seed."""
+    deck = [{'rank': rank, 'suit': suit, 'id': f"{rank}-{suit}"} for suit in SUITS for rank in RANKS]
+    stream = SeedStream(seed)
+    for i in range(len(deck) - 1, 0, -1):
+        j = stream.randbelow(i + 1)
+        deck[i], deck[j] = deck[j], deck[i]
+    return deck
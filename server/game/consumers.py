@@ -1,12 +1,22 @@
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.utils import timezone
 from .models import GameRoom
+from .broadcast import encode_frame, personalize, pipelines
+from .events import bus
+from .fastjson import dumps, loads
+from .metrics import instrument_ws
+from .profiling import profiled_ws
+from . import outbox
+from .outbox import publish, room_group_name
+from .timers import turn_timers
+from .wire import negotiate
 import logging
 
 logger = logging.getLogger(__name__)
 
+PONG_FRAME = dumps({'type': 'pong'})
+
 
 class GameRoomConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -33,16 +43,15 @@ class GameRoomConsumer(AsyncWebsocketConsumer):
         await self.check_room_status()
 
     async def receive(self, text_data):
-        data = json.loads(text_data)
+        data = loads(text_data)
         if data.get('type') == 'ping':
             await self.update_activity()
-            await self.send(text_data=json.dumps({'type': 'pong'}))
+            await self.send(text_data=PONG_FRAME)
 
     @database_sync_to_async
     def update_activity(self):
-        room = GameRoom.objects.get(id=self.room_id)
-        room.last_activity = timezone.now()
-        room.save()
+        # Один UPDATE без save(): пинг не должен гонять сигналы и перезаписывать всю строку
+        GameRoom.objects.filter(id=self.room_id).update(last_activity=timezone.now())
 
     @database_sync_to_async
     def check_room_status(self):
@@ -62,44 +71,99 @@ class GameRoomConsumer(AsyncWebsocketConsumer):
         return 'active'
 
 class GameConsumer(AsyncWebsocketConsumer):
+    @instrument_ws('connect')
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
-        self.room_group_name = f'game_{self.room_id}'
+        self.room_group_name = room_group_name(self.room_id)
+        turn_timers.register_broadcast_loop()
+        bus.register_loop()
 
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
-        await self.accept()
+        # JSON по умолчанию; MessagePack - если клиент попросил его в Sec-WebSocket-Protocol
+        self.codec, subprotocol = negotiate(self.scope.get('subprotocols'))
+        await self.accept(subprotocol=subprotocol)
+        # Все кадры сокета идут через его ограниченную очередь в конвейере комнаты
+        user = self.scope.get('user')
+        self.player_id = user.id if user is not None and user.is_authenticated else None
+        self.pipeline, self.outbound = pipelines.subscribe(self.room_id, self.send, self.codec, self.player_id)
+        # Клиент запоминает seq/epoch и присылает их в 'resume' после переподключения
+        seq, epoch = await outbox.position(self.room_id)
+        self.outbound.put(self.codec.encode(self.codec.hello({
+            'action': 'hello',
+            'seq': seq,
+            'epoch': epoch,
+        })))
 
+    @instrument_ws('disconnect')
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        if getattr(self, 'outbound', None):
+            pipelines.unsubscribe(self.pipeline, self.outbound)
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        data = self.codec.decode(text_data, bytes_data)
         action = data.get('action')
 
         if action == 'join':
             await self.handle_join(data)
         elif action == 'play_card':
             await self.handle_play_card(data)
+        elif action == 'resume':
+            await self.handle_resume(data)
         # ... другие действия
 
+    @instrument_ws('join')
+    @profiled_ws('join')
     async def handle_join(self, data):
         # Логика присоединения к игре
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'game_message',
-                'message': {
-                    'action': 'player_joined',
-                    'player': data['player']
-                }
-            }
-        )
+        await publish(self.room_id, {
+            'action': 'player_joined',
+            'player': data['player']
+        })
+
+    @instrument_ws('resume')
+    @profiled_ws('resume')
+    async def handle_resume(self, data):
+        """Досылает пропущенные сообщения или, если буфер их уже не хранит, снимок состояния."""
+        try:
+            last_seq = int(data.get('last_seq', 0))
+        except (TypeError, ValueError):
+            last_seq = 0
+
+        self.outbound.resynced()
+        missed = await outbox.since(self.room_id, last_seq, data.get('epoch'))
+        if missed is not None:
+            if missed:
+                self.outbound.put(encode_frame([personalize(message, self.player_id) for message in missed], self.codec))
+            return
+
+        seq, epoch = await outbox.position(self.room_id)
+        snapshot = await self.get_snapshot()
+        self.outbound.put(self.codec.encode({
+            'action': 'snapshot',
+            'seq': seq,
+            'epoch': epoch,
+            **snapshot,
+        }))
+
+    @database_sync_to_async
+    def get_snapshot(self):
+        from .game_logic import DurakGame
+        user = self.scope.get('user')
+        try:
+            room = GameRoom.objects.prefetch_related('players').get(id=self.room_id)
+        except GameRoom.DoesNotExist:
+            return {'room': None, 'state': None}
+        if not user or not user.is_authenticated or user not in room.players.all():
+            return {'room': None, 'state': None}
+        game_logic = DurakGame(room)
+        return {'room': game_logic.room_summary(), 'state': game_logic.get_game_state(for_player_user_obj=user)}
 
     async def game_message(self, event):
-        await self.send(text_data=json.dumps(event['message']))
\ No newline at end of file
+        self.pipeline.ingest(event['message'], event.get('id'))
@@ -0,0 +1,197 @@
+"""
+Доменные события игры и шина для них внутри процесса.
+
+Раньше побочные действия вешались на post_save GameRoom и срабатывали на
+каждое сохранение комнаты, включая пинги. Теперь модели и DurakGame явно
+испускают типизированное событие ровно в том месте, где оно произошло:
+
+    RoomCreated    - GameRoom.save() при создании
+    PlayerJoined   - GameRoom.add_player()
+    PlayerLeft     - GameRoom.remove_player()
+    GameStarted    - GameRoom.start_game()
+    MoveApplied    - успешный ход DurakGame (attack/defend/take/pass)
+    GameFinished   - GameRoom.end_game()
+    RoomCancelled  - GameRoom.cancel_game()
+
+emit() откладывает доставку до фиксации транзакции (transaction.on_commit),
+так что откатившееся событие никто не увидит. Подписчики:
+
+    @bus.subscribe(GameFinished)
+    def on_finished(event): ...             # sync: сразу, в потоке emit()
+
+    @bus.subscribe(MoveApplied, PlayerJoined)
+    async def on_moves(events): ...         # async: пачкой, в event loop
+
+Async-подписчик получает список событий, накопленных за
+GAME_EVENT_BATCH_DELAY секунд (но не больше GAME_EVENT_BATCH_SIZE). Ошибка
+подписчика пишется в лог и не мешает ни остальным подписчикам, ни коду,
+который испустил событие.
+"""
+import asyncio
+import contextlib
+import dataclasses
+import logging
+import threading
+import time
+import typing
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class Event:
+    room_id: int
+    occurred_at: float = dataclasses.field(default_factory=time.time, kw_only=True)
+
+
+@dataclasses.dataclass(frozen=True)
+class RoomCreated(Event):
+    creator_id: int
+    max_players: int
+    bet_amount: int
+
+
+@dataclasses.dataclass(frozen=True)
+class PlayerJoined(Event):
+    player_id: int
+
+
+@dataclasses.dataclass(frozen=True)
+class PlayerLeft(Event):
+    player_id: int
+
+
+@dataclasses.dataclass(frozen=True)
+class GameStarted(Event):
+    player_ids: tuple
+
+
+@dataclasses.dataclass(frozen=True)
+class MoveApplied(Event):
+    player_id: int
+    action_type: str
+    game_over: bool = False
+
+
+@dataclasses.dataclass(frozen=True)
+class GameFinished(Event):
+    player_ids: tuple
+    winner_id: typing.Optional[int] = None
+    loser_id: typing.Optional[int] = None
+    is_draw: bool = False
+
+
+@dataclasses.dataclass(frozen=True)
+class RoomCancelled(Event):
+    player_ids: tuple
+
+
+class _AsyncSubscriber:
+    """Пачка событий для одного async-подписчика; живет в loop шины."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.pending: list[Event] = []
+        self.flush_handle: asyncio.TimerHandle | None = None
+
+    def add(self, event: Event, delay: float, size: int):
+        self.pending.append(event)
+        loop = asyncio.get_running_loop()
+        if len(self.pending) >= size:
+            if self.flush_handle is not None:
+                self.flush_handle.cancel()
+            self.flush_handle = None
+            loop.create_task(self.flush())
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(delay, lambda: loop.create_task(self.flush()))
+
+    async def flush(self):
+        self.flush_handle = None
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        try:
+            await self.handler(batch)
+        except Exception:
+            logger.exception("Подписчик %s упал на пачке из %s событий", self.handler.__qualname__, len(batch))
+
+
+class EventBus:
+    def __init__(self):
+        self._sync: dict[type, list] = {}
+        self._async: dict[type, list[_AsyncSubscriber]] = {}
+        self._lock = threading.Lock()
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._own_loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def batch_delay(self) -> float:
+        return getattr(settings, 'GAME_EVENT_BATCH_DELAY', 0.05)
+
+    @property
+    def batch_size(self) -> int:
+        return getattr(settings, 'GAME_EVENT_BATCH_SIZE', 100)
+
+    def subscribe(self, *event_types):
+        """Декоратор: sync-функция получает событие, async - список событий."""
+        def decorator(handler):
+            if iscoroutinefunction(handler):
+                subscriber = _AsyncSubscriber(handler)
+                for event_type in event_types:
+                    self._async.setdefault(event_type, []).append(subscriber)
+            else:
+                for event_type in event_types:
+                    self._sync.setdefault(event_type, []).append(handler)
+            return handler
+        return decorator
+
+    def register_loop(self):
+        """Вызывается из async-кода сервера: async-подписчики работают в его loop."""
+        self.loop = asyncio.get_running_loop()
+
+    def emit(self, event: Event):
+        transaction.on_commit(lambda: self.dispatch(event))
+
+    @contextlib.contextmanager
+    def reserve(self):
+        """Место в очереди on_commit под события, которые станут известны позже.
+
+        Нужно внутри atomic(), когда причина узнается после следствия: ход
+        выясняет успех уже после того, как end_game испустил GameFinished.
+        """
+        slot: list[Event] = []
+        transaction.on_commit(lambda: [self.dispatch(event) for event in slot])
+        yield slot
+
+    def dispatch(self, event: Event):
+        for event_type in type(event).__mro__:
+            for handler in self._sync.get(event_type, ()):
+                try:
+                    handler(event)
+                except Exception:
+                    logger.exception("Подписчик %s упал на %s", handler.__qualname__, type(event).__name__,
+                                     extra={'room_id': event.room_id})
+            subscribers = self._async.get(event_type)
+            if subscribers:
+                loop = self._delivery_loop()
+                for subscriber in subscribers:
+                    loop.call_soon_threadsafe(subscriber.add, event, self.batch_delay, self.batch_size)
+
+    def _delivery_loop(self) -> asyncio.AbstractEventLoop:
+        if self.loop is not None and self.loop.is_running():
+            return self.loop
+        # Без ASGI-сервера (manage.py, тесты) - свой loop в фоновом потоке
+        with self._lock:
+            if self._own_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='game-events', daemon=True).start()
+                self._own_loop = loop
+            return self._own_loop
+
+
+bus = EventBus()
+emit = bus.emit
+subscribe = bus.subscribe
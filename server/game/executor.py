@@ -0,0 +1,102 @@
+"""
+Пулы потоков для async-view игры.
+
+DurakGame и его ORM синхронные. Через sync_to_async с thread_sensitive=True
+все такие вызовы процесса шли бы в один общий поток, и опрос статуса ждал
+бы чужой медленный ход. Поэтому ходы выполняются в ограниченном пуле
+GAME_MOVE_WORKERS, чтение состояния - в отдельном пуле GAME_READ_WORKERS,
+а ходы одной комнаты выстраиваются в очередь на asyncio.Lock комнаты, так
+что комната занимает в пуле не больше одного потока.
+
+Хэширование паролей (вход, регистрация) идет в свой пул auth_pool с
+ограниченной очередью: при всплеске входов лишние запросы сразу получают
+PoolBusy, а не копятся, и не отнимают потоки у ходов.
+"""
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from .profiling import profiler
+
+
+class RoomLocks:
+    """asyncio.Lock на комнату; забытые замки уходят вместе с последней ссылкой."""
+
+    def __init__(self):
+        self._locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    def get(self, room_id) -> asyncio.Lock:
+        key = str(room_id)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+
+class PoolBusy(Exception):
+    """Очередь пула заполнена."""
+
+
+class GamePool:
+    def __init__(self, name: str, setting: str, default: int, queue_setting: str = '', queue_default: int = 0):
+        self.name = name
+        self.setting = setting
+        self.default = default
+        # Пустой queue_setting - очередь без ограничения
+        self.queue_setting = queue_setting
+        self.queue_default = queue_default
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def workers(self) -> int:
+        return max(1, getattr(settings, self.setting, self.default))
+
+    @property
+    def pending(self) -> int:
+        """Задач в работе и в очереди."""
+        return self._pending
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            return self._executor
+
+    async def run(self, func, *args):
+        """func(*args) в потоке пула; контекст (метрики, профайлер) копируется.
+
+        PoolBusy, если в очереди уже queue_setting задач сверх занятых потоков.
+        """
+        with self._lock:
+            if self.queue_setting:
+                limit = self.workers + max(0, getattr(settings, self.queue_setting, self.queue_default))
+                if self._pending >= limit:
+                    raise PoolBusy(self.name)
+            self._pending += 1
+        try:
+            return await sync_to_async(_in_worker, thread_sensitive=False, executor=self.executor)(func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+def _in_worker(func, *args):
+    # Как request_started/request_finished для обычного sync-view
+    close_old_connections()
+    try:
+        with profiler.follow():
+            return func(*args)
+    finally:
+        close_old_connections()
+
+
+move_pool = GamePool('game-move', 'GAME_MOVE_WORKERS', 4)
+read_pool = GamePool('game-read', 'GAME_READ_WORKERS', 4)
+auth_pool = GamePool('auth-hash', 'AUTH_HASH_WORKERS', 2, 'AUTH_HASH_QUEUE', 32)
+room_locks = RoomLocks()
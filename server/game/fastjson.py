@@ -0,0 +1,71 @@
+"""
+Быстрая сериализация JSON для view и сокетов.
+
+Если установлен orjson, кодируем им (в разы быстрее stdlib на состояниях
+игры), иначе - json из stdlib с компактными разделителями. Вывод в обоих
+случаях - UTF-8 без \\u-экранирования кириллицы. Нестандартные типы (даты,
+Decimal, UUID, lazy-строки) кодируются как в DjangoJSONEncoder: даты orjson
+отдаёт в default, а не пишет в своём формате.
+
+Неизменные кадры (pong, resync) кодируются один раз при импорте модуля.
+"""
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError  # orjson.JSONDecodeError - его подкласс
+
+
+_django_encoder = DjangoJSONEncoder()
+
+
+def _default(obj):
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return _django_encoder.default(obj)
+
+
+if orjson is not None:
+    def dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj, default=_default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(',', ':'))
+
+    def dumps_bytes(obj) -> bytes:
+        return _encoder.encode(obj).encode()
+
+    def loads(data):
+        return json.loads(data)
+
+
+def dumps(obj) -> str:
+    """Строка для text_data сокета."""
+    return dumps_bytes(obj).decode()
+
+
+class JsonResponse(HttpResponse):
+    """
+    Замена django.http.JsonResponse с тем же интерфейсом.
+
+    Без encoder/json_dumps_params кодирует быстрым dumps_bytes; если их
+    передали, кодирует json из stdlib, как сам Django.
+    """
+
+    def __init__(self, data, encoder=None, safe=True, json_dumps_params=None, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        if encoder is None and json_dumps_params is None:
+            content = dumps_bytes(data)
+        else:
+            content = json.dumps(data, cls=encoder or DjangoJSONEncoder, **(json_dumps_params or {}))
+        super().__init__(content=content, **kwargs)
@@ -1,16 +1,68 @@
 from __future__ import annotations
 
-import random
-import os
-from django.conf import settings
+import functools
+import inspect
 from django.db import transaction
+from . import events
+from .cards import card_id, new_seed, shuffled_deck
+from .metrics import timed
 from .models import Game, GameRoom
+from .timers import turn_timers
 from players.models import Player
 import typing
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+MOVE_CODES = {'attack': 'a', 'defend': 'd', 'take': 't', 'pass_bito': 'p'}
+ACTIONS_BY_CODE = {code: action_type for action_type, code in MOVE_CODES.items()}
+
+
+def encode_move(player_order: list[int], player_id: int, action_type: str, args: list) -> str:
+    """Ход в записи партии: место за столом, буква действия, числа через запятую ('0a3,4', '1d0,2', '1t')."""
+    numbers = []
+    for arg in args:
+        numbers.extend(arg if isinstance(arg, (list, tuple)) else [arg])
+    return f"{player_order.index(player_id)}{MOVE_CODES[action_type]}{','.join(str(int(n)) for n in numbers)}"
+
+
+def decode_move(player_order: list[int], token: str) -> tuple[int, str, list]:
+    action_type = ACTIONS_BY_CODE[token[1]]
+    numbers = [int(n) for n in token[2:].split(',')] if token[2:] else []
+    return player_order[int(token[0])], action_type, [numbers] if action_type == 'attack' else numbers
+
+
+def emits_move(action_type: str):
+    """Успешный ход испускает MoveApplied после фиксации, раньше GameFinished этого хода.
+
+    Заодно ход попадает в запись партии (Game.moves, см. encode_move и game/replay.py).
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+        arg_names = list(signature.parameters)[2:]
+
+        @functools.wraps(method)
+        def wrapper(self, player_user, *args, **kwargs):
+            bound = signature.bind(self, player_user, *args, **kwargs).arguments
+            self._recording_move = (player_user.id, action_type, [bound[name] for name in arg_names if name in bound])
+            with transaction.atomic(), events.bus.reserve() as slot:
+                try:
+                    result = method(self, player_user, *args, **kwargs)
+                finally:
+                    self._recording_move = None
+                if result.get('success'):
+                    slot.append(events.MoveApplied(
+                        self.room.id,
+                        player_id=player_user.id,
+                        action_type=action_type,
+                        game_over=bool(result.get('game_over')),
+                    ))
+            return result
+        return wrapper
+    return decorator
+
+
 class DurakGame:
     def __init__(self, room: GameRoom):
         self.room = room
@@ -24,61 +76,74 @@ class DurakGame:
         self.table: list[dict] = []
         self.attacker_index: int = 0
         self.defender_index: int = (self.attacker_index + 1) % len(self.players) if self.players else 0
+        # ID игроков (строкой, как ключи player_hands_data) в порядке выхода из игры
+        self.finish_order: list[str] = []
+        # Ход, который сейчас выполняется; save_game_state допишет его в Game.moves
+        self._recording_move: typing.Optional[tuple] = None
         
         self._load_game_state_if_exists()
 
-    def _generate_deck(self) -> list[dict]:
-        suits = ['hearts', 'diamonds', 'clubs', 'spades']
-        ranks = ['6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-        deck = [{'rank': rank, 'suit': suit, 'id': f"{rank}-{suit}"} for suit in suits for rank in ranks]
-        random.shuffle(deck)
-        return deck
+    def _generate_deck(self, seed: str) -> list[dict]:
+        return shuffled_deck(seed)
 
+    @timed('load_game_state')
     def _load_game_state_if_exists(self):
         """Loads game state from the database if a Game record exists for this room."""
         try:
             self.game_model_instance = Game.objects.get(room=self.room)
+            if self.game_model_instance.archived_at:
+                # Архивная партия хранит только запись; состояние восстанавливается из нее
+                from .replay import restore_archived
+                restore_archived(self.game_model_instance)
             # Load state from the Game model instance
             self.deck = list(self.game_model_instance.deck)
             self.trump_suit = self.game_model_instance.trump_suit
             self.table = list(self.game_model_instance.table)
             self.player_hands_data = dict(self.game_model_instance.player_hands)
             self.trump_card_revealed = self.game_model_instance.trump_card_revealed
+            self.finish_order = list(self.game_model_instance.finish_order or [])
 
             if self.game_model_instance.current_turn:
                 try:
                     current_turn_user_id = self.game_model_instance.current_turn.id
                     self.attacker_index = next(i for i, p in enumerate(self.players) if p.id == current_turn_user_id)
                 except (StopIteration, AttributeError):
-                    logger.warning(f"Current turn player {self.game_model_instance.current_turn_id} not found in room {self.room.id} players. Re-determining attacker.")
+                    logger.warning("Current turn player %s not found in room %s players. Re-determining attacker.", self.game_model_instance.current_turn_id, self.room.id, extra={'room_id': self.room.id})
                     self._set_initial_attacker_defender()
             else:
                 self._set_initial_attacker_defender() 
             
-            self.defender_index = (self.attacker_index + 1) % len(self.players) if self.players else 0
+            self.defender_index = self._next_active_index(self.attacker_index) if self.players else 0
+            # Защищающийся мог отбиться последней картой и уже выйти, но раунд еще его
+            defended_by = next((pair['defender_id'] for pair in self.table if pair.get('defender_id')), None)
+            if defended_by is not None:
+                self.defender_index = next(
+                    (i for i, p in enumerate(self.players) if p.id == defended_by), self.defender_index
+                )
 
             # Ensure all current players in the room have a hand entry (even if empty)
             for player_user in self.players: # player_user is Player
                 if str(player_user.id) not in self.player_hands_data:
                     self.player_hands_data[str(player_user.id)] = []
-            logger.info(f"DurakGame state loaded from DB for room {self.room.id}")
+            logger.debug("DurakGame state loaded from DB for room %s", self.room.id, extra={'room_id': self.room.id})
 
         except Game.DoesNotExist:
-            logger.info(f"No existing Game model for room {self.room.id}. DurakGame in pre-init state.")
+            logger.debug("No existing Game model for room %s. DurakGame in pre-init state.", self.room.id, extra={'room_id': self.room.id})
             pass # State remains as defaults from __init__
 
-    def initialize_new_game_setup(self):
+    def initialize_new_game_setup(self, seed: typing.Optional[str] = None):
         if self.game_model_instance:
-            logger.warning(f"initialize_new_game_setup called for room {self.room.id}, but Game model already exists. Skipping.")
+            logger.warning("initialize_new_game_setup called for room %s, but Game model already exists. Skipping.", self.room.id, extra={'room_id': self.room.id})
             return
 
         min_players = getattr(self.room, 'min_players_for_start', 2) 
         if not self.players or len(self.players) < min_players:
-             logger.error(f"Not enough players ({len(self.players)}) to initialize game for room {self.room.id}. Needs {min_players}.")
+             logger.error("Not enough players (%s) to initialize game for room %s. Needs %s.", len(self.players), self.room.id, min_players, extra={'room_id': self.room.id})
              return
 
-        logger.info(f"Initializing new game setup for room {self.room.id} with {len(self.players)} players.")
-        self.deck = self._generate_deck()
+        logger.info("Initializing new game setup for room %s with %s players.", self.room.id, len(self.players), extra={'room_id': self.room.id})
+        seed = seed or new_seed()
+        self.deck = self._generate_deck(seed)
         self.player_hands_data = {str(p.id): [] for p in self.players}
         
         self._initialize_hands_and_trump()
@@ -87,9 +152,11 @@ class DurakGame:
         self.game_model_instance = Game.objects.create(
             room=self.room,
             status=GameRoom.STATUS_PLAYING,
+            seed=seed,
+            player_order=[p.id for p in self.players],
         )
         self.save_game_state()
-        logger.info(f"New game setup complete and saved for room {self.room.id}. Trump: {self.trump_suit}. Attacker: {self.players[self.attacker_index].username if self.players else 'N/A'}")
+        logger.info("New game setup complete and saved for room %s. Trump: %s. Attacker: %s", self.room.id, self.trump_suit, self.players[self.attacker_index].username if self.players else 'N/A', extra={'room_id': self.room.id})
 
 
     def _set_initial_attacker_defender(self):
@@ -144,13 +211,13 @@ class DurakGame:
             self.trump_card_revealed = self.deck[0] 
             self.trump_suit = self.trump_card_revealed['suit']
         elif self.player_hands_data and any(self.player_hands_data.values()):
-            logger.warning(f"Deck empty after initial deal for room {self.room.id}. Trump may not be set from deck.")
+            logger.warning("Deck empty after initial deal for room %s. Trump may not be set from deck.", self.room.id, extra={'room_id': self.room.id})
             if not self.trump_suit: 
-                 logger.error(f"CRITICAL: No trump suit could be determined for room {self.room.id}")
+                 logger.error("CRITICAL: No trump suit could be determined for room %s", self.room.id, extra={'room_id': self.room.id})
         else: 
             self.trump_suit = None
             self.trump_card_revealed = None
-            logger.error(f"Cannot determine trump: deck empty and no cards dealt for room {self.room.id}.")
+            logger.error("Cannot determine trump: deck empty and no cards dealt for room %s.", self.room.id, extra={'room_id': self.room.id})
 
 
     def _get_player_hand(self, player_user_obj: Player) -> list[dict]:
@@ -160,14 +227,35 @@ class DurakGame:
         hand = self._get_player_hand(player_user_obj)
         if 0 <= card_index_in_hand < len(hand):
             removed_card = hand.pop(card_index_in_hand)
+            self._mark_finished_if_out(player_user_obj)
             return removed_card
-        logger.warning(f"Invalid card index {card_index_in_hand} for hand of player {player_user_obj.id}")
+        logger.warning("Invalid card index %s for hand of player %s", card_index_in_hand, player_user_obj.id,
+                       extra={'room_id': self.room.id, 'player_id': player_user_obj.id})
         return None
     
     def _add_cards_to_hand(self, player_user_obj: Player, cards_to_add: list[dict]):
         hand = self._get_player_hand(player_user_obj)
         hand.extend(cards_to_add)
 
+    def _mark_finished_if_out(self, player_user_obj: Player):
+        """Игрок выходит из игры, когда колода пуста и у него не осталось карт."""
+        player_key = str(player_user_obj.id)
+        if not self.deck and not self._get_player_hand(player_user_obj) and player_key not in self.finish_order:
+            self.finish_order.append(player_key)
+            logger.info("Player %s finished #%s in room %s.", player_user_obj.username, len(self.finish_order), self.room.id,
+                        extra={'room_id': self.room.id, 'player_id': player_user_obj.id})
+
+    def _is_finished(self, player_index: int) -> bool:
+        return str(self.players[player_index].id) in self.finish_order
+
+    def _next_active_index(self, from_index: int) -> int:
+        """Следующий по кругу игрок, который еще не вышел из игры."""
+        for step in range(1, len(self.players) + 1):
+            candidate = (from_index + step) % len(self.players)
+            if not self._is_finished(candidate):
+                return candidate
+        return from_index
+
 
     def card_value(self, rank_str: str) -> int:
         values = {'6': 6, '7': 7, '8': 8, '9': 9, '10': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 14}
@@ -185,6 +273,8 @@ class DurakGame:
             return True
         return False
 
+    @timed('attack')
+    @emits_move('attack')
     def attack(self, attacking_player_user: Player, card_indices: list[int]) -> dict:
         if not self.game_model_instance or self.game_model_instance.status != GameRoom.STATUS_PLAYING:
             return {'success': False, 'message': "Игра не активна."}
@@ -227,8 +317,10 @@ class DurakGame:
                 if pair_on_table.get('defense_card'):
                     allowed_ranks_for_throw_in.add(pair_on_table['defense_card']['rank'])
             
-            logger.debug(f"Room {self.room.id} - Attempting to throw in. Allowed ranks: {allowed_ranks_for_throw_in}")
-            logger.debug(f"Room {self.room.id} - Cards to throw in: {[c['rank'] for c in cards_to_play_objects]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Room %s - throw-in of %s, allowed ranks: %s", self.room.id,
+                             ','.join(c['rank'] for c in cards_to_play_objects), ','.join(sorted(allowed_ranks_for_throw_in)),
+                             extra={'room_id': self.room.id, 'player_id': attacking_player_user.id})
 
             if not all(c['rank'] in allowed_ranks_for_throw_in for c in cards_to_play_objects):
                 return {'success': False, 'message': "Карты для подкидывания должны совпадать по рангу с картами на столе."}
@@ -246,7 +338,8 @@ class DurakGame:
                 self.table.append({'attack_card': removed_card, 'defense_card': None, 'attacker_id': attacking_player_user.id})
                 played_cards_count += 1
             else:
-                logger.error(f"Failed to remove card at index {card_idx_to_remove} for attack by {attacking_player_user.id}")
+                logger.error("Failed to remove card at index %s for attack by %s", card_idx_to_remove, attacking_player_user.id,
+                             extra={'room_id': self.room.id, 'player_id': attacking_player_user.id})
                 return {'success': False, 'message': "Внутренняя ошибка: не удалось корректно снять карту с руки."}
         
         if played_cards_count == 0 and card_indices: 
@@ -256,6 +349,8 @@ class DurakGame:
         return {'success': True, 'message': "Атака совершена."}
 
 
+    @timed('defend')
+    @emits_move('defend')
     def defend(self, defending_player_user: Player, attack_card_table_index: int, defense_card_hand_index: int) -> dict:
         if not self.game_model_instance or self.game_model_instance.status != GameRoom.STATUS_PLAYING:
             return {'success': False, 'message': "Игра не активна."}
@@ -285,7 +380,8 @@ class DurakGame:
                 self.save_game_state()
                 return {'success': True, 'message': "Карта отбита."}
             else:
-                 logger.error(f"Internal error removing defense card for player {defending_player_user.id}")
+                 logger.error("Internal error removing defense card for player %s", defending_player_user.id,
+                              extra={'room_id': self.room.id, 'player_id': defending_player_user.id})
                  return {'success': False, 'message': "Внутренняя ошибка при удалении карты защиты."}
         else:
             return {'success': False, 'message': "Этой картой нельзя отбиться."}
@@ -314,7 +410,7 @@ class DurakGame:
                         player_instance = p_user 
                         players_involved_in_round_needing_cards.append(player_instance)
                     except Player.DoesNotExist: # На случай если ID не соответствует Player (маловероятно здесь)
-                        logger.error(f"Player with ID {p_user.id} not found for dealing cards.")
+                        logger.error("Player with ID %s not found for dealing cards.", p_user.id, extra={'room_id': self.room.id})
 
 
         defender_user = self.players[self.defender_index]
@@ -328,7 +424,14 @@ class DurakGame:
                 card = self.deck.pop(0)
                 hand.append(card)
 
+        if not self.deck:
+            # Колода кончилась: кто остался без карт в этом раунде, тот вышел
+            for p_user in self.players:
+                self._mark_finished_if_out(p_user)
+
 
+    @timed('take_cards_action')
+    @emits_move('take')
     def take_cards_action(self, taking_player_user: Player) -> dict:
         if not self.game_model_instance or self.game_model_instance.status != GameRoom.STATUS_PLAYING:
             return {'success': False, 'message': "Игра не активна."}
@@ -349,17 +452,19 @@ class DurakGame:
         self.table = [] 
         self._deal_cards_after_round() 
         
-        self.attacker_index = (self.defender_index + 1) % len(self.players)
-        self.defender_index = (self.attacker_index + 1) % len(self.players)
+        self.attacker_index = self._next_active_index(self.defender_index)
+        self.defender_index = self._next_active_index(self.attacker_index)
         
         game_end_result = self._check_game_over_conditions()
         if game_end_result and game_end_result['game_over']:
             self.save_game_state(game_over_result=game_end_result)
-            return {**game_end_result, 'message': game_end_result.get('message', "Игра завершена."), 'success': True}
+            return {**self._public_game_over(game_end_result), 'success': True}
 
         self.save_game_state()
         return {'success': True, 'message': "Карты взяты."}
 
+    @timed('pass_or_bito_action')
+    @emits_move('pass_bito')
     def pass_or_bito_action(self, acting_player_user: Player) -> dict:
         if not self.game_model_instance or self.game_model_instance.status != GameRoom.STATUS_PLAYING:
             return {'success': False, 'message': "Игра не активна."}
@@ -376,10 +481,14 @@ class DurakGame:
             game_end_result = self._check_game_over_conditions()
             if game_end_result and game_end_result['game_over']:
                 self.save_game_state(game_over_result=game_end_result)
-                return {**game_end_result, 'message': game_end_result.get('message', "Бито! Игра завершена."), 'success': True}
+                return {**self._public_game_over(game_end_result), 'action_type': 'bito', 'success': True}
 
-            self.attacker_index = self.defender_index
-            self.defender_index = (self.attacker_index + 1) % len(self.players)
+            # Отбившийся ходит следующим, если он еще в игре
+            if self._is_finished(self.defender_index):
+                self.attacker_index = self._next_active_index(self.defender_index)
+            else:
+                self.attacker_index = self.defender_index
+            self.defender_index = self._next_active_index(self.attacker_index)
             
             self.save_game_state()
             return {'success': True, 'action_type': 'bito', 'message': "Бито! Раунд завершен."}
@@ -388,43 +497,83 @@ class DurakGame:
             return {'success': True, 'action_type': 'attacker_passed_round', 'message': "Атакующий(е) завершили добавление карт. Защищающийся должен отбить оставшиеся или взять."}
 
 
-    def _check_game_over_conditions(self) -> typing.Optional[dict]:
-        if not self.game_model_instance: 
+    @timed('resolve_turn_timeout')
+    def resolve_turn_timeout(self) -> typing.Optional[dict]:
+        """Автоход за игрока, у которого вышло время хода."""
+        if not self.game_model_instance or self.game_model_instance.status != GameRoom.STATUS_PLAYING or not self.players:
             return None
 
-        if not self.deck: 
-            players_with_cards_count = 0
-            last_player_with_cards: typing.Optional[Player] = None
-            
-            for player_user in self.players: # player_user is Player
-                if self._get_player_hand(player_user): 
-                    players_with_cards_count += 1
-                    last_player_with_cards = player_user
+        attacker_user = self.players[self.attacker_index]
+        defender_user = self.players[self.defender_index]
 
-            if players_with_cards_count == 0: 
-                return {'game_over': True, 'is_draw': True, 'winner': None, 'loser': None, 'message': "Игра окончена! Ничья (все вышли одновременно)."}
-            
-            if players_with_cards_count == 1: 
-                loser: typing.Optional[Player] = last_player_with_cards
-                winner: typing.Optional[Player] = None
-                
-                if len(self.players) == 2: 
-                    winner = next((p for p in self.players if p != loser), None)
-                else: 
-                    if self.room.winner and self.room.winner != loser:
-                        winner = self.room.winner
-                
-                return {'game_over': True, 'is_draw': False, 'winner': winner, 'loser': loser, 
-                        'message': f"Игра окончена! Проигравший: {loser.username if loser else 'N/A'}."} # Added if loser else 'N/A' for safety
-        
-        if self.deck: 
-            for player_user in self.players: # player_user is Player
-                if not self._get_player_hand(player_user) and not self.room.winner:
-                    pass 
+        if any(not pair.get('defense_card') for pair in self.table):
+            # Защищающийся не отбился вовремя - берет карты
+            stalled_user = defender_user
+            result = self.take_cards_action(defender_user)
+        elif self.table:
+            stalled_user = attacker_user
+            result = self.pass_or_bito_action(attacker_user)
+        else:
+            # Пустой стол: пас невозможен, атакующий заходит младшей некозырной картой
+            hand = self._get_player_hand(attacker_user)
+            if not hand:
+                return None
+            stalled_user = attacker_user
+            lowest_idx = min(range(len(hand)), key=lambda i: (hand[i]['suit'] == self.trump_suit, self.card_value(hand[i]['rank'])))
+            result = self.attack(attacker_user, [lowest_idx])
+
+        return {**result, 'timed_out_player_id': stalled_user.id}
+
+
+    def _check_game_over_conditions(self) -> typing.Optional[dict]:
+        """O(1): выбывшие игроки учитываются по мере того, как уходят карты."""
+        if not self.game_model_instance or self.deck:
+            return None
+        if len(self.players) - len(self.finish_order) > 1:
+            return None
+        return self._game_over_result()
+
+    def _game_over_result(self) -> dict:
+        players_by_key = {str(p.id): p for p in self.players}
+        loser: typing.Optional[Player] = next((p for p in self.players if str(p.id) not in self.finish_order), None)
+        first_out: typing.Optional[Player] = players_by_key.get(self.finish_order[0]) if self.finish_order else None
+
+        # Последние игроки вышли одним ходом - ничья при любом числе игроков, как в _final_result
+        if loser is None:
+            return {'game_over': True, 'is_draw': True, 'winner': None, 'loser': None,
+                    'finish_order': list(self.finish_order),
+                    'message': "Игра окончена! Ничья (все вышли одновременно)."}
+
+        return {'game_over': True, 'is_draw': False, 'winner': first_out, 'loser': loser,
+                'finish_order': list(self.finish_order),
+                'message': f"Игра окончена! Проигравший: {loser.username if loser else 'N/A'}."}
+
+    def _public_game_over(self, game_over_result: dict) -> dict:
+        """Результат для ответа клиенту: вместо объектов Player - имена."""
+        winner = game_over_result.get('winner')
+        loser = game_over_result.get('loser')
+        return {
+            'game_over': True,
+            'is_draw': game_over_result.get('is_draw', False),
+            'winner_username': winner.username if winner else None,
+            'loser_username': loser.username if loser else None,
+            'finish_order': [int(player_key) for player_key in game_over_result.get('finish_order', [])],
+            'message': game_over_result.get('message', "Игра завершена."),
+        }
 
-        return None 
+    def _final_result(self) -> dict:
+        """Итог уже завершенной игры из сохраненных данных, без повторной проверки правил."""
+        loser = next((p for p in self.players if str(p.id) not in self.finish_order), None)
+        winner = self.room.winner
+        is_draw = winner is None and loser is None
+        if is_draw:
+            message = "Игра окончена! Ничья (все вышли одновременно)."
+        else:
+            message = f"Игра окончена! Проигравший: {loser.username if loser else 'N/A'}."
+        return {'game_over': True, 'is_draw': is_draw, 'winner': winner, 'loser': loser, 'message': message}
 
 
+    @timed('get_game_state')
     def get_game_state(self, for_player_user_obj: typing.Optional[Player] = None) -> dict:
         """Возвращает текущее состояние игры, видимое для конкретного игрока."""
         
@@ -436,9 +585,8 @@ class DurakGame:
 
         if is_game_initialized and self.game_model_instance:
             game_status_from_model = self.game_model_instance.status 
-            game_over_info = self._check_game_over_conditions()
-            if game_over_info and game_over_info['game_over']:
-                game_status_from_model = GameRoom.STATUS_FINISHED 
+            if game_status_from_model == GameRoom.STATUS_FINISHED:
+                game_over_info = self._final_result()
                 winner_obj_from_game_over = game_over_info.get('winner')
                 if winner_obj_from_game_over: 
                     winner_username = winner_obj_from_game_over.username
@@ -457,14 +605,24 @@ class DurakGame:
             'attacker_username': self.players[self.attacker_index].username if attacker_id else "N/A",
             'defender_username': self.players[self.defender_index].username if defender_id else "N/A",
             'trump_suit': self.trump_suit,
-            'trump_card_revealed': self.trump_card_revealed, 
+            # Карты - только id ('10-hearts'); картинки клиент берет из спрайт-атласа
+            'trump_card_revealed': card_id(self.trump_card_revealed),
             'deck_count': len(self.deck),
-            'table': list(self.table),
+            'table': [
+                {
+                    'attack_card': card_id(pair.get('attack_card')),
+                    'defense_card': card_id(pair.get('defense_card')),
+                    'attacker_id': pair.get('attacker_id'),
+                    'defender_id': pair.get('defender_id'),
+                }
+                for pair in self.table
+            ],
             'status': game_status_from_model, 
             'winner_username': winner_username, 
             'is_game_over': game_over_info['game_over'] if game_over_info else False,
             'game_over_message': game_over_info.get('message') if game_over_info else None,
             'is_game_initialized': is_game_initialized,
+            'finish_order': [int(player_key) for player_key in self.finish_order],
         }
 
         for idx, p_user_loop in enumerate(self.players):
@@ -479,45 +637,44 @@ class DurakGame:
             }
 
             if is_game_initialized and (p_user_loop == for_player_user_obj or game_status_from_model == GameRoom.STATUS_FINISHED):
-                
-                player_data['cards'] = []
-                for card_idx_in_hand, card_in_hand in enumerate(hand_cards):
-                     card_data_to_append = {
-                        'rank': card_in_hand['rank'],
-                        'suit': card_in_hand['suit'],
-                        'id': card_in_hand.get('id', f"{card_in_hand['rank']}-{card_in_hand['suit']}"), 
-                        'image_url': self._get_card_image_url(card_in_hand),
-                        'hand_index': card_idx_in_hand
-                    }
-                     player_data['cards'].append(card_data_to_append)
+                # Индекс карты в руке - ее позиция в списке
+                player_data['cards'] = [card_id(card_in_hand) for card_in_hand in hand_cards]
             
             state['players'].append(player_data)
         
-        if is_game_initialized:
-            for table_pair_in_state in state['table']: 
-                if table_pair_in_state.get('attack_card'):
-                    table_pair_in_state['attack_card']['image_url'] = self._get_card_image_url(table_pair_in_state['attack_card'])
-                if table_pair_in_state.get('defense_card'):
-                    table_pair_in_state['defense_card']['image_url'] = self._get_card_image_url(table_pair_in_state['defense_card'])
-            
-            if state['trump_card_revealed'] and isinstance(state['trump_card_revealed'], dict):
-                state['trump_card_revealed']['image_url'] = self._get_card_image_url(state['trump_card_revealed'])
-
         return state
 
+    def room_summary(self) -> dict:
+        """Шапка страницы комнаты: статус, ставка и состав."""
+        return {
+            'status': self.room.status,
+            'status_display': self.room.get_status_display(),
+            'bet_amount': self.room.bet_amount,
+            'max_players': self.room.max_players,
+            'creator_id': self.room.creator_id,
+            'players': [{'id': p.id, 'username': p.username} for p in self.players],
+        }
 
-    def _get_card_image_url(self, card_dict: dict) -> str:
-        if not card_dict or not card_dict.get('suit') or not card_dict.get('rank'):
-            return os.path.join(settings.STATIC_URL, 'cards/back.png') 
-        
-        suit = card_dict['suit'].lower() 
-        rank = card_dict['rank'].upper() 
-        return f"{settings.STATIC_URL}cards/{suit}/{rank}.png"
+    def broadcast_state(self) -> dict:
+        """Состояние для рассылки всей комнате: общее + руки всех игроков в 'hands'.
+
+        'hands' клиенту не уходит: каждый сокет получает копию, где заполнена
+        только его рука (broadcast.personalize).
+        """
+        return {
+            'room': self.room_summary(),
+            'state': self.get_game_state(),
+            'hands': {
+                str(p.id): [card_id(card) for card in self._get_player_hand(p)]
+                for p in self.players
+            },
+        }
 
 
+    @timed('save_game_state')
     def save_game_state(self, game_over_result: typing.Optional[dict] = None):
         if not self.game_model_instance:
-            logger.warning(f"Attempted to save game state for room {self.room.id}, but no Game model instance exists.")
+            logger.warning("Attempted to save game state for room %s, but no Game model instance exists.", self.room.id, extra={'room_id': self.room.id})
             return 
 
         with transaction.atomic():
@@ -530,36 +687,35 @@ class DurakGame:
             game.deck = self.deck
             game.table = self.table
             game.player_hands = self.player_hands_data 
+            game.finish_order = self.finish_order
+            if self._recording_move is not None and game.seed:
+                # Партии, начатые до появления записи, не записываются
+                game.moves.append(encode_move(game.player_order, *self._recording_move))
+            self._recording_move = None
 
             is_game_truly_over = game_over_result and game_over_result.get('game_over', False)
 
             if is_game_truly_over:
                 game.status = GameRoom.STATUS_FINISHED
-                self.room.status = GameRoom.STATUS_FINISHED 
-                
-                winner_obj: typing.Optional[Player] = game_over_result.get('winner')
-                loser_obj: typing.Optional[Player] = game_over_result.get('loser')  
-                is_draw = game_over_result.get('is_draw', False)
-
-                if hasattr(self.room, 'end_game_from_logic'): 
-                    self.room.end_game_from_logic(winner=winner_obj, loser=loser_obj, is_draw=is_draw, final_pot_value=None) 
-                elif hasattr(self.room, 'end_game'): 
-                     self.room.end_game(winner=winner_obj) 
-                else: 
-                    if winner_obj and not self.room.winner: 
-                        self.room.winner = winner_obj
-                
-                self.room.save(update_fields=['status', 'winner'] if winner_obj and not is_draw else ['status'])
-
+                # end_game переводит комнату в FINISHED и ставит задачу расчета игроков
+                self.room.end_game(
+                    winner=game_over_result.get('winner'),
+                    loser=game_over_result.get('loser'),
+                    is_draw=game_over_result.get('is_draw', False),
+                    finish_order=game_over_result.get('finish_order'),
+                )
             else: 
                 game.status = GameRoom.STATUS_PLAYING
-                self.room.status = GameRoom.STATUS_PLAYING
-                if self.deck: 
-                    for p_user in self.players: # p_user is Player
-                        if not self._get_player_hand(p_user) and not self.room.winner:
-                            self.room.winner = p_user 
-                            logger.info(f"Player {p_user.username} is out of cards (deck not empty), marked as potential winner for room {self.room.id}.")
-                            break 
-                self.room.save(update_fields=['status', 'winner'] if self.room.winner else ['status'])
+                if self.room.status != GameRoom.STATUS_PLAYING:
+                    self.room.status = GameRoom.STATUS_PLAYING
+                    self.room.save(update_fields=['status'])
             
-            game.save()
\ No newline at end of file
+            game.save()
+
+            # Таймер хода переставляется только после фиксации транзакции
+            room_id = self.room.id
+            if is_game_truly_over:
+                transaction.on_commit(lambda: turn_timers.cancel(room_id))
+            else:
+                turn_token = game.updated_at.isoformat()
+                transaction.on_commit(lambda: turn_timers.arm(room_id, turn_token))
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+История партий игрока.
+
+Каждая рассчитанная партия пишет по строке GameParticipation на участника
+(GameRoom.settle): результат, место, соперники, ставка, изменения денег и
+рейтинга, длительность. Чтение не трогает ни GameRoom, ни M2M players.
+
+Страницы - по курсору (keyset), а не по OFFSET: курсор хранит
+(finished_at, id) последней показанной строки, и следующая страница - это
+поиск по индексу (player, -finished_at, -id) сразу с этой точки. Сотая
+тысяча партий игрока открывается так же быстро, как первая страница.
+"""
+import base64
+import datetime
+from django.db import models
+from players.models import Player
+from .fastjson import dumps_bytes, loads
+from .models import Game, GameParticipation
+
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(finished_at: datetime.datetime, participation_id: int) -> str:
+    payload = dumps_bytes([finished_at.isoformat(), participation_id])
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        finished_at, participation_id = loads(raw)
+        return datetime.datetime.fromisoformat(finished_at), int(participation_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def record_game(room, groups, winner_id=None, loser_id=None, is_draw=False, rating_deltas=None, finished_at=None):
+    """Вызывается из GameRoom.settle внутри его транзакции; groups - места из rating.placement."""
+    rating_deltas = rating_deltas or {}
+    place = {player_id: number + 1 for number, group in enumerate(groups) for player_id in group}
+    usernames = dict(Player.objects.filter(id__in=place).values_list('id', 'username'))
+    started_at = Game.objects.filter(room=room).values_list('created_at', flat=True).first()
+    duration = int((finished_at - started_at).total_seconds()) if started_at else None
+    pot_share = room.bet_amount * (len(usernames) - 1)
+
+    rows = []
+    for player_id, username in usernames.items():
+        if is_draw:
+            result, cash_delta = GameParticipation.RESULT_DRAW, 0
+        elif player_id == winner_id:
+            result, cash_delta = GameParticipation.RESULT_WIN, pot_share
+        else:
+            result = GameParticipation.RESULT_LOSS if player_id == loser_id else GameParticipation.RESULT_ESCAPED
+            cash_delta = -room.bet_amount
+        rows.append(GameParticipation(
+            player_id=player_id,
+            room=room,
+            finished_at=finished_at,
+            result=result,
+            place=None if is_draw else place.get(player_id),
+            opponents=[{'id': other_id, 'username': other_name}
+                       for other_id, other_name in usernames.items() if other_id != player_id],
+            bet_amount=room.bet_amount,
+            cash_delta=cash_delta,
+            rating_delta=round(rating_deltas.get(player_id, 0.0), 2),
+            duration=duration,
+        ))
+    GameParticipation.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def player_history(player_id: int, cursor: str | None = None, limit: int = 20) -> tuple[list[dict], str | None]:
+    """Страница истории (новые первыми) и курсор следующей; InvalidCursor при битом курсоре."""
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    query = GameParticipation.objects.filter(player_id=player_id)
+    if cursor:
+        finished_at, participation_id = decode_cursor(cursor)
+        # finished_at__lte дает поиск по индексу, OR лишь отсекает строки с тем же временем
+        query = query.filter(finished_at__lte=finished_at).filter(
+            models.Q(finished_at__lt=finished_at) | models.Q(id__lt=participation_id)
+        )
+    rows = list(query.order_by('-finished_at', '-id')[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1].finished_at, rows[limit - 1].id) if len(rows) > limit else None
+    return [_entry(row) for row in rows[:limit]], next_cursor
+
+
+def _entry(row: GameParticipation) -> dict:
+    return {
+        'room_id': row.room_id,
+        'finished_at': row.finished_at.isoformat(),
+        'result': row.result,
+        'result_display': row.get_result_display(),
+        'place': row.place,
+        'opponents': row.opponents,
+        'bet_amount': row.bet_amount,
+        'cash_delta': row.cash_delta,
+        'rating_delta': row.rating_delta,
+        'duration': row.duration,
+    }
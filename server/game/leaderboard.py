@@ -0,0 +1,162 @@
+"""
+Рейтинг игроков.
+
+Источник правды - таблица LeaderboardEntry: при расчете партии
+(GameRoom.settle) строки участников обновляются инкрементно одним UPDATE с
+F()-выражениями. Для чтения процесс держит копию рейтинга в индексируемом
+skiplist (game/skiplist.py): страница top-K и "мое место" - O(log n) без
+ORDER BY по таблице.
+
+Копия строится из таблицы при первом обращении, локальные расчеты
+применяются к ней после фиксации транзакции, а изменения из других
+процессов (run_tasks, соседние daphne) подтягиваются по updated_at не чаще
+раза в GAME_LEADERBOARD_SYNC секунд.
+
+Порядок: больше побед, затем выше процент побед, затем больше net_cash,
+при полном равенстве - раньше зарегистрированный игрок.
+"""
+import datetime
+import threading
+import time
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+from .models import LeaderboardEntry
+from .skiplist import IndexableSkiplist
+
+# Запас для строк, зафиксированных позже, чем проставлен их updated_at
+SYNC_OVERLAP = datetime.timedelta(seconds=5)
+MAX_PAGE_SIZE = 100
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: IndexableSkiplist | None = None
+        self._rows: dict[int, tuple] = {}
+        self._keys: dict[int, tuple] = {}
+        self._watermark = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def sort_key(player_id: int, wins: int, win_rate: float, net_cash: int) -> tuple:
+        return (-wins, -win_rate, -net_cash, player_id)
+
+    # --- Запись ---
+
+    def record_game(self, player_ids: list[int], winner_id=None, is_draw: bool = False, bet_amount: int = 0):
+        """Вызывается из GameRoom.settle внутри его транзакции."""
+        if not player_ids:
+            return
+        LeaderboardEntry.objects.bulk_create(
+            [LeaderboardEntry(player_id=player_id) for player_id in player_ids], ignore_conflicts=True
+        )
+        # update() не трогает auto_now: updated_at ставим сами, по нему синхронизируются другие процессы
+        now = timezone.now()
+        entries = LeaderboardEntry.objects.filter(player_id__in=player_ids)
+        entries.update(games=models.F('games') + 1, updated_at=now)
+        if not is_draw and winner_id:
+            # Ставки уже списаны при входе: победитель получает чужие, остальные теряют свою
+            entries.filter(player_id=winner_id).update(
+                wins=models.F('wins') + 1,
+                net_cash=models.F('net_cash') + bet_amount * (len(player_ids) - 1),
+                updated_at=now,
+            )
+            if bet_amount:
+                entries.exclude(player_id=winner_id).update(net_cash=models.F('net_cash') - bet_amount,
+                                                               updated_at=now)
+        entries.update(win_rate=models.ExpressionWrapper(
+            models.F('wins') * 100.0 / models.F('games'), output_field=models.FloatField()
+        ), updated_at=now)
+        transaction.on_commit(lambda: self._refresh(player_ids))
+
+    # --- Копия в памяти ---
+
+    def _values(self):
+        return LeaderboardEntry.objects.values_list(
+            'player_id', 'player__username', 'wins', 'games', 'win_rate', 'net_cash', 'updated_at'
+        )
+
+    def rebuild(self):
+        rows = list(self._values())
+        with self._lock:
+            self._rows = {}
+            self._keys = {}
+            for row in rows:
+                self._rows[row[0]] = row[:6]
+                self._keys[row[0]] = self.sort_key(row[0], row[2], row[4], row[5])
+            self._index = IndexableSkiplist(self._keys.values())
+            self._watermark = max((row[6] for row in rows), default=None)
+            self._checked_at = time.monotonic()
+
+    def _upsert(self, rows):
+        with self._lock:
+            for row in rows:
+                player_id = row[0]
+                old_key = self._keys.get(player_id)
+                new_key = self.sort_key(player_id, row[2], row[4], row[5])
+                if old_key != new_key:
+                    if old_key is not None:
+                        self._index.remove(old_key)
+                    self._index.add(new_key)
+                    self._keys[player_id] = new_key
+                self._rows[player_id] = row[:6]
+                if self._watermark is None or row[6] > self._watermark:
+                    self._watermark = row[6]
+
+    def _refresh(self, player_ids):
+        if self._index is not None:
+            self._upsert(self._values().filter(player_id__in=player_ids))
+
+    def _ensure_fresh(self):
+        if self._index is None:
+            self.rebuild()
+            return
+        interval = getattr(settings, 'GAME_LEADERBOARD_SYNC', 2.0)
+        now = time.monotonic()
+        if now - self._checked_at < interval:
+            return
+        self._checked_at = now
+        query = self._values()
+        if self._watermark is not None:
+            query = query.filter(updated_at__gte=self._watermark - SYNC_OVERLAP)
+        self._upsert(list(query))
+
+    # --- Чтение ---
+
+    def _entry(self, rank: int, player_id: int) -> dict:
+        _, username, wins, games, win_rate, net_cash = self._rows[player_id]
+        return {
+            'rank': rank,
+            'player_id': player_id,
+            'username': username,
+            'wins': wins,
+            'games': games,
+            'win_rate': round(win_rate, 1),
+            'net_cash': net_cash,
+        }
+
+    def __len__(self) -> int:
+        self._ensure_fresh()
+        return len(self._index)
+
+    def top(self, offset: int = 0, limit: int = 20) -> list[dict]:
+        """Страница рейтинга; места считаются с 1."""
+        self._ensure_fresh()
+        offset = max(offset, 0)
+        limit = min(max(limit, 0), MAX_PAGE_SIZE)
+        with self._lock:
+            keys = self._index.slice(offset, limit)
+            return [self._entry(offset + number + 1, key[-1]) for number, key in enumerate(keys)]
+
+    def rank(self, player_id: int) -> dict | None:
+        """Место игрока или None, если он еще не сыграл ни одной рассчитанной партии."""
+        self._ensure_fresh()
+        with self._lock:
+            key = self._keys.get(player_id)
+            if key is None:
+                return None
+            return self._entry(self._index.index(key) + 1, player_id)
+
+
+leaderboard = Leaderboard()
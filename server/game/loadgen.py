@@ -0,0 +1,501 @@
+"""
+Нагрузочный генератор: N виртуальных игроков проходят весь путь живого
+клиента — регистрация, create_room / join_game, сокет ws/game/<room_id>/ и
+легальные ходы (стратегия из autoplay) до конца партии.
+
+Два транспорта:
+  * InProcessTransport вызывает server.asgi.application прямо в этом
+    процессе (ни сети, ни внешних сервисов, видно число SQL-запросов);
+  * NetworkTransport ходит в уже запущенный daphne по HTTP и WebSocket.
+"""
+import asyncio
+import base64
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import re
+import secrets
+import statistics
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+from django.db.backends.signals import connection_created
+from .autoplay import choose_move
+
+logger = logging.getLogger(__name__)
+
+# Счетчик SQL-запросов текущего действия. asgiref копирует контекст в поток
+# sync-view, поэтому запросы из view попадают в счетчик вызвавшей задачи.
+_query_counter: contextvars.ContextVar = contextvars.ContextVar('loadgen_query_counter', default=None)
+
+
+def _count_queries(execute, sql, params, many, context):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter(sender, connection, **kwargs):
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+class LockedErrorHandler(logging.Handler):
+    """Считает в логах сервера ошибки вида 'database is locked'."""
+
+    def __init__(self, stats):
+        super().__init__(level=logging.WARNING)
+        self.stats = stats
+
+    def emit(self, record):
+        if 'database is locked' in record.getMessage():
+            self.stats.errors['database is locked (log)'] += 1
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.queries: dict[str, list[int]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.ws_messages: Counter = Counter()
+        self.ws_frames = 0
+        self.games_finished = 0
+        self.moves = 0
+
+    def report(self) -> dict:
+        def pct(values, q):
+            ordered = sorted(values)
+            return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+
+        latency = {
+            name: {
+                'n': len(values),
+                'p50_ms': pct(values, 0.50),
+                'p95_ms': pct(values, 0.95),
+                'p99_ms': pct(values, 0.99),
+            }
+            for name, values in sorted(self.latencies.items()) if values
+        }
+        queries = {
+            name: {'mean': statistics.fmean(values), 'max': max(values)}
+            for name, values in sorted(self.queries.items()) if values
+        }
+        return {
+            'latency': latency,
+            'queries_per_action': queries,
+            'errors': dict(self.errors),
+            'ws_frames': self.ws_frames,
+            'ws_messages': dict(self.ws_messages),
+            'games_finished': self.games_finished,
+            'moves': self.moves,
+        }
+
+
+class Response:
+    def __init__(self, status: int, headers: list[tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def header(self, name: str):
+        name_bytes = name.lower().encode()
+        for key, value in self.headers:
+            if key.lower() == name_bytes:
+                return value.decode('latin-1')
+        return None
+
+    def cookies(self) -> dict:
+        result = {}
+        for key, value in self.headers:
+            if key.lower() == b'set-cookie':
+                pair = value.decode('latin-1').split(';', 1)[0]
+                cookie_name, _, cookie_value = pair.partition('=')
+                result[cookie_name.strip()] = cookie_value.strip()
+        return result
+
+    def json(self):
+        return json.loads(self.body)
+
+
+# --- Транспорты -----------------------------------------------------------
+
+class InProcessTransport:
+    def __init__(self, application):
+        self.application = application
+
+    async def request(self, method: str, path: str, headers: list, body: bytes = b'') -> Response:
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'loadtest')] + headers,
+            'client': ('127.0.0.1', 50000),
+            'server': ('loadtest', 80),
+        }
+        sent = False
+        done = asyncio.Event()
+        status = 500
+        response_headers: list = []
+        chunks: list[bytes] = []
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status, response_headers
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                response_headers = list(message.get('headers', []))
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body'):
+                    done.set()
+
+        await self.application(scope, receive, send)
+        done.set()
+        return Response(status, response_headers, b''.join(chunks))
+
+    async def websocket(self, path: str, headers: list):
+        from channels.testing import WebsocketCommunicator
+
+        communicator = WebsocketCommunicator(self.application, path, headers=headers)
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise ConnectionError(f"WebSocket {path} rejected")
+        return _CommunicatorSocket(communicator)
+
+
+class _CommunicatorSocket:
+    def __init__(self, communicator):
+        self.communicator = communicator
+
+    async def recv(self) -> str:
+        # Таймаут задает вызывающий через asyncio.wait_for
+        return await self.communicator.receive_from(timeout=3600)
+
+    async def send(self, text: str):
+        await self.communicator.send_to(text_data=text)
+
+    async def close(self):
+        with contextlib.suppress(Exception):
+            await self.communicator.disconnect()
+
+
+class NetworkTransport:
+    """HTTP/1.1 и WebSocket поверх asyncio streams к запущенному daphne."""
+
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+
+    async def request(self, method: str, path: str, headers: list, body: bytes = b'') -> Response:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Connection: close',
+                     f'Content-Length: {len(body)}']
+            lines += [f'{key.decode()}: {value.decode()}' for key, value in headers]
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+        head, _, payload = raw.partition(b'\r\n\r\n')
+        head_lines = head.split(b'\r\n')
+        status = int(head_lines[0].split()[1])
+        response_headers = []
+        for line in head_lines[1:]:
+            key, _, value = line.partition(b':')
+            response_headers.append((key.strip(), value.strip()))
+        response = Response(status, response_headers, payload)
+        if (response.header('transfer-encoding') or '').lower() == 'chunked':
+            response.body = _dechunk(payload)
+        return response
+
+    async def websocket(self, path: str, headers: list):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        lines = [f'GET {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Upgrade: websocket',
+                 'Connection: Upgrade', f'Sec-WebSocket-Key: {key}', 'Sec-WebSocket-Version: 13']
+        lines += [f'{name.decode()}: {value.decode()}' for name, value in headers]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+        head = await reader.readuntil(b'\r\n\r\n')
+        if b' 101 ' not in head.split(b'\r\n', 1)[0]:
+            writer.close()
+            raise ConnectionError(f"WebSocket {path} rejected: {head[:80]!r}")
+        return _RawWebSocket(reader, writer)
+
+
+def _dechunk(payload: bytes) -> bytes:
+    result = []
+    while payload:
+        size_line, _, rest = payload.partition(b'\r\n')
+        size = int(size_line.split(b';')[0], 16)
+        if size == 0:
+            break
+        result.append(rest[:size])
+        payload = rest[size + 2:]
+    return b''.join(result)
+
+
+class _RawWebSocket:
+    """Минимальный клиент RFC 6455: текстовые кадры, ping/close."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def recv(self) -> str:
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = int.from_bytes(await self.reader.readexactly(2), 'big')
+            elif length == 127:
+                length = int.from_bytes(await self.reader.readexactly(8), 'big')
+            payload = await self.reader.readexactly(length)
+            if opcode == 0x8:
+                raise ConnectionError("WebSocket closed by server")
+            if opcode == 0x9:
+                self._write_frame(0xA, payload)
+                continue
+            if opcode in (0x1, 0x2):
+                return payload.decode()
+
+    def _write_frame(self, opcode: int, payload: bytes):
+        mask = os.urandom(4)
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([0x80 | length])
+        elif length < 65536:
+            header += bytes([0x80 | 126]) + length.to_bytes(2, 'big')
+        else:
+            header += bytes([0x80 | 127]) + length.to_bytes(8, 'big')
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.writer.write(header + mask + masked)
+
+    async def send(self, text: str):
+        self._write_frame(0x1, text.encode())
+        await self.writer.drain()
+
+    async def close(self):
+        with contextlib.suppress(Exception):
+            self._write_frame(0x8, b'')
+            await self.writer.drain()
+            self.writer.close()
+
+
+# --- Виртуальный игрок ----------------------------------------------------
+
+class Table:
+    """Сбор игроков за один стол: первый создает комнату, остальные присоединяются."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.room_id: int | None = None
+        self.room_ready = asyncio.Event()
+        # sender_id -> моменты отправки ходов, для задержки доставки по WS
+        self.moves_sent: dict[int, list[float]] = defaultdict(list)
+
+
+class SimulatedPlayer:
+    def __init__(self, index: int, transport, stats: Stats, table: Table, is_host: bool, game_timeout: float):
+        self.index = index
+        self.transport = transport
+        self.stats = stats
+        self.table = table
+        self.is_host = is_host
+        self.game_timeout = game_timeout
+        self.cookies: dict[str, str] = {}
+        self.player_id: int | None = None
+        self.socket = None
+        self.notify = asyncio.Event()
+        self.seen_moves: Counter = Counter()
+
+    def _headers(self, extra=None) -> list:
+        headers = []
+        if self.cookies:
+            cookie = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+            headers.append((b'cookie', cookie.encode()))
+        if 'csrftoken' in self.cookies:
+            headers.append((b'x-csrftoken', self.cookies['csrftoken'].encode()))
+        return headers + (extra or [])
+
+    async def call(self, name: str, method: str, path: str, form: dict | None = None,
+                   json_body: dict | None = None, extra_headers=None) -> Response:
+        headers = self._headers(extra_headers)
+        body = b''
+        if form is not None:
+            form = {**form, 'csrfmiddlewaretoken': self.cookies.get('csrftoken', '')}
+            body = urlencode(form).encode()
+            headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+        elif json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers.append((b'content-type', b'application/json'))
+
+        counter = [0]
+        token = _query_counter.set(counter)
+        start = time.perf_counter()
+        try:
+            response = await self.transport.request(method, path, headers, body)
+        except Exception as e:
+            self.stats.errors[f'{name}: {type(e).__name__}'] += 1
+            raise
+        finally:
+            _query_counter.reset(token)
+        self.stats.latencies[name].append(time.perf_counter() - start)
+        self.stats.queries[name].append(counter[0])
+        self.cookies.update(response.cookies())
+
+        if response.status >= 500:
+            self.stats.errors[f'{name}: HTTP {response.status}'] += 1
+        if b'database is locked' in response.body:
+            self.stats.errors['database is locked'] += 1
+        return response
+
+    async def register(self):
+        await self.call('register_page', 'GET', '/register/')
+        password = f'Lt-{secrets.token_hex(6)}-9x!'
+        response = await self.call('register', 'POST', '/register/', form={
+            'username': f'load_{self.index}_{secrets.token_hex(3)}',
+            'password1': password,
+            'password2': password,
+        })
+        if response.status != 302:
+            raise RuntimeError(f"registration failed with HTTP {response.status}")
+
+    async def find_table(self):
+        if self.is_host:
+            response = await self.call('create_room', 'POST', '/game/create/', form={
+                'name': f'Load {self.index}', 'max_players': self.table.size, 'bet_amount': 0,
+            })
+            match = re.search(r'/game/(\d+)/', response.header('location') or '')
+            if not match:
+                raise RuntimeError(f"create_room failed with HTTP {response.status}")
+            self.table.room_id = int(match.group(1))
+            self.table.room_ready.set()
+        else:
+            await self.table.room_ready.wait()
+            response = await self.call(
+                'join_game', 'POST', f'/game/join/{self.table.room_id}/', form={},
+                extra_headers=[(b'x-requested-with', b'XMLHttpRequest')],
+            )
+            if response.status != 200:
+                raise RuntimeError(f"join_game failed with HTTP {response.status}")
+
+    async def open_socket(self):
+        start = time.perf_counter()
+        self.socket = await self.transport.websocket(f'/ws/game/{self.table.room_id}/', self._headers())
+        await self.socket.recv()  # hello
+        self.stats.latencies['ws.connect'].append(time.perf_counter() - start)
+
+    async def _read_socket(self):
+        try:
+            while True:
+                frame = json.loads(await self.socket.recv())
+                messages = frame['messages'] if frame.get('action') == 'batch' else [frame]
+                now = time.perf_counter()
+                self.stats.ws_frames += 1
+                for message in messages:
+                    self.stats.ws_messages[message.get('action')] += 1
+                    if message.get('action') == 'move_applied' and message.get('player_id') != self.player_id:
+                        sender = message['player_id']
+                        sent_at = self.table.moves_sent[sender]
+                        index = self.seen_moves[sender]
+                        self.seen_moves[sender] += 1
+                        if index < len(sent_at):
+                            self.stats.latencies['ws.move_applied'].append(now - sent_at[index])
+                self.notify.set()
+        except (ConnectionError, asyncio.CancelledError, asyncio.IncompleteReadError):
+            pass
+
+    async def play(self):
+        status_path = f'/game/status/{self.table.room_id}/'
+        move_path = f'/game/room/{self.table.room_id}/make_move/'
+        reader = asyncio.create_task(self._read_socket())
+        deadline = time.monotonic() + self.game_timeout
+        try:
+            while time.monotonic() < deadline:
+                response = await self.call('game_status', 'GET', status_path)
+                if response.status != 200:
+                    await asyncio.sleep(0.2)
+                    continue
+                state = response.json()['game_state']
+                if self.player_id is None:
+                    self.player_id = next(p['id'] for p in state['players'] if p['is_current_player_for_state'])
+                if state['status'] in ('finished', 'cancelled'):
+                    if self.is_host:
+                        self.stats.games_finished += 1
+                    return
+                move = choose_move(state, self.player_id) if state['status'] == 'playing' else None
+                if move:
+                    self.table.moves_sent[self.player_id].append(time.perf_counter())
+                    response = await self.call('make_move', 'POST', move_path, json_body=move)
+                    self.stats.moves += 1
+                    if response.status != 200 or not response.json().get('success'):
+                        self.stats.errors['make_move rejected'] += 1
+                    continue
+                # Ход за соперником: ждем уведомления по сокету (или опрашиваем раз в полсекунды)
+                self.notify.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.notify.wait(), timeout=0.5)
+            self.stats.errors['game timeout'] += 1
+        finally:
+            reader.cancel()
+            await self.socket.close()
+
+    async def run(self):
+        try:
+            await self.register()
+            await self.find_table()
+            await self.open_socket()
+            await self.play()
+        except Exception as e:
+            self.stats.errors[f'player failed: {e}'[:120]] += 1
+            if self.is_host and not self.table.room_ready.is_set():
+                # Не держим остальных за столом вечно
+                self.table.room_ready.set()
+            logger.debug("Simulated player %s failed", self.index, exc_info=True)
+
+
+async def run_load(transport, players: int, table_size: int, ramp: float, game_timeout: float) -> Stats:
+    stats = Stats()
+    handler = LockedErrorHandler(stats)
+    logging.getLogger().addHandler(handler)
+    connection_created.connect(_install_query_counter)
+    try:
+        simulated = []
+        for index in range(players):
+            if index % table_size == 0:
+                table = Table(table_size)
+            simulated.append(SimulatedPlayer(index, transport, stats, table, index % table_size == 0, game_timeout))
+
+        async def start(player, delay):
+            await asyncio.sleep(delay)
+            await player.run()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(start(p, ramp * i / max(1, players)) for i, p in enumerate(simulated)))
+        stats.latencies['total_run'].append(time.perf_counter() - started)
+    finally:
+        connection_created.disconnect(_install_query_counter)
+        logging.getLogger().removeHandler(handler)
+    return stats
@@ -0,0 +1,33 @@
+import datetime
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from game.models import Game, GameRoom
+from game.replay import archive_game
+
+
+class Command(BaseCommand):
+    help = 'Archives finished games: drops stored state, keeps only seed + player order + moves'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=7, help='Партии, законченные раньше, чем столько дней назад')
+        parser.add_argument('--batch', type=int, default=500, help='Партий за один проход')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        candidates = Game.objects.filter(
+            status=GameRoom.STATUS_FINISHED, archived_at__isnull=True, updated_at__lt=cutoff,
+        ).exclude(seed='').order_by('id')
+        archived = skipped = 0
+        last_id = 0
+        while True:
+            batch = list(candidates.filter(id__gt=last_id)[:options['batch']])
+            if not batch:
+                break
+            for game in batch:
+                if archive_game(game):
+                    archived += 1
+                else:
+                    # Запись не воспроизводит сохраненное состояние - оставляем как есть
+                    skipped += 1
+            last_id = batch[-1].id
+        self.stdout.write(self.style.SUCCESS(f"Заархивировано партий: {archived}, пропущено: {skipped}"))
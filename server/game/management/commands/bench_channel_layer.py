@@ -0,0 +1,86 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from channels.layers import InMemoryChannelLayer
+from server.ipc_layer import IPCChannelLayer
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the IPC channel layer against InMemoryChannelLayer (messages per second)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=20000)
+        parser.add_argument('--group-size', type=int, default=4, help='Сокетов в группе (игроков за столом)')
+
+    def handle(self, *args, **options):
+        messages = options['messages']
+        group_size = options['group_size']
+        capacity = messages * 2
+
+        socket_path = os.path.join(tempfile.mkdtemp(prefix='durak-bench-'), 'channels.sock')
+        broker = subprocess.Popen(
+            [sys.executable, '-m', 'server.ipc_layer', '--path', socket_path, '--capacity', str(capacity)],
+            cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            layers = [
+                ('in-memory', InMemoryChannelLayer(capacity=capacity)),
+                ('ipc', IPCChannelLayer(path=socket_path, autostart=False, capacity=capacity)),
+            ]
+            self.stdout.write(f"{'layer':<10} {'send/receive msg/s':>20} {'group_send msg/s':>20}")
+            for name, layer in layers:
+                send_rate, group_rate = asyncio.run(self._bench(layer, messages, group_size))
+                self.stdout.write(f"{name:<10} {send_rate:>20,.0f} {group_rate:>20,.0f}")
+        finally:
+            broker.terminate()
+            broker.wait()
+
+    async def _bench(self, layer, messages, group_size):
+        await self._wait_ready(layer)
+
+        channel = await layer.new_channel()
+        message = {'type': 'game_message', 'message': {'action': 'bench', 'payload': 'x' * 64}}
+
+        async def consume(name, count):
+            for _ in range(count):
+                await layer.receive(name)
+
+        start = time.perf_counter()
+        consumer = asyncio.create_task(consume(channel, messages))
+        for _ in range(messages):
+            await layer.send(channel, message)
+        await consumer
+        send_rate = messages / (time.perf_counter() - start)
+
+        # group_send: каждое сообщение доставляется всем участникам группы
+        members = [await layer.new_channel() for _ in range(group_size)]
+        for member in members:
+            await layer.group_add('bench', member)
+        rounds = max(1, messages // group_size)
+        start = time.perf_counter()
+        consumers = [asyncio.create_task(consume(member, rounds)) for member in members]
+        for _ in range(rounds):
+            await layer.group_send('bench', message)
+        await asyncio.gather(*consumers)
+        group_rate = rounds * group_size / (time.perf_counter() - start)
+
+        await layer.flush()
+        if hasattr(layer, 'close'):
+            await layer.close()
+        return send_rate, group_rate
+
+    async def _wait_ready(self, layer, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                await layer.flush()
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.05)
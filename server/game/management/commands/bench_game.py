@@ -0,0 +1,53 @@
+import json
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from game.benchmarks import compare, run_suite
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks DurakGame and the game views; writes a JSON baseline or compares against one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Куда записать результаты (JSON)')
+        parser.add_argument('--compare', help='Базовая линия (JSON) для сравнения')
+        parser.add_argument('--threshold', type=float, default=0.15, help='Допустимое замедление, доля (0.15 = 15%%)')
+        parser.add_argument('--games', type=int, default=3, help='Партий на каждое число игроков')
+        parser.add_argument('--repeat', type=int, default=200, help='Повторов для get_game_state и save')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--timers', type=int, default=10000, help='Одновременных таймеров хода в замере колеса')
+
+    def handle(self, *args, **options):
+        # Консольный DEBUG/INFO лог иначе сам становится основной нагрузкой
+        logging.disable(logging.INFO)
+        try:
+            report = run_suite(games=options['games'], repeat=options['repeat'], seed=options['seed'],
+                               timers=options['timers'])
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.stdout.write(f"{'benchmark':<32} {'n':>6} {'median ms':>10} {'p95 ms':>10} {'mean ms':>10}")
+        for name, stats in report['results'].items():
+            self.stdout.write(
+                f"{name:<32} {stats['n']:>6} {stats['median_ms']:>10.3f} {stats['p95_ms']:>10.3f} {stats['mean_ms']:>10.3f}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Результаты записаны в {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            rows = compare(baseline, report, options['threshold'])
+            self.stdout.write('')
+            self.stdout.write(f"{'benchmark':<32} {'baseline':>10} {'current':>10} {'change':>8}")
+            for row in rows:
+                if row['baseline'] is None:
+                    self.stdout.write(f"{row['name']:<32} {'-':>10} {row['current']:>10.3f} {'new':>8}")
+                    continue
+                line = f"{row['name']:<32} {row['baseline']:>10.3f} {row['current']:>10.3f} {row['change']:>+8.1%}"
+                self.stdout.write(self.style.ERROR(line + '  REGRESSION') if row['regression'] else line)
+            regressions = [row['name'] for row in rows if row['regression']]
+            if regressions:
+                raise CommandError(f"Регрессия больше {options['threshold']:.0%}: {', '.join(regressions)}")
@@ -0,0 +1,94 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from game.cards import ATLAS_BASENAME, BACK_ID, RANKS, all_card_ids, atlas_dir, parse_card_id
+
+
+class Command(BaseCommand):
+    help = 'Packs static/cards/<suit>/<rank>.png and back.png into one sprite atlas (PNG + WebP, JSON map, CSS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', help='Каталог с картинками карт (по умолчанию static/cards)')
+        parser.add_argument('--output', help='Куда писать атлас (по умолчанию static/cards)')
+        parser.add_argument('--cell-width', type=int, default=96)
+        parser.add_argument('--cell-height', type=int, default=144)
+        parser.add_argument('--webp-quality', type=int, default=85)
+        parser.add_argument('--png-colors', type=int, default=128,
+                            help='Палитра PNG-атласа (0 - полноцветный). Исходники - JPEG по 3 КБ, '
+                                 'полноцветный PNG из них в разы тяжелее')
+
+    def handle(self, *args, **options):
+        try:
+            from PIL import Image
+        except ImportError:
+            raise CommandError('Для сборки атласа нужен Pillow: pip install Pillow')
+
+        source = options['source'] or atlas_dir()
+        output = options['output'] or atlas_dir()
+        cell_w, cell_h = options['cell_width'], options['cell_height']
+        columns = len(RANKS)
+        card_ids = all_card_ids()
+        rows = (len(card_ids) + columns - 1) // columns
+
+        atlas = Image.new('RGB', (columns * cell_w, rows * cell_h), 'white')
+        cards = {}
+        for index, cid in enumerate(card_ids):
+            if cid == BACK_ID:
+                path = os.path.join(source, 'back.png')
+            else:
+                rank, suit = parse_card_id(cid)
+                path = os.path.join(source, suit, f'{rank}.png')
+            if not os.path.exists(path):
+                raise CommandError(f'Нет картинки для {cid}: {path}')
+            column, row = index % columns, index // columns
+            with Image.open(path) as image:
+                atlas.paste(image.convert('RGB').resize((cell_w, cell_h), Image.LANCZOS), (column * cell_w, row * cell_h))
+            cards[cid] = {'x': column * cell_w, 'y': row * cell_h, 'col': column, 'row': row}
+
+        os.makedirs(output, exist_ok=True)
+        png_path = os.path.join(output, f'{ATLAS_BASENAME}.png')
+        webp_path = os.path.join(output, f'{ATLAS_BASENAME}.webp')
+        # PNG - запасной вариант для браузеров без WebP: палитра держит его размер
+        # на уровне отдельных картинок карт
+        png = atlas.quantize(options['png_colors'], method=Image.Quantize.FASTOCTREE) if options['png_colors'] else atlas
+        png.save(png_path, optimize=True)
+        atlas.save(webp_path, quality=options['webp_quality'], method=6)
+
+        mapping = {
+            'cell_width': cell_w,
+            'cell_height': cell_h,
+            'columns': columns,
+            'rows': rows,
+            'width': atlas.width,
+            'height': atlas.height,
+            'cards': cards,
+        }
+        with open(os.path.join(output, f'{ATLAS_BASENAME}.json'), 'w') as f:
+            json.dump(mapping, f, indent=1, sort_keys=True)
+        with open(os.path.join(output, f'{ATLAS_BASENAME}.css'), 'w') as f:
+            f.write(self._css(mapping))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Атлас {atlas.width}x{atlas.height}: {len(cards)} карт, "
+            f"PNG {os.path.getsize(png_path) // 1024} КБ, WebP {os.path.getsize(webp_path) // 1024} КБ"
+        ))
+
+    @staticmethod
+    def _css(mapping: dict) -> str:
+        columns, rows = mapping['columns'], mapping['rows']
+        # Проценты вместо пикселей: спрайт масштабируется под любой размер элемента
+        lines = [
+            '/* Сгенерировано командой build_card_atlas, не редактировать вручную */',
+            '.card-sprite {',
+            '    display: inline-block;',
+            f'    background-image: url("{ATLAS_BASENAME}.png");',
+            f'    background-image: image-set(url("{ATLAS_BASENAME}.webp") type("image/webp"), url("{ATLAS_BASENAME}.png") type("image/png"));',
+            f'    background-size: {columns * 100}% {rows * 100}%;',
+            '    background-repeat: no-repeat;',
+            '}',
+        ]
+        for cid, cell in mapping['cards'].items():
+            x = cell['col'] * 100 / (columns - 1) if columns > 1 else 0
+            y = cell['row'] * 100 / (rows - 1) if rows > 1 else 0
+            lines.append(f'.card-{cid} {{ background-position: {x:.4g}% {y:.4g}%; }}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from game.replay_export import FORMATS, available_format, export
+
+
+class Command(BaseCommand):
+    help = 'Exports finished games, opening hands and moves to Parquet / Arrow IPC (pyarrow) or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--out', default='replays_export', help='Каталог для games/hands/moves')
+        parser.add_argument('--format', default='auto', choices=['auto', *FORMATS],
+                            help='auto - Parquet при наличии pyarrow, иначе CSV')
+        parser.add_argument('--chunk', type=int, default=500, help='Партий на одно чтение из БД и одну запись')
+
+    def handle(self, *args, **options):
+        try:
+            file_format = available_format(options['format'])
+        except ImportError as e:
+            raise CommandError(str(e))
+        counts = export(options['out'], file_format, chunk=max(options['chunk'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f"{file_format}: партий {counts['games']}, карт в стартовых руках {counts['hands']}, "
+            f"строк ходов {counts['moves']} -> {options['out']}"
+        ))
+        if counts['skipped']:
+            self.stdout.write(self.style.WARNING(f"Пропущено партий с неразборчивой записью: {counts['skipped']}"))
@@ -0,0 +1,72 @@
+import asyncio
+import contextlib
+import json
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from game.loadgen import InProcessTransport, NetworkTransport, run_load
+
+
+class Command(BaseCommand):
+    help = 'Load test: simulated players register, fill tables over HTTP/WebSocket and play full games'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=100, help='Число виртуальных игроков')
+        parser.add_argument('--table-size', type=int, default=2, choices=[2, 3, 4], help='Игроков за столом')
+        parser.add_argument('--ramp', type=float, default=5.0, help='За сколько секунд подключаются все игроки')
+        parser.add_argument('--game-timeout', type=float, default=300.0, help='Предел на одну партию, секунд')
+        parser.add_argument('--url', help='Адрес запущенного daphne (http://127.0.0.1:8000); без него — в процессе')
+        parser.add_argument('--fast-hashing', action='store_true',
+                            help='MD5 вместо PBKDF2 при регистрации (только в процессе)')
+        parser.add_argument('--output', help='Куда записать отчет (JSON)')
+
+    def handle(self, *args, **options):
+        if options['players'] < options['table_size']:
+            raise CommandError('Игроков меньше, чем мест за одним столом.')
+
+        logging.disable(logging.INFO)
+        try:
+            with contextlib.ExitStack() as stack:
+                if options['url']:
+                    transport = NetworkTransport(options['url'])
+                else:
+                    from game.benchmarks import temporary_database
+                    from server.asgi import application
+
+                    stack.enter_context(temporary_database())
+                    if options['fast_hashing']:
+                        stack.enter_context(override_settings(
+                            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']
+                        ))
+                    transport = InProcessTransport(application)
+                stats = asyncio.run(run_load(
+                    transport,
+                    players=options['players'],
+                    table_size=options['table_size'],
+                    ramp=options['ramp'],
+                    game_timeout=options['game_timeout'],
+                ))
+        finally:
+            logging.disable(logging.NOTSET)
+
+        report = stats.report()
+        self.stdout.write(f"{'endpoint':<24} {'n':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}")
+        for name, row in report['latency'].items():
+            queries = report['queries_per_action'].get(name)
+            queries_text = f"{queries['mean']:.1f}" if queries else '-'
+            self.stdout.write(
+                f"{name:<24} {row['n']:>7} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {queries_text:>8}"
+            )
+        self.stdout.write(f"Партий завершено: {report['games_finished']}, ходов: {report['moves']}, "
+                          f"WS-кадров: {report['ws_frames']}")
+        if report['errors']:
+            self.stdout.write(self.style.ERROR('Ошибки:'))
+            for name, count in sorted(report['errors'].items(), key=lambda item: -item[1]):
+                self.stdout.write(self.style.ERROR(f"  {count:>6}  {name}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('Ошибок нет'))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Отчет записан в {options['output']}")
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from server.ipc_layer import DEFAULT_SOCKET_PATH, run_broker
+
+
+class Command(BaseCommand):
+    help = 'Runs the IPC channel layer broker for multi-process daphne'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default', help='Алиас из CHANNEL_LAYERS')
+
+    def handle(self, *args, **options):
+        config = dict(settings.CHANNEL_LAYERS.get(options['alias'], {}).get('CONFIG', {}))
+        path = config.pop('path', DEFAULT_SOCKET_PATH)
+        broker_config = {
+            key: config[key]
+            for key in ('expiry', 'group_expiry', 'capacity', 'channel_capacity')
+            if key in config
+        }
+        self.stdout.write(f"IPC channel broker listening on {path}")
+        run_broker(path, **broker_config)
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from game.models import Task
+from game.tasks import run_pending, runner
+
+
+class Command(BaseCommand):
+    help = 'Runs background tasks from the Task table (settlement after games, cleanup)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Потоков-воркеров')
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и выйти')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            done = run_pending(worker='run_tasks')
+            failed = Task.objects.filter(status=Task.STATUS_FAILED).count()
+            self.stdout.write(self.style.SUCCESS(f"Выполнено задач: {done}, в статусе failed: {failed}"))
+            return
+
+        runner.start(options['workers'])
+        self.stdout.write(f"Воркеров: {options['workers']}. Ctrl+C для остановки.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            runner.stop()
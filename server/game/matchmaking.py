@@ -0,0 +1,96 @@
+"""
+Индекс ожидающих комнат по рейтингу для лобби и быстрой игры.
+
+Ключ комнаты - (средний рейтинг игроков в ней, id комнаты) в индексируемом
+skiplist (game/skiplist.py), поэтому поиск комнат в полосе
+rating ± band стоит O(log n + m), где m - число комнат в полосе, без
+сортировки всех ожидающих комнат в БД.
+
+В индексе только комнаты, куда еще можно сесть: ожидание игроков и есть
+свободные места. Подписчики событий (game/subscribers.py) лишь помечают
+комнату "грязной", а пересчитывает ее читатель одним запросом на все
+помеченные комнаты. Изменения из других процессов подтягиваются полным
+перестроением не чаще раза в GAME_MATCHMAKING_SYNC секунд.
+
+Индекс - подсказка: вход в комнату (join_game) все равно перепроверяет
+статус, места и ставку по БД.
+"""
+import threading
+import time
+from django.conf import settings
+from django.db.models import Avg, Count, F
+from .models import GameRoom
+from .skiplist import IndexableSkiplist
+
+
+def open_rooms():
+    """Ожидающие комнаты со свободными местами и средним рейтингом игроков."""
+    return GameRoom.objects.filter(status=GameRoom.STATUS_WAITING)\
+                           .annotate(players_count=Count('players'), avg_rating=Avg('players__rating'))\
+                           .filter(players_count__gt=0, players_count__lt=F('max_players'))
+
+
+class RoomIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: IndexableSkiplist | None = None
+        self._keys: dict[int, tuple] = {}
+        self._dirty: set[int] = set()
+        self._rebuilt_at = 0.0
+
+    def touch(self, room_id: int):
+        """Состав или статус комнаты изменился; пересчет - при следующем чтении."""
+        with self._lock:
+            if self._index is not None:
+                self._dirty.add(room_id)
+
+    def rebuild(self):
+        with self._lock:
+            self._dirty.clear()
+        rows = list(open_rooms().values_list('id', 'avg_rating'))
+        with self._lock:
+            self._keys = {room_id: (round(rating, 2), room_id) for room_id, rating in rows}
+            self._index = IndexableSkiplist(self._keys.values())
+            self._rebuilt_at = time.monotonic()
+
+    def _refresh_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        ratings = dict(open_rooms().filter(id__in=dirty).values_list('id', 'avg_rating'))
+        with self._lock:
+            for room_id in dirty:
+                old_key = self._keys.pop(room_id, None)
+                if old_key is not None:
+                    self._index.remove(old_key)
+                if room_id in ratings:
+                    key = (round(ratings[room_id], 2), room_id)
+                    self._keys[room_id] = key
+                    self._index.add(key)
+
+    def _ensure_fresh(self):
+        interval = getattr(settings, 'GAME_MATCHMAKING_SYNC', 10.0)
+        if self._index is None or time.monotonic() - self._rebuilt_at >= interval:
+            self.rebuild()
+        else:
+            self._refresh_dirty()
+
+    def __len__(self) -> int:
+        self._ensure_fresh()
+        return len(self._index)
+
+    def find(self, rating: float, band: float, limit: int = 20) -> list[int]:
+        """id комнат со средним рейтингом в пределах rating ± band, ближайшие первыми."""
+        self._ensure_fresh()
+        with self._lock:
+            found = []
+            for room_rating, room_id in self._index.iter_from((rating - band, 0)):
+                if room_rating > rating + band:
+                    break
+                found.append((abs(room_rating - rating), room_id))
+        found.sort()
+        return [room_id for _, room_id in found[:limit]]
+
+
+room_index = RoomIndex()
@@ -0,0 +1,220 @@
+"""
+Метрики процесса: гистограммы длительности, числа SQL-запросов и времени в
+SQL для HTTP-view, действий WebSocket и методов DurakGame.
+
+Все агрегируется в памяти процесса и отдается в текстовом формате Prometheus
+на /metrics. При нескольких процессах daphne Prometheus опрашивает каждый
+отдельно и суммирует сам. Цена замера — пара perf_counter и bisect под
+локом, поэтому метрики включены всегда.
+"""
+import bisect
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.backends.signals import connection_created
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и одной меткой."""
+
+    def __init__(self, name: str, documentation: str, label: str, buckets: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # значение метки -> [счетчики по корзинам (+Inf последней), сумма, количество]
+        self._series: dict[str, list] = {}
+
+    def observe(self, label_value: str, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> dict[str, tuple[list[int], float, int]]:
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_value, (counts, total, count) in sorted(self.snapshot().items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    def __init__(self):
+        self.http_seconds = Histogram(
+            'durak_http_request_seconds', 'Время обработки HTTP-запроса.', 'view', LATENCY_BUCKETS)
+        self.http_queries = Histogram(
+            'durak_http_request_queries', 'SQL-запросов на HTTP-запрос.', 'view', QUERY_BUCKETS)
+        self.http_sql_seconds = Histogram(
+            'durak_http_request_sql_seconds', 'Время в SQL на HTTP-запрос.', 'view', LATENCY_BUCKETS)
+        self.ws_seconds = Histogram(
+            'durak_ws_action_seconds', 'Время обработки действия WebSocket.', 'action', LATENCY_BUCKETS)
+        self.ws_queries = Histogram(
+            'durak_ws_action_queries', 'SQL-запросов на действие WebSocket.', 'action', QUERY_BUCKETS)
+        self.ws_sql_seconds = Histogram(
+            'durak_ws_action_sql_seconds', 'Время в SQL на действие WebSocket.', 'action', LATENCY_BUCKETS)
+        self.game_method_seconds = Histogram(
+            'durak_game_method_seconds', 'Время методов DurakGame.', 'method', LATENCY_BUCKETS)
+
+    def histograms(self) -> list[Histogram]:
+        return [value for value in vars(self).values() if isinstance(value, Histogram)]
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self.histograms():
+            lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Registry()
+
+
+# --- Учет SQL -------------------------------------------------------------
+
+class QueryStats:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Текущий замер. asgiref копирует контекст в поток sync-кода, поэтому запросы
+# из database_sync_to_async и sync-view попадают в замер вызвавшей задачи.
+_current_stats: contextvars.ContextVar = contextvars.ContextVar('durak_query_stats', default=None)
+
+
+def _track_queries(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - start
+
+
+def _install_query_tracking(sender, connection, **kwargs):
+    if _track_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_track_queries)
+
+
+def install():
+    """Подключает учет SQL ко всем новым соединениям (вызывается из GameConfig.ready)."""
+    connection_created.connect(_install_query_tracking, dispatch_uid='durak_metrics_queries')
+
+
+@contextlib.contextmanager
+def _measure(seconds: Histogram, queries: Histogram, sql_seconds: Histogram, label_value: str):
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_stats.reset(token)
+        seconds.observe(label_value, elapsed)
+        queries.observe(label_value, stats.count)
+        sql_seconds.observe(label_value, stats.seconds)
+
+
+def measure_ws(action: str):
+    return _measure(metrics.ws_seconds, metrics.ws_queries, metrics.ws_sql_seconds, action)
+
+
+# --- Обертки --------------------------------------------------------------
+
+class MetricsMiddleware:
+    """Первым в MIDDLEWARE: время, запросы и время SQL на каждый view."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            self._observe(request, stats, start, token)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            self._observe(request, stats, start, token)
+
+    @staticmethod
+    def _observe(request, stats: QueryStats, start: float, token):
+        elapsed = time.perf_counter() - start
+        _current_stats.reset(token)
+        # Метка - имя маршрута, а не путь: иначе по серии на каждую комнату
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unmatched'
+        metrics.http_seconds.observe(view_name, elapsed)
+        metrics.http_queries.observe(view_name, stats.count)
+        metrics.http_sql_seconds.observe(view_name, stats.seconds)
+
+
+def instrument_ws(action: str):
+    """Декоратор async-метода consumer'а: замер под меткой action."""
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            with measure_ws(action):
+                return await method(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed(method_name: str):
+    """Декоратор метода DurakGame: только время, запросы учитывает внешний замер."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                metrics.game_method_seconds.observe(method_name, time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:40
+
+from django.db import migrations, models
+
+
+def backfill_finish_order(apps, schema_editor):
+    """Для идущих партий с пустой колодой отмечаем уже вышедших игроков."""
+    Game = apps.get_model('game', 'Game')
+    for game in Game.objects.filter(status='playing').iterator():
+        if game.deck:
+            continue
+        finished = [player_id for player_id, hand in game.player_hands.items() if not hand]
+        if finished:
+            game.finish_order = finished
+            game.save(update_fields=['finish_order'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_alter_game_options_alter_gameroom_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='finish_order',
+            field=models.JSONField(default=list, help_text='ID игроков в порядке выхода из игры (без карт при пустой колоде)'),
+        ),
+        migrations.RunPython(backfill_finish_order, migrations.RunPython.noop),
+    ]
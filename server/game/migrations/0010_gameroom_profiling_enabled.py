@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_game_finish_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameroom',
+            name='profiling_enabled',
+            field=models.BooleanField(default=False, help_text='Выборочно профилировать ходы в этой комнате'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_finished_rooms_settled(apps, schema_editor):
+    # Старые завершенные комнаты не рассчитывались вовсе: save_game_state ставил
+    # status=FINISHED до end_game, и тот выходил сразу. Помечаем их рассчитанными,
+    # чтобы задача settle_game не выплатила банки задним числом
+    GameRoom = apps.get_model('game', 'GameRoom')
+    GameRoom.objects.filter(status='finished').update(settled_at=models.F('last_activity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0010_gameroom_profiling_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameroom',
+            name='settled_at',
+            field=models.DateTimeField(blank=True, help_text='Когда по итогам игры рассчитаны игроки (задача settle_game)', null=True),
+        ),
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict)),
+                ('key', models.CharField(blank=True, help_text='Ключ дедупликации: вторая задача с тем же ключом не ставится', max_length=200, null=True, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('running', 'Выполняется'), ('done', 'Выполнена'), ('failed', 'Ошибка')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='game_task_status_aa2442_idx')],
+            },
+        ),
+        migrations.RunPython(mark_finished_rooms_settled, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_entries(apps, schema_editor):
+    # Победы и партии берем из счетчиков Player; сколько кто выиграл денег
+    # раньше не записывалось, поэтому net_cash начинается с нуля
+    Player = apps.get_model('players', 'Player')
+    LeaderboardEntry = apps.get_model('game', 'LeaderboardEntry')
+    LeaderboardEntry.objects.bulk_create([
+        LeaderboardEntry(
+            player_id=player_id,
+            wins=won,
+            games=played,
+            win_rate=won / played * 100,
+        )
+        for player_id, played, won in Player.objects.filter(games_played__gt=0).values_list('id', 'games_played', 'games_won')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0011_task_gameroom_settled_at'),
+        ('players', '0003_remove_player_hand_alter_player_current_room'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('player', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='leaderboard_entry', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('games', models.PositiveIntegerField(default=0)),
+                ('win_rate', models.FloatField(default=0.0, help_text='Процент побед, wins / games * 100')),
+                ('net_cash', models.IntegerField(default=0, help_text='Выигрыши минус ставки за все рассчитанные партии')),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Строка рейтинга',
+                'verbose_name_plural': 'Рейтинг',
+            },
+        ),
+        migrations.RunPython(backfill_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_history(apps, schema_editor):
+    # Прошлые партии восстанавливаем по комнате и Game.finish_order; изменений
+    # рейтинга тогда не было, время окончания - settled_at или последняя активность
+    GameRoom = apps.get_model('game', 'GameRoom')
+    GameParticipation = apps.get_model('game', 'GameParticipation')
+    rows = []
+    for room in GameRoom.objects.filter(status='finished').prefetch_related('players').select_related('game_instance'):
+        players = {player.id: player.username for player in room.players.all()}
+        game = getattr(room, 'game_instance', None)
+        finish_order = [int(player_id) for player_id in (game.finish_order if game else [])]
+        loser_id = next((player_id for player_id in players if player_id not in finish_order), None) if finish_order else None
+        is_draw = room.winner_id is None and loser_id is None
+        finished_at = room.settled_at or room.last_activity
+        for player_id, username in players.items():
+            if is_draw:
+                result, cash_delta, place = 'draw', 0, None
+            elif player_id == room.winner_id:
+                result, cash_delta = 'win', room.bet_amount * (len(players) - 1)
+                place = 1
+            else:
+                result, cash_delta = ('loss' if player_id == loser_id else 'escaped'), -room.bet_amount
+                place = len(players) if player_id == loser_id else (
+                    finish_order.index(player_id) + 1 if player_id in finish_order else None)
+            rows.append(GameParticipation(
+                player_id=player_id,
+                room_id=room.id,
+                finished_at=finished_at,
+                result=result,
+                place=place,
+                opponents=[{'id': other_id, 'username': other_name}
+                           for other_id, other_name in players.items() if other_id != player_id],
+                bet_amount=room.bet_amount,
+                cash_delta=cash_delta,
+                duration=int((finished_at - game.created_at).total_seconds()) if game else None,
+            ))
+    GameParticipation.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0012_leaderboardentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameParticipation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('finished_at', models.DateTimeField()),
+                ('result', models.CharField(choices=[('win', 'Победа'), ('escaped', 'Вышел из игры'), ('loss', 'Дурак'), ('draw', 'Ничья')], max_length=10)),
+                ('place', models.PositiveSmallIntegerField(blank=True, help_text='Место за столом, 1 - вышел первым', null=True)),
+                ('opponents', models.JSONField(default=list, help_text='Соперники на момент партии: [{id, username}]')),
+                ('bet_amount', models.PositiveIntegerField(default=0)),
+                ('cash_delta', models.IntegerField(default=0, help_text='Выигрыш минус ставка')),
+                ('rating_delta', models.FloatField(default=0.0)),
+                ('duration', models.PositiveIntegerField(blank=True, help_text='Длительность партии, секунд', null=True)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participations', to=settings.AUTH_USER_MODEL)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participations', to='game.gameroom')),
+            ],
+            options={
+                'verbose_name': 'Участие в партии',
+                'verbose_name_plural': 'История партий',
+                'indexes': [models.Index(fields=['player', '-finished_at', '-id'], name='game_participation_history')],
+                'constraints': [models.UniqueConstraint(fields=('player', 'room'), name='game_participation_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_history, migrations.RunPython.noop),
+    ]
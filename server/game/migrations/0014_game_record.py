@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0013_gameparticipation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, help_text='Когда состояние удалено и хранится только запись', null=True),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='moves',
+            field=models.JSONField(default=list, help_text="Ходы строками '<место><действие><числа>', см. game_logic.encode_move"),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='player_order',
+            field=models.JSONField(default=list, help_text='ID игроков в порядке мест за столом'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='seed',
+            field=models.CharField(blank=True, help_text='Seed раздачи (hex); пусто у партий до записи', max_length=64),
+        ),
+    ]
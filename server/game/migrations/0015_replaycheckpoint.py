@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0014_game_record'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplayCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('move', models.PositiveIntegerField(help_text='Сколько ходов записи уже применено')),
+                ('state', models.JSONField(help_text='ReplayGame.snapshot() на этом ходу')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='game.game')),
+            ],
+            options={
+                'verbose_name': 'Контрольная точка повтора',
+                'verbose_name_plural': 'Контрольные точки повторов',
+                'constraints': [models.UniqueConstraint(fields=('game', 'move'), name='game_replay_checkpoint_unique')],
+            },
+        ),
+    ]
@@ -9,6 +9,7 @@ from django.conf import settings
 from django.urls import reverse
 from django.utils import timezone
 import logging
+from . import events
 logger = logging.getLogger(__name__)
 
 
@@ -54,6 +55,8 @@ class GameRoom(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     last_activity = models.DateTimeField(auto_now=True)
+    profiling_enabled = models.BooleanField(default=False, help_text="Выборочно профилировать ходы в этой комнате")
+    settled_at = models.DateTimeField(null=True, blank=True, help_text="Когда по итогам игры рассчитаны игроки (задача settle_game)")
 
     class Meta:
         ordering = ['-created_at']
@@ -83,10 +86,23 @@ class GameRoom(models.Model):
             # Можно добавить проверку, чтобы имя не перезаписывалось при каждом save, если оно уже есть
             if not self.pk or not GameRoom.objects.filter(pk=self.pk).exists() or not self.name:
                  self.name = f"Игра {self.creator.username} (Ставка: {self.bet_amount})"
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if adding:
+            events.emit(events.RoomCreated(self.id, creator_id=self.creator_id, max_players=self.max_players,
+                                           bet_amount=self.bet_amount))
 
-    def start_game(self):
-        """Начинает игру, если условия соблюдены."""
+    def add_player(self, player):
+        """Добавляет игрока в комнату и сообщает об этом подписчикам событий."""
+        self.players.add(player)
+        events.emit(events.PlayerJoined(self.id, player_id=player.id))
+
+    def remove_player(self, player):
+        self.players.remove(player)
+        events.emit(events.PlayerLeft(self.id, player_id=player.id))
+
+    def start_game(self, seed=None):
+        """Начинает игру, если условия соблюдены. seed - только для воспроизводимых прогонов (бенчмарки)."""
         from .game_logic import DurakGame 
         if self.status != self.STATUS_WAITING:
             logger.warning(f"Attempt to start game for room {self.id} not in WAITING status (current: {self.status})")
@@ -107,7 +123,7 @@ class GameRoom(models.Model):
                 # Если экземпляр Game еще не создан в БД (game_model_instance is None)
                 if not game_logic_instance.game_model_instance:
                     # Вот здесь происходит раздача карт, создание колоды, определение козыря и создание Game модели
-                    game_logic_instance.initialize_new_game_setup() 
+                    game_logic_instance.initialize_new_game_setup(seed=seed)
                     
                     # Проверка, что initialize_new_game_setup действительно создал game_model_instance
                     if not game_logic_instance.game_model_instance:
@@ -119,22 +135,24 @@ class GameRoom(models.Model):
                 
                 self.status = self.STATUS_PLAYING
                 self.save(update_fields=['status'])
+                events.emit(events.GameStarted(self.id, player_ids=tuple(p.id for p in game_logic_instance.players)))
                 
                 # Логируем ID созданной или существующей Game модели для отладки
                 game_instance_id_log = game_logic_instance.game_model_instance.id if game_logic_instance.game_model_instance else 'None (Error!)'
-                logger.info(f"Game started successfully for room {self.id}. Game instance ID: {game_instance_id_log}")
+                logger.info("Game started successfully for room %s. Game instance ID: %s", self.id, game_instance_id_log, extra={'room_id': self.id})
                 
                 # Здесь обычно отправляется WebSocket уведомление игрокам о начале игры
                 return True
         except Exception as e:
-            logger.error(f"Error starting game for room {self.id}: {e}", exc_info=True)
+            logger.error("Error starting game for room %s: %s", self.id, e, exc_info=True, extra={'room_id': self.id})
             # Транзакция будет отменена автоматически при исключении
             return False
 
-    def end_game(self, winner=None, loser=None, is_draw=False):
-        """Завершает игру, обновляет статусы и балансы."""
+    def end_game(self, winner=None, loser=None, is_draw=False, finish_order=None):
+        """Завершает игру. Балансы и статистика игроков - в фоновой задаче settle_game."""
+        from .tasks import enqueue
         if self.status == self.STATUS_FINISHED: # Уже завершена
-            logger.info(f"Game room {self.id} is already finished. Skipping end_game call.")
+            logger.info("Game room %s is already finished. Skipping end_game call.", self.id, extra={'room_id': self.id})
             return
 
         with transaction.atomic():
@@ -148,33 +166,64 @@ class GameRoom(models.Model):
                 update_fields_room.append('winner')
             self.save(update_fields=update_fields_room)
 
-            # Обновление статистики и балансов игроков
-            all_players_in_room = list(self.players.all()) # Получаем всех, кто был в комнате
-
-            if not is_draw and winner and self.bet_amount > 0:
-                total_pot = self.bet_amount * len(all_players_in_room) # Ставка каждого игрока
-                winner.cash += total_pot
-                winner.games_won += 1
-                winner.save(update_fields=['cash', 'games_won'])
-                logger.info(f"Player {winner.username} won {total_pot} in room {self.id}")
-                
+            player_ids = list(self.players.values_list('id', flat=True))
+            # Задача пишется в той же транзакции: после фиксации хода расчет не потеряется
+            enqueue('settle_game', key=f'settle_game:{self.id}', room_id=self.id,
+                    winner_id=self.winner_id, is_draw=is_draw, loser_id=loser.id if loser else None,
+                    finish_order=[int(player_id) for player_id in finish_order or ()])
+            enqueue('replay_checkpoints', key=f'replay_checkpoints:{self.id}', room_id=self.id)
+
+            logger.info("Game %s ended. Winner: %s", self.id,
+                        winner.username if winner and not is_draw else 'Draw' if is_draw else 'N/A', extra={'room_id': self.id})
+            events.emit(events.GameFinished(
+                self.id,
+                player_ids=tuple(player_ids),
+                winner_id=winner.id if winner and not is_draw else None,
+                loser_id=loser.id if loser else None,
+                is_draw=is_draw,
+            ))
+
+    def settle(self, winner_id=None, is_draw=False, loser_id=None, finish_order=None) -> bool:
+        """Расчет игроков по итогам партии; повторный вызов ничего не делает."""
+        from players.backends import forget_players
+        from players.models import Player
+        from . import history
+        from .leaderboard import leaderboard
+        from .rating import placement, update_ratings
+        with transaction.atomic():
+            # Отметка о расчете ставится в той же транзакции, что и сам расчет
+            settled_at = timezone.now()
+            if not GameRoom.objects.filter(id=self.id, settled_at__isnull=True).update(settled_at=settled_at):
+                return False
+
+            player_ids = list(self.players.values_list('id', flat=True))
+            players = Player.objects.filter(id__in=player_ids)
+            if not is_draw and winner_id:
+                winner_updates = {'games_won': models.F('games_won') + 1}
+                if self.bet_amount > 0:
+                    total_pot = self.bet_amount * len(player_ids) # Ставка каждого игрока
+                    winner_updates['cash'] = models.F('cash') + total_pot
+                    logger.info("Player %s won %s in room %s", winner_id, total_pot, self.id,
+                                extra={'room_id': self.id, 'player_id': winner_id})
+                Player.objects.filter(id=winner_id).update(**winner_updates)
             elif is_draw and self.bet_amount > 0: # Если ничья, возвращаем ставки
-                for player_obj in all_players_in_room:
-                    player_obj.cash += self.bet_amount # Возвращаем ставку
-                    player_obj.save(update_fields=['cash'])
-                logger.info(f"Draw in room {self.id}. Bets ({self.bet_amount}) returned to players.")
-            
-            # Обновляем игры сыграно и сбрасываем current_room
-            for player_obj in all_players_in_room:
-                player_obj.games_played += 1
-                if player_obj.current_room == self:
-                    player_obj.current_room = None
-                # Сохраняем изменения для каждого игрока
-                player_obj.save(update_fields=['games_played', 'current_room'])
-            
-            logger.info(f"Game {self.id} ended. Winner: {winner.username if winner and not is_draw else 'Draw' if is_draw else 'N/A (No winner/No bets)'}")
+                players.update(cash=models.F('cash') + self.bet_amount)
+                logger.info("Draw in room %s. Bets (%s) returned to players.", self.id, self.bet_amount, extra={'room_id': self.id})
+
+            # До увеличения games_played: от него зависит коэффициент K новичков
+            groups = placement(player_ids, winner_id=winner_id, loser_id=loser_id,
+                               finish_order=finish_order, is_draw=is_draw)
+            rating_deltas = update_ratings(groups)
+            players.update(games_played=models.F('games_played') + 1)
+            players.filter(current_room=self).update(current_room=None)
             # Очистка активности игроков для этой комнаты
             PlayerActivity.objects.filter(room=self).delete()
+            leaderboard.record_game(player_ids, winner_id=winner_id, is_draw=is_draw, bet_amount=self.bet_amount)
+            history.record_game(self, groups, winner_id=winner_id, loser_id=loser_id, is_draw=is_draw,
+                                rating_deltas=rating_deltas, finished_at=settled_at)
+            # Деньги, счетчики, рейтинг и current_room менялись UPDATE-ом, мимо Player.save()
+            forget_players(*player_ids)
+        return True
 
 
     def cancel_game(self):
@@ -187,20 +236,14 @@ class GameRoom(models.Model):
             self.status = self.STATUS_CANCELLED # Используем согласованное имя статуса
             self.save(update_fields=['status'])
             
-            if self.bet_amount > 0:
-                for player_obj in self.players.all():
-                    player_obj.cash += self.bet_amount
-                    if player_obj.current_room == self:
-                        player_obj.current_room = None
-                    player_obj.save(update_fields=['cash', 'current_room'])
-            else: # Если ставок не было, все равно обнуляем current_room
-                 for player_obj in self.players.all():
-                    if player_obj.current_room == self:
-                        player_obj.current_room = None
-                    player_obj.save(update_fields=['current_room'])
+            # Возврат ставки UPDATE-ом (см. Player.change_cash); current_room обнуляем и без ставки
+            for player_obj in self.players.all():
+                fields = {'current_room': None} if player_obj.current_room_id == self.id else {}
+                player_obj.change_cash(self.bet_amount, **fields)
             
             logger.info(f"Game room {self.id} cancelled.")
             PlayerActivity.objects.filter(room=self).delete()
+            events.emit(events.RoomCancelled(self.id, player_ids=tuple(self.players.values_list('id', flat=True))))
 
 
     def clean_up_inactive_waiting_room(self, timeout_seconds=300):
@@ -251,6 +294,13 @@ class Game(models.Model):
     deck = models.JSONField(default=list, help_text="Список карт в колоде")
     table = models.JSONField(default=list, help_text="Список карт на столе (атака/защита)")
     player_hands = models.JSONField(default=dict, help_text="Словарь {player_id: [карты]} для рук игроков")
+    finish_order = models.JSONField(default=list, help_text="ID игроков в порядке выхода из игры (без карт при пустой колоде)")
+
+    # Запись партии: по ней состояние на любом ходу восстанавливается заново (game/replay.py)
+    seed = models.CharField(max_length=64, blank=True, help_text="Seed раздачи (hex); пусто у партий до записи")
+    player_order = models.JSONField(default=list, help_text="ID игроков в порядке мест за столом")
+    moves = models.JSONField(default=list, help_text="Ходы строками '<место><действие><числа>', см. game_logic.encode_move")
+    archived_at = models.DateTimeField(null=True, blank=True, help_text="Когда состояние удалено и хранится только запись")
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -263,6 +313,24 @@ class Game(models.Model):
         return f"Игра для комнаты #{self.room.id} ({self.get_status_display()})"
 
 
+class ReplayCheckpoint(models.Model):
+    """
+    Состояние партии после каждого N-го хода (game/replay.py): просмотр хода k
+    начинается с ближайшей контрольной точки, а не с раздачи.
+    """
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='checkpoints')
+    move = models.PositiveIntegerField(help_text="Сколько ходов записи уже применено")
+    state = models.JSONField(help_text="ReplayGame.snapshot() на этом ходу")
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['game', 'move'], name='game_replay_checkpoint_unique')]
+        verbose_name = "Контрольная точка повтора"
+        verbose_name_plural = "Контрольные точки повторов"
+
+    def __str__(self):
+        return f"Партия #{self.game_id}, ход {self.move}"
+
+
 class PlayerActivity(models.Model):
     """
     Отслеживание активности игрока в комнате (для WebSockets, определения неактивных и т.д.)
@@ -284,4 +352,104 @@ class PlayerActivity(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.player.username} в комнате {self.room.name} (Активен: {self.is_active})"
\ No newline at end of file
+        return f"{self.player.username} в комнате {self.room.name} (Активен: {self.is_active})"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Материализованная строка рейтинга игрока (game/leaderboard.py).
+    Обновляется инкрементно при расчете партии, а не пересчитывается из Player.
+    """
+    player = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                  related_name='leaderboard_entry')
+    wins = models.PositiveIntegerField(default=0)
+    games = models.PositiveIntegerField(default=0)
+    win_rate = models.FloatField(default=0.0, help_text="Процент побед, wins / games * 100")
+    net_cash = models.IntegerField(default=0, help_text="Выигрыши минус ставки за все рассчитанные партии")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Строка рейтинга"
+        verbose_name_plural = "Рейтинг"
+
+    def __str__(self):
+        return f"{self.player_id}: {self.wins}/{self.games}"
+
+
+class GameParticipation(models.Model):
+    """
+    Строка истории: одна рассчитанная партия одного игрока (game/history.py).
+    Все, что показывает история, записано здесь же при расчете партии, так
+    что страница - один проход по индексу (player, -finished_at, -id).
+    """
+    RESULT_WIN = 'win'
+    RESULT_ESCAPED = 'escaped'
+    RESULT_LOSS = 'loss'
+    RESULT_DRAW = 'draw'
+
+    RESULT_CHOICES = [
+        (RESULT_WIN, 'Победа'),
+        (RESULT_ESCAPED, 'Вышел из игры'),
+        (RESULT_LOSS, 'Дурак'),
+        (RESULT_DRAW, 'Ничья'),
+    ]
+
+    player = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='participations')
+    room = models.ForeignKey(GameRoom, on_delete=models.CASCADE, related_name='participations')
+    finished_at = models.DateTimeField()
+    result = models.CharField(max_length=10, choices=RESULT_CHOICES)
+    place = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Место за столом, 1 - вышел первым")
+    opponents = models.JSONField(default=list, help_text="Соперники на момент партии: [{id, username}]")
+    bet_amount = models.PositiveIntegerField(default=0)
+    cash_delta = models.IntegerField(default=0, help_text="Выигрыш минус ставка")
+    rating_delta = models.FloatField(default=0.0)
+    duration = models.PositiveIntegerField(null=True, blank=True, help_text="Длительность партии, секунд")
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['player', 'room'], name='game_participation_unique')]
+        indexes = [models.Index(fields=['player', '-finished_at', '-id'], name='game_participation_history')]
+        verbose_name = "Участие в партии"
+        verbose_name_plural = "История партий"
+
+    def __str__(self):
+        return f"{self.player_id} в комнате #{self.room_id}: {self.result}"
+
+
+class Task(models.Model):
+    """
+    Фоновая задача (game/tasks.py). Очередь живет в той же БД, что и игра,
+    поэтому задача ставится атомарно с изменением, которое ее породило.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Выполнена'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    key = models.CharField(max_length=200, null=True, blank=True, unique=True,
+                           help_text="Ключ дедупликации: вторая задача с тем же ключом не ставится")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status}, попыток {self.attempts})"
@@ -0,0 +1,146 @@
+"""
+Исходящие сообщения комнат с порядковыми номерами.
+
+Каждое сообщение сервер→клиент для комнаты получает `seq` (сквозной номер
+в комнате) и попадает в кольцевой буфер последних сообщений. Клиент после
+переподключения присылает последний увиденный `seq` и получает только
+пропущенное; снимок состояния нужен лишь тогда, когда буфер уже не
+содержит его позицию.
+
+Где живут счётчик и буфер, решает канальный слой. С IPCChannelLayer
+(несколько процессов daphne) они общие и хранятся в брокере слоя: сокет,
+переподключившийся к другому процессу, продолжает с того же seq. С
+InMemoryChannelLayer - в памяти процесса (OutboxRegistry). Вместе с `seq`
+клиент получает `epoch` хранилища: после его рестарта номера начинаются
+заново и клиент уходит на снимок.
+
+Конверт группового сообщения несёт `id`, уникальный для каждой рассылки:
+по нему RoomPipeline отсекает копии одного события, пришедшие в разные
+consumer'ы процесса.
+"""
+import itertools
+import secrets
+import threading
+from collections import OrderedDict, deque
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+EPOCH = secrets.token_hex(4)
+_message_ids = itertools.count(1)
+
+
+def message_id() -> str:
+    """Id рассылки, уникальный среди процессов: epoch процесса + счётчик."""
+    return f'{EPOCH}:{next(_message_ids)}'
+
+
+def room_group_name(room_id) -> str:
+    return f'game_{room_id}'
+
+
+class RoomOutbox:
+    """Счётчик seq и кольцевой буфер сообщений одной комнаты."""
+
+    def __init__(self, size: int):
+        self.seq = 0
+        self.buffer: deque = deque(maxlen=size)
+
+    def append(self, message: dict) -> dict:
+        self.seq += 1
+        stamped = {**message, 'seq': self.seq, 'epoch': EPOCH}
+        self.buffer.append(stamped)
+        return stamped
+
+    def since(self, last_seq: int):
+        """Сообщения после last_seq или None, если буфер их уже не хранит."""
+        if last_seq >= self.seq:
+            return []
+        if not self.buffer or self.buffer[0]['seq'] > last_seq + 1:
+            return None
+        return [message for message in self.buffer if message['seq'] > last_seq]
+
+
+class OutboxRegistry:
+    """Буферы комнат процесса; старые комнаты вытесняются по LRU."""
+
+    def __init__(self):
+        self._rooms: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def buffer_size(self) -> int:
+        return getattr(settings, 'GAME_REPLAY_BUFFER_SIZE', 128)
+
+    @property
+    def max_rooms(self) -> int:
+        return getattr(settings, 'GAME_REPLAY_MAX_ROOMS', 10000)
+
+    def _get(self, room_id) -> RoomOutbox:
+        room_id = str(room_id)
+        outbox = self._rooms.get(room_id)
+        if outbox is None:
+            outbox = self._rooms[room_id] = RoomOutbox(self.buffer_size)
+            if len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+        else:
+            self._rooms.move_to_end(room_id)
+        return outbox
+
+    def stamp(self, room_id, message: dict) -> dict:
+        with self._lock:
+            return self._get(room_id).append(message)
+
+    def current_seq(self, room_id) -> int:
+        with self._lock:
+            return self._get(room_id).seq
+
+    def since(self, room_id, last_seq: int, epoch: str | None):
+        if epoch != EPOCH:
+            return None
+        with self._lock:
+            return self._get(room_id).since(last_seq)
+
+
+outboxes = OutboxRegistry()
+
+
+def _shared_layer():
+    """Канальный слой, который сам хранит outbox (IPCChannelLayer), иначе None."""
+    channel_layer = get_channel_layer()
+    return channel_layer if getattr(channel_layer, 'shared_outbox', False) else None
+
+
+async def publish(room_id, message: dict) -> dict:
+    """Нумерует сообщение и рассылает его всем сокетам комнаты."""
+    envelope = {'type': 'game_message', 'id': message_id()}
+    shared = _shared_layer()
+    if shared is not None:
+        return await shared.outbox_publish(room_group_name(room_id), str(room_id), message,
+                                           outboxes.buffer_size, envelope)
+    stamped = outboxes.stamp(room_id, message)
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        await channel_layer.group_send(room_group_name(room_id), {**envelope, 'message': stamped})
+    return stamped
+
+
+async def position(room_id) -> tuple[int, str]:
+    """(последний seq комнаты, epoch) - для 'hello' и снимка."""
+    shared = _shared_layer()
+    if shared is not None:
+        return await shared.outbox_position(str(room_id))
+    return outboxes.current_seq(room_id), EPOCH
+
+
+async def since(room_id, last_seq: int, epoch: str | None):
+    """Пропущенные после last_seq сообщения или None - тогда нужен снимок."""
+    shared = _shared_layer()
+    if shared is not None:
+        return await shared.outbox_since(str(room_id), last_seq, epoch)
+    return outboxes.since(room_id, last_seq, epoch)
+
+
+def publish_sync(room_id, message: dict) -> dict:
+    """То же из синхронного кода (views, DurakGame)."""
+    return async_to_sync(publish)(room_id, message)
@@ -0,0 +1,298 @@
+"""
+Выборочный сэмплирующий профайлер для конвейера хода.
+
+Включается одним из способов:
+  * GAME_PROFILING = True в настройках (env GAME_PROFILING=1);
+  * флаг GameRoom.profiling_enabled у конкретной комнаты;
+  * заголовок X-Profile: 1 (только staff или DEBUG), профилирует этот запрос.
+
+Из включенных запросов и действий WebSocket профилируется каждый
+GAME_PROFILE_SAMPLE_RATE-й. Фоновый поток раз в GAME_PROFILE_INTERVAL секунд
+снимает стек потока, который обрабатывает запрос, и по окончании пишет
+collapsed-стеки (формат flamegraph.pl / speedscope) в GAME_PROFILE_DIR,
+оставляя не больше GAME_PROFILE_MAX_FILES последних файлов:
+
+    cat profiles/*.folded | flamegraph.pl > moves.svg
+
+Для WebSocket и async-view снимается поток event loop целиком, так что в
+стеки попадут и соседние задачи этого цикла; работа, отданная в пулы
+game.executor, снимается в ту же сессию (profiler.follow). Когда
+профилирование выключено, цена на запрос - чтение двух настроек и проверка
+множества.
+"""
+import contextlib
+import contextvars
+import functools
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Как часто перечитывать из БД комнаты с флагом profiling_enabled
+ROOM_FLAGS_TTL = 10.0
+
+# Сессия текущего запроса/действия: по ней потоки пулов присоединяются к замеру
+_active_session: contextvars.ContextVar = contextvars.ContextVar('durak_profile_session', default=None)
+
+
+class _Session:
+    __slots__ = ('thread_id', 'kind', 'label', 'room_id', 'stacks', 'started', 'token')
+
+    def __init__(self, thread_id: int, kind: str, label: str, room_id):
+        self.thread_id = thread_id
+        self.kind = kind
+        self.label = label
+        self.room_id = room_id
+        self.stacks: Counter = Counter()
+        self.started = time.time()
+        self.token = None
+
+
+class SamplingProfiler:
+    """Один фоновый поток на процесс; спит, пока нет активных сессий."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: dict[int, _Session] = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._counter = itertools.count(1)
+        self._file_counter = itertools.count()
+        self._flagged_rooms: frozenset = frozenset()
+        self._flags_loaded_at = float('-inf')
+
+    # --- Решение, профилировать ли ---
+
+    def should_profile(self, room_id=None, forced: bool = False, refresh: bool = True) -> bool:
+        if forced:
+            return True
+        if not getattr(settings, 'GAME_PROFILING', False) and not self._room_flagged(room_id, refresh):
+            return False
+        rate = max(1, getattr(settings, 'GAME_PROFILE_SAMPLE_RATE', 100))
+        return next(self._counter) % rate == 0
+
+    def _flags_due(self) -> bool:
+        now = time.monotonic()
+        if now - self._flags_loaded_at <= ROOM_FLAGS_TTL:
+            return False
+        self._flags_loaded_at = now
+        return True
+
+    def _room_flagged(self, room_id, refresh: bool = True) -> bool:
+        # Из event loop синхронный ORM недоступен: там флаги обновляет arefresh_flags
+        if refresh and self._flags_due():
+            try:
+                from .models import GameRoom
+                self._flagged_rooms = frozenset(
+                    GameRoom.objects.filter(profiling_enabled=True).values_list('id', flat=True)
+                )
+            except Exception as e:
+                logger.warning("Не удалось прочитать флаги профилирования комнат: %s", e)
+        if room_id is None or not self._flagged_rooms:
+            return False
+        try:
+            return int(room_id) in self._flagged_rooms
+        except (TypeError, ValueError):
+            return False
+
+    def has_flagged_rooms(self, refresh: bool = True) -> bool:
+        self._room_flagged(None, refresh)
+        return bool(self._flagged_rooms)
+
+    async def arefresh_flags(self):
+        """Перечитывает флаги комнат из event loop, не чаще раза в ROOM_FLAGS_TTL."""
+        if not self._flags_due():
+            return
+        try:
+            from .models import GameRoom
+            self._flagged_rooms = frozenset([
+                room_id async for room_id in
+                GameRoom.objects.filter(profiling_enabled=True).values_list('id', flat=True)
+            ])
+        except Exception as e:
+            logger.warning("Не удалось прочитать флаги профилирования комнат: %s", e)
+
+    # --- Сессии ---
+
+    def start(self, kind: str, label: str, room_id=None) -> _Session:
+        session = _Session(threading.get_ident(), kind, label, room_id)
+        session.token = _active_session.set(session)
+        with self._lock:
+            self._sessions[id(session)] = session
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='game-profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return session
+
+    def stop(self, session: _Session):
+        _active_session.reset(session.token)
+        with self._lock:
+            self._sessions.pop(id(session), None)
+            if not self._sessions:
+                self._wakeup.clear()
+        if session.stacks:
+            try:
+                self._write(session)
+            except OSError as e:
+                logger.warning("Не удалось записать профиль: %s", e, extra={'room_id': session.room_id})
+
+    @contextlib.contextmanager
+    def follow(self):
+        """В потоке пула: снимать и этот поток в сессию вызвавшего запроса."""
+        parent = _active_session.get()
+        if parent is None:
+            yield
+            return
+        child = _Session(threading.get_ident(), parent.kind, parent.label, parent.room_id)
+        child.stacks = parent.stacks
+        with self._lock:
+            self._sessions[id(child)] = child
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._sessions.pop(id(child), None)
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while True:
+            self._wakeup.wait()
+            interval = getattr(settings, 'GAME_PROFILE_INTERVAL', 0.001)
+            with self._lock:
+                sessions = list(self._sessions.values())
+            if sessions:
+                frames = sys._current_frames()
+                for session in sessions:
+                    frame = frames.get(session.thread_id)
+                    if frame is not None and session.thread_id != own_ident:
+                        session.stacks[_collapse(frame)] += 1
+                del frames
+            time.sleep(interval)
+
+    # --- Файлы ---
+
+    def _write(self, session: _Session):
+        directory = getattr(settings, 'GAME_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(session.started))
+        room_part = f'room{session.room_id}-' if session.room_id is not None else ''
+        label = re.sub(r'[^A-Za-z0-9_.-]+', '_', session.label)
+        name = f'{stamp}-{os.getpid()}-{next(self._file_counter)}-{session.kind}-{room_part}{label}.folded'
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            for stack, count in session.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        self._rotate(directory)
+        logger.info("Профиль %s %s записан: %s", session.kind, session.label, path, extra={'room_id': session.room_id})
+
+    def _rotate(self, directory: str):
+        limit = getattr(settings, 'GAME_PROFILE_MAX_FILES', 200)
+        files = [os.path.join(directory, n) for n in os.listdir(directory) if n.endswith('.folded')]
+        if len(files) <= limit:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - limit]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def _collapse(frame) -> str:
+    """Стек от корня к листу: 'module.func;module.func'."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get('__name__', '?')
+        parts.append(f'{module}.{code.co_qualname}')
+        frame = frame.f_back
+    parts.reverse()
+    return ';'.join(parts)
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilingMiddleware:
+    """После AuthenticationMiddleware: профилирует выбранные запросы целиком."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        forced = request.headers.get('X-Profile') == '1' and (
+            settings.DEBUG or getattr(request.user, 'is_staff', False)
+        )
+        room_id = None
+        if not forced and profiler.has_flagged_rooms():
+            room_id = _room_id_from_path(request.path_info)
+        if not profiler.should_profile(room_id=room_id, forced=forced):
+            return self.get_response(request)
+
+        session = profiler.start('http', request.path_info.strip('/') or 'root', room_id)
+        try:
+            return self.get_response(request)
+        finally:
+            profiler.stop(session)
+
+    async def __acall__(self, request):
+        # В event loop синхронный ORM недоступен: пользователя грузим асинхронно
+        # и только ради заголовка, флаги комнат - через arefresh_flags
+        await profiler.arefresh_flags()
+        forced = False
+        if request.headers.get('X-Profile') == '1':
+            forced = settings.DEBUG or getattr(await request.auser(), 'is_staff', False)
+        room_id = None
+        if not forced and profiler.has_flagged_rooms(refresh=False):
+            room_id = _room_id_from_path(request.path_info)
+        if not profiler.should_profile(room_id=room_id, forced=forced, refresh=False):
+            return await self.get_response(request)
+
+        session = profiler.start('http', request.path_info.strip('/') or 'root', room_id)
+        try:
+            return await self.get_response(request)
+        finally:
+            profiler.stop(session)
+
+
+def _room_id_from_path(path: str):
+    from django.urls import Resolver404, resolve
+    try:
+        kwargs = resolve(path).kwargs
+    except Resolver404:
+        return None
+    return kwargs.get('room_id')
+
+
+def profiled_ws(action: str):
+    """Декоратор async-метода consumer'а: выборочно профилирует действие."""
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            room_id = getattr(self, 'room_id', None)
+            await profiler.arefresh_flags()
+            if not profiler.should_profile(room_id=room_id, refresh=False):
+                return await method(self, *args, **kwargs)
+            session = profiler.start('ws', action, room_id)
+            try:
+                return await method(self, *args, **kwargs)
+            finally:
+                profiler.stop(session)
+        return wrapper
+    return decorator
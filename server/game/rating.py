@@ -0,0 +1,83 @@
+"""
+Рейтинг Эло игроков (Player.rating).
+
+Партия на 3-4 игрока считается как набор дуэлей: каждый участник сыграл с
+каждым, выше тот, кто раньше вышел из игры, ниже всех - дурак. Для пары
+(i, j) ожидаемый результат E = 1 / (1 + 10 ** ((Rj - Ri) / 400)), фактический
+S = 1, 0.5 или 0. Итог игрока - K / (n - 1) * сумма (S - E) по соперникам:
+так размах изменения за партию не зависит от размера стола, а сумма
+изменений всех участников равна нулю (при одинаковом K).
+
+Новичкам (меньше GAME_RATING_PROVISIONAL_GAMES партий) K удваивается, чтобы
+рейтинг быстрее дошел до настоящего уровня.
+"""
+from django.conf import settings
+from django.db import models
+
+
+def expected_score(rating: float, opponent_rating: float) -> float:
+    return 1.0 / (1.0 + 10 ** ((opponent_rating - rating) / 400.0))
+
+
+def placement(player_ids, winner_id=None, loser_id=None, finish_order=None, is_draw=False) -> list[list[int]]:
+    """Места участников: список групп, внутри группы - ничья между собой."""
+    player_ids = list(player_ids)
+    if is_draw or len(player_ids) < 2:
+        return [player_ids]
+    order = [player_id for player_id in finish_order or () if player_id in player_ids and player_id != loser_id]
+    if not order and winner_id in player_ids:
+        order = [winner_id]
+    # Не успевшие выйти, но и не проигравшие (игру завершили досрочно) - делят место
+    middle = [player_id for player_id in player_ids if player_id not in order and player_id != loser_id]
+    groups = [[player_id] for player_id in order]
+    if middle:
+        groups.append(middle)
+    if loser_id in player_ids:
+        groups.append([loser_id])
+    return groups
+
+
+def rating_deltas(groups: list[list[int]], ratings: dict[int, float], k_factors: dict[int, float]) -> dict[int, float]:
+    """Изменение рейтинга каждого участника по попарным сравнениям мест."""
+    place = {player_id: number for number, group in enumerate(groups) for player_id in group}
+    player_ids = list(place)
+    if len(player_ids) < 2:
+        return {player_id: 0.0 for player_id in player_ids}
+    deltas = {}
+    for player_id in player_ids:
+        total = 0.0
+        for opponent_id in player_ids:
+            if opponent_id == player_id:
+                continue
+            if place[player_id] < place[opponent_id]:
+                score = 1.0
+            elif place[player_id] > place[opponent_id]:
+                score = 0.0
+            else:
+                score = 0.5
+            total += score - expected_score(ratings[player_id], ratings[opponent_id])
+        deltas[player_id] = k_factors[player_id] / (len(player_ids) - 1) * total
+    return deltas
+
+
+def k_factor(games_played: int) -> float:
+    k = getattr(settings, 'GAME_RATING_K', 32)
+    if games_played < getattr(settings, 'GAME_RATING_PROVISIONAL_GAMES', 10):
+        return k * 2
+    return k
+
+
+def update_ratings(groups: list[list[int]]) -> dict[int, float]:
+    """Пересчитывает Player.rating участников; вызывается из GameRoom.settle внутри транзакции."""
+    from players.models import Player
+    player_ids = [player_id for group in groups for player_id in group]
+    rows = list(Player.objects.filter(id__in=player_ids).values_list('id', 'rating', 'games_played'))
+    ratings = {player_id: rating for player_id, rating, _ in rows}
+    k_factors = {player_id: k_factor(games_played) for player_id, _, games_played in rows}
+    # Удаленные аккаунты выпадают из расчета
+    groups = [[player_id for player_id in group if player_id in ratings] for group in groups]
+    deltas = rating_deltas([group for group in groups if group], ratings, k_factors)
+    for player_id, delta in deltas.items():
+        if delta:
+            Player.objects.filter(id=player_id).update(rating=models.F('rating') + delta)
+    return deltas
@@ -0,0 +1,259 @@
+"""
+Воспроизведение партии по ее записи.
+
+Запись - это (Game.seed, Game.player_order, Game.moves). Колода однозначно
+получается из seed (cards.shuffled_deck), раздача и первый ход - теми же
+методами DurakGame, что и в живой игре, а затем по порядку применяются ходы.
+Ходы прогоняются через исходные методы без декораторов (inspect.unwrap):
+без транзакций, событий, метрик и записи в БД.
+
+    game = Game.objects.get(room_id=...)
+    replay(game, upto=10).snapshot()   # состояние после 10-го хода
+
+Законченную партию можно заархивировать (archive_game): стол, колода и руки
+удаляются из строки Game, остается запись в несколько сотен байт. Если
+архивную партию откроют, DurakGame восстановит состояние через
+restore_archived.
+
+Просмотр повтора (state_at, iter_moves) не проигрывает партию с начала: после
+окончания партии задача replay_checkpoints сохраняет состояние каждые
+GAME_REPLAY_CHECKPOINT_EVERY ходов (ReplayCheckpoint), и ход k считается от
+ближайшей точки не дальше k - не больше N-1 шагов. Готовое публичное
+состояние кладется в кэш по (партия, k): законченная партия не меняется.
+"""
+import copy
+import inspect
+import typing
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from players.models import Player
+from .cards import card_id
+from .game_logic import DurakGame, decode_move
+from .models import Game, GameRoom, ReplayCheckpoint
+
+ACTIONS = {
+    'attack': inspect.unwrap(DurakGame.attack),
+    'defend': inspect.unwrap(DurakGame.defend),
+    'take': inspect.unwrap(DurakGame.take_cards_action),
+    'pass_bito': inspect.unwrap(DurakGame.pass_or_bito_action),
+}
+
+RECORD_FIELDS = ('deck', 'table', 'player_hands', 'trump_suit', 'trump_card_revealed', 'finish_order')
+
+
+class ReplayError(Exception):
+    pass
+
+
+class ReplayGame(DurakGame):
+    """DurakGame в памяти: состояние только из записи, save_game_state ничего не пишет."""
+
+    def __init__(self, game: Game, players: typing.Optional[dict] = None):
+        if not game.seed:
+            raise ReplayError(f"У партии {game.id} нет записи (seed)")
+        if players is None:
+            players = Player.objects.in_bulk(game.player_order)
+        self.record = game
+        self.room = GameRoom(id=game.room_id)
+        # Удаленный аккаунт заменяется заглушкой: для правил нужен только id
+        self.players = [players.get(player_id) or Player(id=player_id, username=f'#{player_id}')
+                        for player_id in game.player_order]
+        self.game_model_instance = Game(room_id=game.room_id, status=GameRoom.STATUS_PLAYING)
+        self.player_hands_data = {str(p.id): [] for p in self.players}
+        self.deck = self._generate_deck(game.seed)
+        self.trump_suit = None
+        self.trump_card_revealed = None
+        self.table = []
+        self.finish_order = []
+        self._recording_move = None
+        self.result: typing.Optional[dict] = None
+        self.position = 0
+        self._initialize_hands_and_trump()
+        self._set_initial_attacker_defender()
+
+    def save_game_state(self, game_over_result: typing.Optional[dict] = None):
+        if game_over_result and game_over_result.get('game_over'):
+            self.game_model_instance.status = GameRoom.STATUS_FINISHED
+            self.result = game_over_result
+
+    def step(self) -> dict:
+        """Применяет следующий ход записи; ReplayError, если правила его не принимают."""
+        if self.position >= len(self.record.moves):
+            raise ReplayError("Ходы закончились")
+        token = self.record.moves[self.position]
+        try:
+            player_id, action_type, args = decode_move(self.record.player_order, token)
+        except (KeyError, IndexError, ValueError):
+            raise ReplayError(f"Ход {self.position}: не разобрать {token!r}")
+        player_user = next(p for p in self.players if p.id == player_id)
+        result = ACTIONS[action_type](self, player_user, *args)
+        if not result.get('success'):
+            raise ReplayError(f"Ход {self.position} ({action_type}) не принят: {result.get('message')}")
+        self.position += 1
+        return result
+
+    def advance(self, upto: typing.Optional[int] = None) -> 'ReplayGame':
+        upto = len(self.record.moves) if upto is None else min(upto, len(self.record.moves))
+        while self.position < upto:
+            self.step()
+        return self
+
+    def snapshot(self) -> dict:
+        """Состояние в формате полей Game (списки общие с игрой - для хранения нужна копия)."""
+        attacker = self.players[self.attacker_index] if self.players else None
+        return {
+            'deck': self.deck,
+            'table': self.table,
+            'player_hands': self.player_hands_data,
+            'trump_suit': self.trump_suit,
+            'trump_card_revealed': self.trump_card_revealed,
+            'finish_order': self.finish_order,
+            'current_turn_id': attacker.id if attacker else None,
+            'attacker_index': self.attacker_index,
+            'defender_index': self.defender_index,
+            'game_over': self.result is not None,
+            'move': self.position,
+        }
+
+    def restore(self, state: dict) -> 'ReplayGame':
+        """Продолжить с сохраненного snapshot() вместо раздачи."""
+        self.deck = state['deck']
+        self.table = state['table']
+        self.player_hands_data = state['player_hands']
+        self.trump_suit = state['trump_suit']
+        self.trump_card_revealed = state['trump_card_revealed']
+        self.finish_order = state['finish_order']
+        self.attacker_index = state['attacker_index']
+        self.defender_index = state['defender_index']
+        self.position = state['move']
+        if state.get('game_over'):
+            self.game_model_instance.status = GameRoom.STATUS_FINISHED
+            self.result = {'game_over': True}
+        return self
+
+    def public_state(self) -> dict:
+        """Состояние для просмотра повтора: все руки открыты, карты - id."""
+        return {
+            'move': self.position,
+            'total_moves': len(self.record.moves),
+            'players': [{
+                'id': p.id,
+                'username': p.username,
+                'cards': [card_id(card) for card in self._get_player_hand(p)],
+                'finished': str(p.id) in self.finish_order,
+            } for p in self.players],
+            'table': [{'attack_card': card_id(pair['attack_card']), 'defense_card': card_id(pair.get('defense_card'))}
+                      for pair in self.table],
+            'deck_count': len(self.deck),
+            'trump_suit': self.trump_suit,
+            'trump_card': card_id(self.trump_card_revealed),
+            'attacker_id': self.players[self.attacker_index].id if self.players else None,
+            'defender_id': self.players[self.defender_index].id if self.players else None,
+            'finish_order': [int(player_id) for player_id in self.finish_order],
+            'game_over': self.result is not None,
+        }
+
+    def describe_next(self) -> dict:
+        """Следующий ход записи с картами, которые в нем сыграны (до его применения)."""
+        player_id, action_type, args = decode_move(self.record.player_order, self.record.moves[self.position])
+        hand = self.player_hands_data[str(player_id)]
+        if action_type == 'attack':
+            cards = [hand[index] for index in args[0]]
+        elif action_type == 'defend':
+            cards = [hand[args[1]]]
+        else:
+            cards = []
+        return {'move': self.position + 1, 'player_id': player_id, 'action_type': action_type,
+                'cards': [card_id(card) for card in cards]}
+
+
+def replay(game: Game, upto: typing.Optional[int] = None) -> ReplayGame:
+    """Состояние после первых upto ходов записи (по умолчанию - всех)."""
+    return ReplayGame(game).advance(upto)
+
+
+def restore_archived(game: Game):
+    """Заполняет поля состояния архивной партии в памяти, без записи в БД."""
+    state = replay(game).snapshot()
+    for field in RECORD_FIELDS:
+        setattr(game, field, state[field])
+
+
+def verify(game: Game) -> bool:
+    """Запись воспроизводит сохраненное финальное состояние."""
+    try:
+        state = replay(game).snapshot()
+    except ReplayError:
+        return False
+    return all(state[field] == getattr(game, field) for field in RECORD_FIELDS)
+
+
+def archive_game(game: Game) -> bool:
+    """Удаляет состояние законченной партии, если запись его воспроизводит."""
+    if game.archived_at or game.status != GameRoom.STATUS_FINISHED or not verify(game):
+        return False
+    return bool(Game.objects.filter(id=game.id, archived_at__isnull=True).update(
+        archived_at=timezone.now(), deck=[], table=[], player_hands={}, trump_card_revealed=None,
+    ))
+
+
+# --- Просмотр повтора ---------------------------------------------------
+
+def checkpoint_every() -> int:
+    return max(getattr(settings, 'GAME_REPLAY_CHECKPOINT_EVERY', 16), 1)
+
+
+def build_checkpoints(game: Game) -> int:
+    """Один проход по записи с сохранением каждой N-й позиции; повторный вызов ничего не добавит."""
+    every = checkpoint_every()
+    replayed = ReplayGame(game, players={})
+    checkpoints = [ReplayCheckpoint(game=game, move=0, state=copy.deepcopy(replayed.snapshot()))]
+    while replayed.position < len(game.moves):
+        replayed.step()
+        if replayed.position % every == 0:
+            checkpoints.append(ReplayCheckpoint(game=game, move=replayed.position,
+                                                state=copy.deepcopy(replayed.snapshot())))
+    ReplayCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+    return len(checkpoints)
+
+
+def _replay_from_checkpoint(game: Game, move: int) -> ReplayGame:
+    """ReplayGame на ходу move: от ближайшей контрольной точки, при их отсутствии - строит их."""
+    checkpoint = game.checkpoints.filter(move__lte=move).order_by('-move').values_list('state', flat=True).first()
+    if checkpoint is None:
+        build_checkpoints(game)
+        checkpoint = game.checkpoints.filter(move__lte=move).order_by('-move').values_list('state', flat=True).first()
+    replayed = ReplayGame(game)
+    if checkpoint is not None:
+        replayed.restore(checkpoint)
+    return replayed.advance(move)
+
+
+def _cache_key(game: Game, move: int) -> str:
+    return f'replay:{game.id}:{move}'
+
+
+def state_at(game: Game, move: int) -> dict:
+    """Публичное состояние после move ходов (0 - сразу после раздачи)."""
+    move = max(0, min(move, len(game.moves)))
+    state = cache.get(_cache_key(game, move))
+    if state is None:
+        state = _replay_from_checkpoint(game, move).public_state()
+        cache.set(_cache_key(game, move), state, getattr(settings, 'GAME_REPLAY_CACHE_TTL', 3600))
+    return state
+
+
+def iter_moves(game: Game, start: int, stop: int, with_states: bool = False):
+    """Ходы start+1..stop с картами; with_states - и состояние после каждого (заодно в кэш)."""
+    start = max(0, min(start, len(game.moves)))
+    stop = max(start, min(stop, len(game.moves)))
+    replayed = _replay_from_checkpoint(game, start)
+    ttl = getattr(settings, 'GAME_REPLAY_CACHE_TTL', 3600)
+    while replayed.position < stop:
+        entry = replayed.describe_next()
+        replayed.step()
+        if with_states:
+            entry['state'] = replayed.public_state()
+            cache.add(_cache_key(game, replayed.position), entry['state'], ttl)
+        yield entry
@@ -0,0 +1,269 @@
+"""
+Выгрузка законченных партий для офлайн-аналитики и чтение выгрузки обратно.
+
+Команда ``python manage.py export_replays --out DIR`` пишет три таблицы:
+
+    games  - партия: участники, козырь, исход, ставка, число ходов
+    hands  - стартовые руки: по строке на карту (game_id, seat, card)
+    moves  - ходы: по строке на сыгранную карту; взять/бито - одна строка с card = -1
+
+Карты - номера 0..35 в порядке cards.all_card_ids() (как в MessagePack-кодеке
+сокета), масти - номера в cards.SUITS, -1 - "нет". Руки и карты ходов
+восстанавливаются проигрыванием записи (game/replay.py); у партий без записи
+(до появления seed) в games есть только итог, а hands и moves пусты.
+
+Партии читаются из БД через iterator() порциями по --chunk и пишутся
+порциями же, так что память не растет с размером истории. Формат - Parquet
+или Arrow IPC, если установлен pyarrow, иначе CSV.
+
+Для анализа: load_export(DIR) -> {'games': DataFrame, ...} (pandas) или
+load_arrays(path) -> {колонка: numpy.ndarray}.
+"""
+import csv
+import os
+import typing
+from .cards import SUITS, all_card_ids
+from .game_logic import decode_move
+from .models import Game, GameRoom
+from .replay import ReplayError, ReplayGame
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+CARD_CODES = {card: number for number, card in enumerate(all_card_ids())}
+SUIT_CODES = {suit: number for number, suit in enumerate(SUITS)}
+ACTION_CODES = {'attack': 0, 'defend': 1, 'take': 2, 'pass_bito': 3}
+
+TABLES = {
+    'games': [
+        ('game_id', 'int64'), ('room_id', 'int64'), ('finished_at', 'int64'), ('player_count', 'int8'),
+        ('bet_amount', 'int64'), ('trump_suit', 'int8'), ('trump_card', 'int8'), ('winner_id', 'int64'),
+        ('loser_id', 'int64'), ('is_draw', 'bool'), ('move_count', 'int32'), ('recorded', 'bool'),
+    ],
+    'hands': [('game_id', 'int64'), ('seat', 'int8'), ('player_id', 'int64'), ('card', 'int8')],
+    'moves': [
+        ('game_id', 'int64'), ('move', 'int32'), ('seat', 'int8'), ('action', 'int8'),
+        ('card', 'int8'), ('deck_left', 'int8'), ('table_size', 'int8'),
+    ],
+}
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow', 'csv': '.csv'}
+
+if pyarrow is not None:
+    ARROW_TYPES = {'int8': pyarrow.int8, 'int32': pyarrow.int32, 'int64': pyarrow.int64, 'bool': pyarrow.bool_}
+
+
+def available_format(requested: str = 'auto') -> str:
+    if requested == 'auto':
+        return 'parquet' if pyarrow is not None else 'csv'
+    if requested in ('parquet', 'arrow') and pyarrow is None:
+        raise ImportError(f"Для формата {requested} нужен пакет pyarrow")
+    return requested
+
+
+def _card(card: typing.Optional[dict]) -> int:
+    return CARD_CODES.get(card['id'], -1) if card else -1
+
+
+# --- Строки таблиц -------------------------------------------------------
+
+def game_rows(game: Game) -> tuple[dict, list[tuple], list[tuple]]:
+    """Строка games и строки hands/moves одной партии."""
+    room = game.room
+    finish_order = [int(player_id) for player_id in game.finish_order or ()]
+    player_ids = list(game.player_order) or [int(player_id) for player_id in game.player_hands]
+    loser_id = next((player_id for player_id in player_ids if player_id not in finish_order), None) if finish_order else None
+    summary = {
+        'game_id': game.id,
+        'room_id': room.id,
+        'finished_at': int((room.settled_at or game.updated_at).timestamp() * 1000),
+        'player_count': len(player_ids),
+        'bet_amount': room.bet_amount,
+        'trump_suit': SUIT_CODES.get(game.trump_suit, -1),
+        'trump_card': _card(game.trump_card_revealed),
+        'winner_id': room.winner_id or -1,
+        'loser_id': loser_id or -1,
+        'is_draw': room.winner_id is None and loser_id is None,
+        'move_count': len(game.moves),
+        'recorded': bool(game.seed),
+    }
+    if not game.seed:
+        return summary, [], []
+
+    # Имена не нужны: игроки-заглушки без запроса к БД
+    replayed = ReplayGame(game, players={})
+    summary['trump_card'] = _card(replayed.trump_card_revealed)
+    hands = [(game.id, seat, player_id, _card(card))
+             for seat, player_id in enumerate(game.player_order)
+             for card in replayed.player_hands_data[str(player_id)]]
+    moves = []
+    for number, token in enumerate(game.moves):
+        player_id, action_type, args = decode_move(game.player_order, token)
+        seat = game.player_order.index(player_id)
+        hand = replayed.player_hands_data[str(player_id)]
+        if action_type == 'attack':
+            played = [hand[index] for index in args[0]]
+        elif action_type == 'defend':
+            played = [hand[args[1]]]
+        else:
+            played = [None]
+        deck_left, table_size = len(replayed.deck), len(replayed.table)
+        moves.extend((game.id, number, seat, ACTION_CODES[action_type], _card(card), deck_left, table_size)
+                     for card in played)
+        replayed.step()
+    return summary, hands, moves
+
+
+def iter_finished_games(chunk: int = 500):
+    return Game.objects.filter(status=GameRoom.STATUS_FINISHED).select_related('room').order_by('id').iterator(chunk_size=chunk)
+
+
+# --- Запись -------------------------------------------------------------
+
+class _CsvWriter:
+    def __init__(self, path: str, columns: list[tuple[str, str]]):
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in columns])
+
+    def write(self, rows: list[tuple]):
+        self._writer.writerows((int(value) if isinstance(value, bool) else value for value in row) for row in rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _ArrowWriter:
+    def __init__(self, path: str, columns: list[tuple[str, str]], file_format: str):
+        self._schema = pyarrow.schema([(name, ARROW_TYPES[type_name]()) for name, type_name in columns])
+        self._sink = None
+        if file_format == 'parquet':
+            self._writer = pyarrow.parquet.ParquetWriter(path, self._schema, compression='zstd')
+        else:
+            self._sink = pyarrow.OSFile(path, 'wb')
+            self._writer = pyarrow.ipc.new_file(self._sink, self._schema)
+
+    def write(self, rows: list[tuple]):
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        batch = pyarrow.record_batch(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+            schema=self._schema,
+        )
+        self._writer.write_table(pyarrow.Table.from_batches([batch]))
+
+    def close(self):
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+
+def _open_writer(path: str, columns, file_format: str):
+    if file_format == 'csv':
+        return _CsvWriter(path, columns)
+    return _ArrowWriter(path, columns, file_format)
+
+
+def export(out_dir: str, file_format: str = 'auto', chunk: int = 500, games=None) -> dict[str, int]:
+    """Пишет games/hands/moves в out_dir; возвращает число строк в каждой таблице."""
+    file_format = available_format(file_format)
+    os.makedirs(out_dir, exist_ok=True)
+    writers = {name: _open_writer(os.path.join(out_dir, name + FORMATS[file_format]), columns, file_format)
+               for name, columns in TABLES.items()}
+    buffers: dict[str, list] = {name: [] for name in TABLES}
+    counts = {name: 0 for name in TABLES}
+    skipped = 0
+
+    def flush():
+        for name, rows in buffers.items():
+            writers[name].write(rows)
+            counts[name] += len(rows)
+            rows.clear()
+
+    try:
+        for number, game in enumerate(games if games is not None else iter_finished_games(chunk), start=1):
+            try:
+                summary, hands, moves = game_rows(game)
+            except (ReplayError, LookupError, ValueError):
+                skipped += 1
+                continue
+            buffers['games'].append(tuple(summary[name] for name, _ in TABLES['games']))
+            buffers['hands'].extend(hands)
+            buffers['moves'].extend(moves)
+            if number % chunk == 0:
+                flush()
+        flush()
+    finally:
+        for writer in writers.values():
+            writer.close()
+    counts['skipped'] = skipped
+    return counts
+
+
+# --- Чтение -------------------------------------------------------------
+
+def _find(out_dir: str, name: str) -> str:
+    for extension in FORMATS.values():
+        path = os.path.join(out_dir, name + extension)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(os.path.join(out_dir, name))
+
+
+def _table_name(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _read_arrow(path: str):
+    if path.endswith('.parquet'):
+        return pyarrow.parquet.read_table(path)
+    with pyarrow.OSFile(path, 'rb') as source:
+        return pyarrow.ipc.open_file(source).read_all()
+
+
+def load_table(path: str):
+    """Одна таблица выгрузки как pandas.DataFrame с теми же типами колонок."""
+    if pandas is None:
+        raise ImportError("Для load_table нужен пакет pandas")
+    if path.endswith('.csv'):
+        # bool в CSV записан как 0/1
+        types = {column: 'int8' if type_name == 'bool' else type_name for column, type_name in TABLES[_table_name(path)]}
+        frame = pandas.read_csv(path, dtype=types)
+        return frame.astype({column: bool for column, type_name in TABLES[_table_name(path)] if type_name == 'bool'})
+    return _read_arrow(path).to_pandas()
+
+
+def load_export(out_dir: str) -> dict:
+    """{'games': DataFrame, 'hands': DataFrame, 'moves': DataFrame}."""
+    return {name: load_table(_find(out_dir, name)) for name in TABLES}
+
+
+def load_arrays(path: str) -> dict:
+    """Таблица как {колонка: numpy.ndarray} - без pandas."""
+    if numpy is None:
+        raise ImportError("Для load_arrays нужен пакет numpy")
+    if not path.endswith('.csv'):
+        table = _read_arrow(path)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+    with open(path, newline='', encoding='utf-8') as source:
+        reader = csv.reader(source)
+        header = next(reader)
+        columns = list(zip(*reader)) or [()] * len(header)
+    types = dict(TABLES[_table_name(path)])
+    return {column: numpy.array([int(value) for value in values], dtype=types[column])
+            for column, values in zip(header, columns)}
@@ -0,0 +1,147 @@
+"""
+Индексируемый skiplist: упорядоченное множество ключей с поиском по
+позиции и позицией ключа за O(log n) в среднем.
+
+У каждой ссылки хранится ширина - сколько элементов нижнего уровня она
+перепрыгивает; сумма ширин по пути поиска и есть позиция. Ключи должны быть
+уникальны и сравнимы (в лидерборде - кортежи с id игрока в конце, в индексе
+комнат подбора - кортежи (рейтинг, id комнаты)).
+"""
+import random
+
+MAX_LEVEL = 32
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next: list = [None] * level
+        self.width: list[int] = [1] * level
+
+
+class IndexableSkiplist:
+    def __init__(self, keys=(), seed=None):
+        self._random = random.Random(seed)
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        for key in sorted(keys):
+            self.add(key)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        node = self._head.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self._random.random() < 0.5:
+            level += 1
+        return level
+
+    def _path(self, key):
+        """Последний узел < key на каждом уровне и позиция каждого из них."""
+        update = [self._head] * MAX_LEVEL
+        positions = [0] * MAX_LEVEL
+        node, position = self._head, 0
+        for level in reversed(range(self._level)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            update[level] = node
+            positions[level] = position
+        return update, positions
+
+    def add(self, key):
+        update, positions = self._path(key)
+        candidate = update[0].next[0]
+        if candidate is not None and candidate.key == key:
+            return
+        level = self._random_level()
+        if level > self._level:
+            for extra in range(self._level, level):
+                update[extra] = self._head
+                positions[extra] = 0
+                self._head.width[extra] = self._size + 1
+            self._level = level
+        node = _Node(key, level)
+        position = positions[0] + 1  # позиция нового узла, считая head нулевым
+        for lvl in range(level):
+            prev = update[lvl]
+            node.next[lvl] = prev.next[lvl]
+            prev.next[lvl] = node
+            node.width[lvl] = prev.width[lvl] - (position - positions[lvl]) + 1
+            prev.width[lvl] = position - positions[lvl]
+        for lvl in range(level, self._level):
+            update[lvl].width[lvl] += 1
+        self._size += 1
+
+    def remove(self, key) -> bool:
+        update, _ = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            return False
+        for lvl in range(self._level):
+            prev = update[lvl]
+            if prev.next[lvl] is node:
+                prev.width[lvl] += node.width[lvl] - 1
+                prev.next[lvl] = node.next[lvl]
+            else:
+                prev.width[lvl] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def bisect_left(self, key) -> int:
+        """Сколько ключей меньше key (позиция, куда он встал бы)."""
+        _, positions = self._path(key)
+        return positions[0]
+
+    def iter_from(self, key):
+        """Ключи >= key по возрастанию: O(log n) до первого, дальше по одному."""
+        update, _ = self._path(key)
+        node = update[0].next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+    def index(self, key) -> int:
+        """Позиция ключа с нуля; ValueError, если ключа нет."""
+        update, positions = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise ValueError(key)
+        return positions[0]
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return self._node_at(index).key
+
+    def _node_at(self, index: int):
+        node, position = self._head, -1
+        for level in reversed(range(self._level)):
+            while node.next[level] is not None and position + node.width[level] <= index:
+                position += node.width[level]
+                node = node.next[level]
+        return node
+
+    def slice(self, start: int, count: int) -> list:
+        """count ключей начиная с позиции start: O(log n + count)."""
+        if start >= self._size or count <= 0:
+            return []
+        node = self._node_at(max(start, 0))
+        result = []
+        while node is not None and len(result) < count:
+            result.append(node.key)
+            node = node.next[0]
+        return result
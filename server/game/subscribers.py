@@ -0,0 +1,45 @@
+"""
+Подписчики доменных событий (game.events). Импортируется из GameConfig.ready.
+"""
+from channels.db import database_sync_to_async
+from . import events
+from .matchmaking import room_index
+from .outbox import publish
+
+
+def _room_broadcast_state(room_id):
+    from .game_logic import DurakGame
+    from .models import GameRoom
+
+    try:
+        room = GameRoom.objects.get(id=room_id)
+    except GameRoom.DoesNotExist:
+        return None
+    return DurakGame(room).broadcast_state()
+
+
+@events.subscribe(events.GameFinished)
+async def notify_game_finished(batch):
+    """Итог партии - всем сокетам комнаты, отдельно от последнего move_applied."""
+    for event in batch:
+        await publish(event.room_id, {
+            'action': 'game_finished',
+            'winner_id': event.winner_id,
+            'loser_id': event.loser_id,
+            'is_draw': event.is_draw,
+        })
+
+
+@events.subscribe(events.PlayerJoined, events.PlayerLeft, events.GameStarted, events.RoomCancelled)
+async def notify_room_updated(batch):
+    """Состав или статус комнаты изменился: новое состояние - сокетам комнаты, по разу на комнату в пачке."""
+    for room_id in dict.fromkeys(event.room_id for event in batch):
+        state = await database_sync_to_async(_room_broadcast_state)(room_id)
+        if state is not None:
+            await publish(room_id, {'action': 'room_updated', **state})
+
+
+@events.subscribe(events.RoomCreated, events.PlayerJoined, events.PlayerLeft,
+                  events.GameStarted, events.GameFinished, events.RoomCancelled)
+def reindex_room(event):
+    room_index.touch(event.room_id)
@@ -0,0 +1,218 @@
+"""
+Фоновые задачи без внешнего брокера: очередь - таблица Task в той же SQLite.
+
+    @task('settle_game')
+    def settle_game(room_id, winner_id=None, is_draw=False, loser_id=None, finish_order=None): ...
+
+    enqueue('settle_game', key=f'settle_game:{room.id}', room_id=room.id)
+
+enqueue() пишет строку в текущей транзакции и будит воркеров после ее
+фиксации, так что запрос не ждет выполнения. Воркеры - GAME_TASK_WORKERS
+потоков процесса (запускаются при первой постановке задачи) или отдельный
+процесс ``python manage.py run_tasks``.
+
+Гарантия - at-least-once: задача захватывается на GAME_TASK_LEASE секунд, и
+если процесс умер посреди выполнения, после истечения аренды ее заберет
+другой воркер. Поэтому обработчики обязаны быть идемпотентными. Упавшая
+задача повторяется с экспоненциальной паузой до max_attempts раз, затем
+остается в статусе failed с текстом ошибки.
+"""
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from django.conf import settings
+from django.db import close_old_connections, models, transaction
+from django.utils import timezone
+from .models import Game, GameRoom, Task
+
+logger = logging.getLogger(__name__)
+
+_handlers: dict = {}
+
+
+def task(name: str):
+    """Регистрирует обработчик задачи; аргументы приходят из payload."""
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name: str, key: str | None = None, delay: float = 0, max_attempts: int | None = None, **payload) -> Task:
+    """Ставит задачу; с тем же key вторая не появится (возвращается существующая)."""
+    if name not in _handlers:
+        raise ValueError(f"Неизвестная задача: {name}")
+    fields = {
+        'name': name,
+        'payload': payload,
+        'run_after': timezone.now() + datetime.timedelta(seconds=delay),
+        'max_attempts': max_attempts or getattr(settings, 'GAME_TASK_MAX_ATTEMPTS', 5),
+    }
+    if key is None:
+        queued = Task.objects.create(**fields)
+    else:
+        queued, _ = Task.objects.get_or_create(key=key, defaults=fields)
+    transaction.on_commit(runner.wake)
+    return queued
+
+
+# --- Выполнение -----------------------------------------------------------
+
+def _due(now):
+    # Ожидающие, чье время пришло, и захваченные, чья аренда истекла
+    return (models.Q(status=Task.STATUS_PENDING, run_after__lte=now)
+            | models.Q(status=Task.STATUS_RUNNING, locked_until__lt=now))
+
+
+def claim(worker: str) -> Task | None:
+    """Захватывает одну готовую задачу; гонку воркеров решает условный UPDATE."""
+    now = timezone.now()
+    lease = datetime.timedelta(seconds=getattr(settings, 'GAME_TASK_LEASE', 60))
+    candidates = list(Task.objects.filter(_due(now)).order_by('run_after', 'id').values_list('id', flat=True)[:8])
+    for task_id in candidates:
+        claimed = Task.objects.filter(_due(now), id=task_id).update(
+            status=Task.STATUS_RUNNING,
+            locked_by=worker,
+            locked_until=now + lease,
+            attempts=models.F('attempts') + 1,
+        )
+        if claimed:
+            return Task.objects.get(id=task_id)
+    return None
+
+
+def execute(queued: Task):
+    handler = _handlers.get(queued.name)
+    owned = Task.objects.filter(id=queued.id, locked_by=queued.locked_by, status=Task.STATUS_RUNNING)
+    try:
+        if handler is None:
+            raise LookupError(f"Нет обработчика для задачи {queued.name}")
+        handler(**queued.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if queued.attempts >= queued.max_attempts:
+            owned.update(status=Task.STATUS_FAILED, last_error=error, finished_at=timezone.now(), locked_until=None)
+            logger.error("Task %s #%s failed after %s attempts", queued.name, queued.id, queued.attempts,
+                         extra={'task_id': queued.id})
+        else:
+            backoff = min(2 ** queued.attempts, getattr(settings, 'GAME_TASK_MAX_BACKOFF', 300))
+            owned.update(status=Task.STATUS_PENDING, last_error=error, locked_until=None,
+                         run_after=timezone.now() + datetime.timedelta(seconds=backoff))
+            logger.warning("Task %s #%s attempt %s failed, retry in %ss", queued.name, queued.id, queued.attempts,
+                           backoff, extra={'task_id': queued.id})
+        return False
+    owned.update(status=Task.STATUS_DONE, finished_at=timezone.now(), locked_until=None)
+    return True
+
+
+def run_pending(worker: str = 'inline', limit: int | None = None) -> int:
+    """Выполняет готовые задачи в текущем потоке (run_tasks --once, скрипты)."""
+    done = 0
+    while limit is None or done < limit:
+        queued = claim(worker)
+        if queued is None:
+            break
+        execute(queued)
+        done += 1
+    return done
+
+
+def purge_finished(older_than: float) -> int:
+    cutoff = timezone.now() - datetime.timedelta(seconds=older_than)
+    deleted, _ = Task.objects.filter(status=Task.STATUS_DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+class TaskRunner:
+    """Потоки-воркеры процесса; спят до wake() или до опроса раз в GAME_TASK_POLL секунд."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._purged_at = 0.0
+
+    @property
+    def workers(self) -> int:
+        return getattr(settings, 'GAME_TASK_WORKERS', 2)
+
+    def wake(self):
+        if not self._threads and self.workers > 0:
+            self.start(self.workers)
+        self._wakeup.set()
+
+    def start(self, workers: int):
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            prefix = f'{socket.gethostname()}:{os.getpid()}'
+            for number in range(workers):
+                thread = threading.Thread(target=self._run, args=(f'{prefix}:{number}',),
+                                          name=f'game-task-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def _run(self, worker: str):
+        poll = getattr(settings, 'GAME_TASK_POLL', 1.0)
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                queued = claim(worker)
+                if queued is not None:
+                    execute(queued)
+                    continue
+                self._maybe_purge()
+            except Exception:
+                logger.exception("Task worker %s error", worker)
+            finally:
+                close_old_connections()
+            self._wakeup.wait(poll)
+            self._wakeup.clear()
+
+    def _maybe_purge(self):
+        retention = getattr(settings, 'GAME_TASK_RETENTION', 24 * 3600)
+        now = time.monotonic()
+        if now - self._purged_at < min(retention, 3600):
+            return
+        self._purged_at = now
+        deleted = purge_finished(retention)
+        if deleted:
+            logger.info("Purged %s finished tasks", deleted)
+
+
+runner = TaskRunner()
+
+
+# --- Задачи игры ----------------------------------------------------------
+
+@task('settle_game')
+def settle_game(room_id, winner_id=None, is_draw=False, loser_id=None, finish_order=None):
+    """Балансы, статистика и очистка после партии. Идемпотентна: см. GameRoom.settle."""
+    try:
+        room = GameRoom.objects.get(id=room_id)
+    except GameRoom.DoesNotExist:
+        return
+    room.settle(winner_id=winner_id, is_draw=is_draw, loser_id=loser_id, finish_order=finish_order)
+
+
+@task('replay_checkpoints')
+def replay_checkpoints(room_id):
+    """Контрольные точки для просмотра повтора законченной партии."""
+    from .replay import build_checkpoints
+    game = Game.objects.filter(room_id=room_id, status=GameRoom.STATUS_FINISHED).exclude(seed='').first()
+    if game is not None:
+        build_checkpoints(game)
@@ -0,0 +1,17 @@
+from django import template
+from django.utils.html import format_html
+from game.cards import BACK_ID, card_label
+
+register = template.Library()
+
+
+@register.simple_tag
+def card_sprite(card_id, css_class='game-card-image', title=''):
+    """Карта из спрайт-атласа: <span class="card-sprite card-<id> ...">."""
+    card_id = card_id or BACK_ID
+    label = card_label(card_id)
+    return format_html(
+        '<span class="card-sprite card-{} {}" role="img" aria-label="{}" title="{}"></span>',
+        card_id, css_class, label, f'{title}{label}' if title else label,
+    )
+
@@ -1,3 +1,343 @@
-from django.test import TestCase
+import datetime
+import threading
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from players.models import Player
+from . import history, replay, tasks, views
+from .autoplay import choose_move
+from .game_logic import DurakGame
+from .leaderboard import Leaderboard
+from .models import Game, GameParticipation, GameRoom, ReplayCheckpoint
+from .timers import apply_turn_timeout
 
-# Create your tests here.
+
+def make_room(player_count=2, bet=0, prefix='p'):
+    players = [Player.objects.create_user(username=f'{prefix}{i}', password=None, cash=1000)
+               for i in range(player_count)]
+    room = GameRoom.objects.create(creator=players[0], max_players=player_count, bet_amount=bet)
+    room.players.add(*players)
+    return room, players
+
+
+def start(room, seed='0' * 32):
+    room.start_game(seed=seed)
+    room.refresh_from_db()
+    return DurakGame(room)
+
+
+def acting_move(game_logic):
+    for player in (game_logic.players[game_logic.defender_index], game_logic.players[game_logic.attacker_index]):
+        move = choose_move(game_logic.get_game_state(for_player_user_obj=player), player.id)
+        if move:
+            return player, move
+    return None, None
+
+
+def play_out(room, limit=2000):
+    """Доигрывает партию ходами autoplay; возвращает число ходов."""
+    for number in range(limit):
+        room.refresh_from_db()
+        if room.status != GameRoom.STATUS_PLAYING:
+            return number
+        player, move = acting_move(DurakGame(room))
+        assert move is not None, f"Некому ходить в комнате {room.id}"
+        result, _ = views._apply_move(room, player, move['action_type'], views._parse_move(move)[0])
+        assert result['success'], result
+    raise AssertionError(f"Партия в комнате {room.id} не закончилась за {limit} ходов")
+
+
+@override_settings(GAME_TURN_TIMEOUT=0, GAME_TASK_WORKERS=0)
+class TurnTimeoutRaceTests(TransactionTestCase):
+    """Автоход по таймеру и ход игрока пишут одно состояние партии."""
+
+    def setUp(self):
+        self.room, self.players = make_room()
+        self.game_logic = start(self.room)
+        self.token = self.game_logic.game_model_instance.updated_at.isoformat()
+
+    def test_stale_token_timeout_is_ignored(self):
+        player, move = acting_move(self.game_logic)
+        result, state = views._apply_move(self.room, player, move['action_type'], views._parse_move(move)[0])
+        self.assertTrue(result['success'])
+        self.assertIsNone(apply_turn_timeout(self.room.id, self.token))
+        self.assertEqual(len(Game.objects.get(room=self.room).moves), 1)
+
+    def test_timeout_during_move_cannot_both_apply(self):
+        player, move = acting_move(self.game_logic)
+        timer_results = []
+        threads = []
+
+        def timer():
+            try:
+                timer_results.append(apply_turn_timeout(self.room.id, self.token))
+            except Exception as exc:  # занятая база - тоже "не применился"
+                timer_results.append(exc)
+            finally:
+                connection.close()
+
+        class RacingDurakGame(DurakGame):
+            # Таймер срабатывает ровно между загрузкой состояния и ходом
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                thread = threading.Thread(target=timer)
+                thread.start()
+                thread.join(2)
+                threads.append(thread)
+
+        original = views.DurakGame
+        views.DurakGame = RacingDurakGame
+        try:
+            result, _ = views._apply_move(self.room, player, move['action_type'], views._parse_move(move)[0])
+        finally:
+            views.DurakGame = original
+        for thread in threads:
+            thread.join(5)
+
+        applied = [result.get('success')] + [isinstance(r, dict) and r.get('success') for r in timer_results]
+        moves = Game.objects.get(room=self.room).moves
+        # Каждый успешный ход должен остаться в записи партии
+        self.assertEqual(len(moves), sum(bool(a) for a in applied))
+        self.assertTrue(result.get('success'))
+
+
+@override_settings(GAME_TURN_TIMEOUT=0, GAME_TASK_WORKERS=0)
+class GameOverTests(TestCase):
+    """Конец партии по finish_order, без пересчета рук."""
+
+    def setUp(self):
+        self.room, self.players = make_room(3)
+        self.game_logic = start(self.room)
+        self.game_logic.deck = []
+
+    def finish(self, *players):
+        self.game_logic.finish_order = [str(p.id) for p in players]
+        return self.game_logic._check_game_over_conditions()
+
+    def test_not_over_while_deck_has_cards(self):
+        self.game_logic.deck = [{'rank': '6', 'suit': 'hearts'}]
+        self.assertIsNone(self.finish(*self.players[:2]))
+
+    def test_not_over_while_two_players_remain(self):
+        self.assertIsNone(self.finish(self.players[0]))
+
+    def test_last_player_with_cards_loses(self):
+        result = self.finish(self.players[1], self.players[0])
+        self.assertFalse(result['is_draw'])
+        self.assertEqual(result['winner'], self.players[1])
+        self.assertEqual(result['loser'], self.players[2])
+        self.assertEqual(result['finish_order'], [str(self.players[1].id), str(self.players[0].id)])
+
+    def test_last_players_out_together_is_draw(self):
+        result = self.finish(*self.players)
+        self.assertTrue(result['is_draw'])
+        self.assertIsNone(result['winner'])
+        self.assertIsNone(result['loser'])
+
+
+@override_settings(GAME_TURN_TIMEOUT=0, GAME_TASK_WORKERS=0)
+class SettlementTests(TestCase):
+    """GameRoom.settle: деньги, счетчики, рейтинг и история участников."""
+
+    def setUp(self):
+        self.room, self.players = make_room(3, bet=100)
+        self.room.status = GameRoom.STATUS_FINISHED
+        self.room.save(update_fields=['status'])
+        self.ids = [p.id for p in self.players]
+
+    def fresh(self):
+        return {p.id: p for p in Player.objects.filter(id__in=self.ids)}
+
+    def test_winner_takes_pot(self):
+        winner, middle, loser = self.ids
+        self.assertTrue(self.room.settle(winner_id=winner, loser_id=loser, finish_order=[winner, middle]))
+        players = self.fresh()
+        self.assertEqual(players[winner].cash, 1000 + 300)
+        self.assertEqual(players[middle].cash, 1000)
+        self.assertEqual(players[loser].cash, 1000)
+        self.assertEqual([players[i].games_won for i in self.ids], [1, 0, 0])
+        self.assertEqual([players[i].games_played for i in self.ids], [1, 1, 1])
+        # Выше тот, кто раньше вышел; сумма изменений рейтинга - ноль
+        self.assertGreater(players[winner].rating, players[middle].rating)
+        self.assertGreater(players[middle].rating, players[loser].rating)
+        self.assertAlmostEqual(sum(players[i].rating for i in self.ids), 3 * players[middle].rating, places=6)
+
+        rows = {row.player_id: row for row in GameParticipation.objects.filter(room=self.room)}
+        self.assertEqual({i: rows[i].result for i in self.ids}, {
+            winner: GameParticipation.RESULT_WIN,
+            middle: GameParticipation.RESULT_ESCAPED,
+            loser: GameParticipation.RESULT_LOSS,
+        })
+        self.assertEqual([rows[i].place for i in self.ids], [1, 2, 3])
+        self.assertEqual([rows[i].cash_delta for i in self.ids], [200, -100, -100])
+
+    def test_draw_refunds_bets(self):
+        ratings = {p.id: p.rating for p in self.players}
+        self.assertTrue(self.room.settle(is_draw=True, finish_order=self.ids))
+        players = self.fresh()
+        self.assertEqual([players[i].cash for i in self.ids], [1100, 1100, 1100])
+        self.assertEqual([players[i].games_won for i in self.ids], [0, 0, 0])
+        self.assertEqual([players[i].games_played for i in self.ids], [1, 1, 1])
+        self.assertEqual({i: players[i].rating for i in self.ids}, ratings)
+        self.assertEqual(set(GameParticipation.objects.filter(room=self.room).values_list('result', flat=True)),
+                         {GameParticipation.RESULT_DRAW})
+
+    def test_second_settle_changes_nothing(self):
+        winner, middle, loser = self.ids
+        self.assertTrue(self.room.settle(winner_id=winner, loser_id=loser, finish_order=[winner, middle]))
+        before = {p.id: (p.cash, p.rating, p.games_won, p.games_played) for p in self.fresh().values()}
+        self.assertFalse(self.room.settle(winner_id=winner, loser_id=loser, finish_order=[winner, middle]))
+        self.assertFalse(self.room.settle(is_draw=True))
+        after = {p.id: (p.cash, p.rating, p.games_won, p.games_played) for p in self.fresh().values()}
+        self.assertEqual(after, before)
+        self.assertEqual(GameParticipation.objects.filter(room=self.room).count(), 3)
+
+    def test_settle_task_is_not_queued_twice(self):
+        self.room.status = GameRoom.STATUS_PLAYING
+        self.room.save(update_fields=['status'])
+        winner, middle, loser = self.players
+        self.room.end_game(winner=winner, loser=loser, finish_order=[winner.id, middle.id])
+        self.room.end_game(winner=winner, loser=loser, finish_order=[winner.id, middle.id])
+        tasks.run_pending()
+        self.room.refresh_from_db()
+        self.assertIsNotNone(self.room.settled_at)
+        self.assertEqual(self.fresh()[winner.id].cash, 1300)
+
+
+@override_settings(GAME_TURN_TIMEOUT=0, GAME_TASK_WORKERS=0, GAME_LEADERBOARD_SYNC=0)
+class LeaderboardTests(TestCase):
+    def settle(self, winner, *others, bet=0):
+        room = GameRoom.objects.create(creator=winner, max_players=4, bet_amount=bet, status=GameRoom.STATUS_FINISHED)
+        room.players.add(winner, *others)
+        room.settle(winner_id=winner.id, loser_id=others[-1].id, finish_order=[winner.id])
+
+    def test_rank_follows_wins_then_win_rate_then_net_cash(self):
+        _, (a, b, c, d) = make_room(4)
+        self.settle(a, b)
+        self.settle(a, c)
+        self.settle(b, c, bet=50)
+        self.settle(d, c)
+        board = Leaderboard()
+        # a: 2 из 2; b и d по одной победе, но у b две партии; c без побед
+        self.assertEqual([row['player_id'] for row in board.top()], [a.id, d.id, b.id, c.id])
+        self.assertEqual(board.rank(b.id)['rank'], 3)
+        self.assertEqual(board.rank(b.id)['net_cash'], 50)
+        self.assertEqual([row['rank'] for row in board.top(offset=1, limit=2)], [2, 3])
+        self.assertEqual(len(board), 4)
+
+    def test_rank_picks_up_new_results(self):
+        _, (a, b, c) = make_room(3)
+        self.settle(a, b)
+        board = Leaderboard()
+        self.assertEqual(board.rank(a.id)['rank'], 1)
+        self.assertIsNone(board.rank(c.id))
+        self.settle(c, a)
+        self.settle(c, b)
+        self.assertEqual(board.rank(c.id)['rank'], 1)
+        self.assertEqual(board.rank(a.id)['rank'], 2)
+
+
+class HistoryTests(TestCase):
+    def setUp(self):
+        _, (self.player, self.other) = make_room(2)
+        self.finished_at = timezone.now()
+
+    def add_games(self, count, finished_at=None):
+        for number in range(count):
+            room = GameRoom.objects.create(creator=self.player, status=GameRoom.STATUS_FINISHED)
+            GameParticipation.objects.create(
+                player=self.player, room=room, result=GameParticipation.RESULT_WIN,
+                finished_at=finished_at or self.finished_at + datetime.timedelta(seconds=number),
+            )
+
+    def pages(self, limit):
+        rows, cursor = history.player_history(self.player.id, limit=limit)
+        pages = [rows]
+        while cursor:
+            rows, cursor = history.player_history(self.player.id, cursor=cursor, limit=limit)
+            pages.append(rows)
+        return pages
+
+    def test_cursor_pages_cover_history_newest_first(self):
+        self.add_games(7)
+        pages = self.pages(3)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        expected = list(GameParticipation.objects.filter(player=self.player)
+                        .order_by('-finished_at', '-id').values_list('room_id', flat=True))
+        self.assertEqual([row['room_id'] for page in pages for row in page], expected)
+
+    def test_cursor_pages_split_equal_timestamps(self):
+        # Одинаковое время конца: порядок и граница страницы - по id
+        self.add_games(5, finished_at=self.finished_at)
+        room_ids = [row['room_id'] for page in self.pages(2) for row in page]
+        self.assertEqual(room_ids, sorted(room_ids, reverse=True))
+        self.assertEqual(len(room_ids), 5)
+
+    def test_exact_page_has_no_next_cursor(self):
+        self.add_games(2)
+        rows, cursor = history.player_history(self.player.id, limit=2)
+        self.assertEqual(len(rows), 2)
+        self.assertIsNone(cursor)
+
+    def test_broken_cursor(self):
+        with self.assertRaises(history.InvalidCursor):
+            history.player_history(self.player.id, cursor='не курсор')
+
+
+@override_settings(GAME_TURN_TIMEOUT=0, GAME_TASK_WORKERS=0, GAME_REPLAY_CHECKPOINT_EVERY=4)
+class PlayedGameTests(TestCase):
+    """Партия целиком: ходы через _apply_move, расчет задачей, повтор по записи."""
+
+    def setUp(self):
+        cache.clear()
+        self.room, self.players = make_room(3, bet=10)
+        start(self.room, seed='1' * 32)
+        self.moves = play_out(self.room)
+        self.game = Game.objects.get(room=self.room)
+
+    def test_game_is_recorded_and_settled(self):
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, GameRoom.STATUS_FINISHED)
+        self.assertEqual(self.game.status, GameRoom.STATUS_FINISHED)
+        self.assertEqual(len(self.game.moves), self.moves)
+        self.assertGreaterEqual(len(self.game.finish_order), 2)
+        self.assertIsNone(self.room.settled_at)
+
+        tasks.run_pending()
+        self.room.refresh_from_db()
+        self.assertIsNotNone(self.room.settled_at)
+        self.assertEqual(GameParticipation.objects.filter(room=self.room).count(), 3)
+        total = sum(Player.objects.filter(id__in=[p.id for p in self.players]).values_list('cash', flat=True))
+        # Ставки в make_room не списывались: банк уходит победителю или возвращается всем
+        self.assertEqual(total, 3000 + 30)
+        self.assertEqual(ReplayCheckpoint.objects.filter(game=self.game).count(), self.moves // 4 + 1)
+
+    def test_replay_reproduces_final_state(self):
+        self.assertTrue(replay.verify(self.game))
+        state = replay.replay(self.game).snapshot()
+        self.assertEqual(state['finish_order'], self.game.finish_order)
+        self.assertTrue(state['game_over'])
+
+    def test_replay_is_deterministic(self):
+        first = [replay.replay(self.game, upto).public_state() for upto in range(self.moves + 1)]
+        second = [replay.replay(self.game, upto).public_state() for upto in range(self.moves + 1)]
+        self.assertEqual(first, second)
+
+    def test_checkpoints_match_replay_from_start(self):
+        replay.build_checkpoints(self.game)
+        for move in (0, 1, 4, 5, self.moves // 2, self.moves):
+            expected = replay.replay(self.game, move).public_state()
+            self.assertEqual(replay.state_at(self.game, move), expected)
+        stepped = list(replay.iter_moves(self.game, 3, 9, with_states=True))
+        self.assertEqual([entry['move'] for entry in stepped], list(range(4, 10)))
+        self.assertEqual(stepped[-1]['state'], replay.replay(self.game, 9).public_state())
+
+    def test_archived_game_restores_state(self):
+        self.assertTrue(replay.archive_game(self.game))
+        self.assertFalse(replay.archive_game(Game.objects.get(id=self.game.id)))
+        archived = Game.objects.get(id=self.game.id)
+        self.assertEqual(archived.deck, [])
+        replay.restore_archived(archived)
+        self.assertEqual(archived.finish_order, self.game.finish_order)
+        self.assertEqual(archived.player_hands, self.game.player_hands)
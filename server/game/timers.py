@@ -0,0 +1,228 @@
+"""
+Таймеры хода на хешированном колесе (timer wheel).
+
+Дедлайны всех комнат лежат в одном колесе в памяти процесса: постановка и
+отмена — O(1), а тикает колесо одна asyncio-задача в фоновом потоке,
+поэтому десятки тысяч таймеров не требуют ни своих задач, ни опроса БД.
+Когда время хода вышло, за зависшего игрока делается автоход
+(см. DurakGame.resolve_turn_timeout), а результат рассылается группе комнаты.
+
+Колесо живёт только в памяти, поэтому первый сокет процесса (после рестарта)
+вызывает TurnTimers.restore(): таймеры всех идущих партий ставятся заново от
+времени их последнего хода. Если процессов несколько, таймер комнаты окажется в каждом,
+но автоход сделает только первый: остальные увидят устаревший токен.
+"""
+import asyncio
+import logging
+import math
+import threading
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .outbox import publish
+
+logger = logging.getLogger(__name__)
+
+
+class _Timer:
+    __slots__ = ('key', 'tick', 'callback', 'args')
+
+    def __init__(self, key, tick, callback, args):
+        self.key = key
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+
+
+class TimerWheel:
+    """Колесо из `slots` корзин по `tick` секунд. Не потокобезопасно — только из своего loop."""
+
+    def __init__(self, tick: float = 0.25, slots: int = 512):
+        self.tick = tick
+        self.slots = slots
+        self.buckets: list[dict] = [{} for _ in range(slots)]
+        self.timers: dict = {}
+        self.current_tick = 0
+
+    def __len__(self):
+        return len(self.timers)
+
+    def schedule(self, key, delay: float, callback, *args):
+        """Ставит (или переставляет) таймер `key` через `delay` секунд."""
+        self.cancel(key)
+        timer = _Timer(key, self.current_tick + max(1, math.ceil(delay / self.tick)), callback, args)
+        self.buckets[timer.tick % self.slots][key] = timer
+        self.timers[key] = timer
+
+    def cancel(self, key) -> bool:
+        timer = self.timers.pop(key, None)
+        if timer is None:
+            return False
+        self.buckets[timer.tick % self.slots].pop(key, None)
+        return True
+
+    def advance(self) -> list[_Timer]:
+        """Сдвигает колесо на один тик и возвращает сработавшие таймеры."""
+        self.current_tick += 1
+        bucket = self.buckets[self.current_tick % self.slots]
+        # В корзине могут лежать таймеры следующих оборотов колеса
+        due = [timer for timer in bucket.values() if timer.tick <= self.current_tick]
+        for timer in due:
+            del bucket[timer.key]
+            del self.timers[timer.key]
+        return due
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        while True:
+            # Ориентируемся на абсолютное время, чтобы тики не «уплывали»
+            await asyncio.sleep(max(0.0, started + (self.current_tick + 1) * self.tick - loop.time()))
+            for timer in self.advance():
+                try:
+                    timer.callback(*timer.args)
+                except Exception:
+                    logger.exception("Timer callback for %r failed", timer.key)
+
+
+def apply_turn_timeout(room_id: int, token: str):
+    """Делает автоход в комнате, если состояние игры не менялось с момента постановки таймера."""
+    from .game_logic import DurakGame
+    from .models import GameRoom
+
+    with transaction.atomic():
+        try:
+            room = GameRoom.objects.get(id=room_id)
+        except GameRoom.DoesNotExist:
+            return None
+        if room.status != GameRoom.STATUS_PLAYING:
+            return None
+
+        game_logic = DurakGame(room)
+        game = game_logic.game_model_instance
+        if not game or game.updated_at.isoformat() != token:
+            # Кто-то успел сходить, таймер устарел
+            return None
+
+        result = game_logic.resolve_turn_timeout()
+        if result and result.get('success'):
+            result['broadcast_state'] = game_logic.broadcast_state()
+        if result:
+            logger.info("Turn timeout in room %s: player %s auto-moved (%s)", room_id, result.get('timed_out_player_id'), result.get('message'),
+                    extra={'room_id': room_id, 'player_id': result.get('timed_out_player_id')})
+        return result
+
+
+def playing_turns() -> list[tuple[int, object]]:
+    """(room_id, время последнего хода) всех идущих партий."""
+    from .models import Game, GameRoom
+
+    return list(
+        Game.objects.filter(status=GameRoom.STATUS_PLAYING, room__status=GameRoom.STATUS_PLAYING)
+        .values_list('room_id', 'updated_at')
+    )
+
+
+class TurnTimers:
+    """Дедлайны ходов по комнатам. arm()/cancel() можно звать из любого потока."""
+
+    def __init__(self):
+        self.wheel = TimerWheel()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+        # Loop ASGI-сервера, в котором живут сокеты комнат этого процесса
+        self.broadcast_loop: asyncio.AbstractEventLoop | None = None
+        self._restored = False
+
+    @property
+    def timeout(self) -> float:
+        return getattr(settings, 'GAME_TURN_TIMEOUT', 30)
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._run_loop, args=(loop,), name='turn-timers', daemon=True)
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def _run_loop(self, loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.create_task(self.wheel.run())
+        loop.run_forever()
+
+    def register_broadcast_loop(self):
+        """Вызывается из consumer'а: запоминает loop, через который слать сообщения группам.
+
+        Первый вызов в процессе заодно восстанавливает таймеры: к этому моменту
+        процесс уже обслуживает запросы и работает с рабочей базой.
+        """
+        self.broadcast_loop = asyncio.get_running_loop()
+        if not self._restored:
+            self._restored = True
+            self.restore()
+
+    def arm(self, room_id: int, token: str):
+        if not self.timeout:
+            return
+        loop = self._ensure_started()
+        loop.call_soon_threadsafe(self.wheel.schedule, room_id, self.timeout, self._expire, room_id, token)
+
+    def restore(self):
+        """Ставит таймеры идущих партий после рестарта процесса; сам запрос к БД - в потоке таймеров."""
+        if not self.timeout:
+            return
+        asyncio.run_coroutine_threadsafe(self._restore(), self._ensure_started())
+
+    async def _restore(self):
+        try:
+            turns = await database_sync_to_async(playing_turns)()
+        except Exception:
+            logger.exception("Failed to restore turn timers")
+            return
+        now = timezone.now()
+        restored = 0
+        for room_id, updated_at in turns:
+            # arm() после свежего хода уже поставил таймер с актуальным токеном
+            if room_id in self.wheel.timers:
+                continue
+            remaining = self.timeout - (now - updated_at).total_seconds()
+            self.wheel.schedule(room_id, max(remaining, 0), self._expire, room_id, updated_at.isoformat())
+            restored += 1
+        logger.info("Restored %s turn timers", restored)
+
+    def cancel(self, room_id: int):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.wheel.cancel, room_id)
+
+    def _expire(self, room_id: int, token: str):
+        self._loop.create_task(self._handle_expiry(room_id, token))
+
+    async def _handle_expiry(self, room_id: int, token: str):
+        try:
+            result = await database_sync_to_async(apply_turn_timeout)(room_id, token)
+        except Exception:
+            logger.exception("Failed to apply turn timeout in room %s", room_id, extra={'room_id': room_id})
+            return
+        if not result or not result.get('success'):
+            return
+
+        message = {
+            'action': 'turn_timeout',
+            'room_id': room_id,
+            'player_id': result.get('timed_out_player_id'),
+            'action_type': result.get('action_type'),
+            'message': result.get('message'),
+            'game_over': result.get('game_over', False),
+            **result['broadcast_state'],
+        }
+        coro = publish(room_id, message)
+        if self.broadcast_loop is not None and self.broadcast_loop.is_running():
+            asyncio.run_coroutine_threadsafe(coro, self.broadcast_loop)
+        else:
+            await coro
+
+
+turn_timers = TurnTimers()
@@ -6,6 +6,7 @@ urlpatterns = [
     # Основные маршруты
     path('', views.lobby_view, name='lobby'),
     path('create/', views.create_room, name='create_room'),
+    path('quick-play/', views.quick_play, name='quick_play'),
     #path('find/', views.find_game, name='find_game'),
     path('join/<int:game_id>/', views.join_game, name='join_game'),
     path('<int:room_id>/', views.game_room, name='game_room'),
@@ -21,4 +22,18 @@ urlpatterns = [
     path('status/<int:room_id>/', views.game_status, name='game_status'),
     path('ping/<int:room_id>/', views.ping, name='ping'),
     path('room/<int:room_id>/make_move/', views.make_move_view, name='make_move'),
+
+    # Рейтинг
+    path('leaderboard/', views.leaderboard_view, name='leaderboard'),
+    path('api/leaderboard/', views.leaderboard_api, name='leaderboard_api'),
+    path('api/leaderboard/me/', views.leaderboard_me, name='leaderboard_me'),
+
+    # История партий
+    path('history/', views.history_view, name='history'),
+    path('api/history/', views.history_api, name='history_api'),
+    path('api/history/<int:player_id>/', views.history_api, name='player_history_api'),
+
+    # Повтор законченной партии
+    path('api/replay/<int:room_id>/', views.replay_state, name='replay_state'),
+    path('api/replay/<int:room_id>/moves/', views.replay_moves, name='replay_moves'),
 ]
\ No newline at end of file
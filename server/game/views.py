@@ -1,20 +1,33 @@
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.conf import settings
 from django.urls import reverse
 from django.db import transaction, models
-from django.db.models import Count
 from django.contrib import messages
 from django.forms import Form, IntegerField, CharField
-from .models import GameRoom, PlayerActivity
+from .models import Game, GameRoom, PlayerActivity
 from players.models import Player
+from .fastjson import JSONDecodeError, JsonResponse, dumps_bytes, loads as json_loads
 from .game_logic import DurakGame
+from .events import bus
+from .executor import move_pool, read_pool, room_locks
+from .history import InvalidCursor, player_history
+from .leaderboard import leaderboard
+from .matchmaking import open_rooms, room_index
+from .metrics import metrics
+from .outbox import publish
+from . import replay
+import itertools
 import logging
-import json
 logger = logging.getLogger(__name__)
 
+LOBBY_ROOMS = 20
+MATCHMAKING_BANDS = getattr(settings, 'GAME_MATCHMAKING_BANDS', (100, 250, 500))
+
 class CreateRoomForm(Form):
     name = CharField(max_length=50, label="Название комнаты (необязательно)", required=False)
     max_players = IntegerField(min_value=2, max_value=4, label="Количество игроков")
@@ -22,18 +35,46 @@ class CreateRoomForm(Form):
 
 @login_required
 def lobby_view(request):
-    rooms = GameRoom.objects.filter(status=GameRoom.STATUS_WAITING)\
-                            .annotate(players_count=Count('players'))\
-                            .filter(players_count__lt=models.F('max_players'))\
-                            .exclude(players=request.user)\
-                            .order_by('-created_at')[:20]
+    band = _int_param(request, 'band', 0)
+    rooms = open_rooms().exclude(players=request.user)
+    if band > 0:
+        # Полоса рейтинга: кандидаты из индекса, ближайшие по рейтингу первыми
+        room_ids = room_index.find(request.user.rating, band, limit=LOBBY_ROOMS)
+        rooms_by_id = rooms.in_bulk(room_ids)
+        rooms = [rooms_by_id[room_id] for room_id in room_ids if room_id in rooms_by_id]
+    else:
+        rooms = rooms.order_by('-created_at')[:LOBBY_ROOMS]
 
     context = {
         'rooms': rooms,
         'user_balance': request.user.cash,
+        'band': band,
+        'bands': MATCHMAKING_BANDS,
     }
     return render(request, 'game/lobby.html', context)
 
+
+@login_required
+@require_POST
+def quick_play(request):
+    """Садит игрока в ближайшую по рейтингу комнату, постепенно расширяя полосу."""
+    user = request.user
+    if user.current_room_id:
+        return redirect('game:game_room', room_id=user.current_room_id)
+
+    rooms = open_rooms().exclude(players=user).filter(bet_amount__lte=user.cash)
+    for band in MATCHMAKING_BANDS:
+        room_ids = room_index.find(user.rating, band)
+        if not room_ids:
+            continue
+        available = set(rooms.filter(id__in=room_ids).values_list('id', flat=True))
+        for room_id in room_ids:
+            if room_id in available:
+                return join_game(request, room_id)
+
+    messages.info(request, "Подходящих комнат пока нет - создайте свою.")
+    return redirect('game:create_room')
+
 @login_required
 def create_room(request):
     if request.method == 'POST':
@@ -66,12 +107,10 @@ def create_room(request):
                         bet_amount=bet_amount,
                         status=GameRoom.STATUS_WAITING
                     )
-                    room.players.add(request.user)
+                    room.add_player(request.user)
                     
-                    request.user.current_room = room
-                    if bet_amount > 0:
-                        request.user.cash -= bet_amount
-                    request.user.save(update_fields=['cash', 'current_room'])
+                    if not request.user.change_cash(-bet_amount, current_room=room):
+                        raise ValueError("Недостаточно средств для ставки")
                     
                     PlayerActivity.objects.create(
                         player=request.user,
@@ -132,12 +171,12 @@ def join_game(request, game_id):
         return redirect('game:lobby')
     
     try:
-        room.players.add(user)
-        user.current_room = room
-        
-        if room.bet_amount > 0:
-            user.cash -= room.bet_amount
-        user.save(update_fields=['cash', 'current_room'])
+        room.add_player(user)
+        # Баланс в user мог устареть (кэш): проверку делает само списание
+        if not user.change_cash(-room.bet_amount, current_room=room):
+            transaction.set_rollback(True)
+            messages.error(request, 'Недостаточно средств для входа в эту комнату.')
+            return redirect('game:lobby')
         
         PlayerActivity.objects.update_or_create(
             player=user, room=room,
@@ -253,11 +292,10 @@ def leave_room(request, room_id):
     try:
         returned_bet = False
         if room.status == GameRoom.STATUS_WAITING and room.bet_amount > 0:
-            user.cash += room.bet_amount
-            user.save(update_fields=['cash'])
+            user.change_cash(room.bet_amount)
             returned_bet = True
         
-        room.players.remove(user)
+        room.remove_player(user)
         if user.current_room == room:
             user.current_room = None
             user.save(update_fields=['current_room'])
@@ -280,11 +318,9 @@ def leave_room(request, room_id):
                 # Basic refund if model method doesn't handle it
                 for p in room.players.all(): # refund remaining players if creator leaves
                     if room.bet_amount > 0:
-                        p.cash += room.bet_amount
-                        p.save(update_fields=['cash'])
+                        p.change_cash(room.bet_amount)
                 if room.bet_amount > 0 and not returned_bet: # if creator's bet wasn't returned yet
-                     user.cash += room.bet_amount
-                     user.save(update_fields=['cash'])
+                     user.change_cash(room.bet_amount)
 
         elif room.status == GameRoom.STATUS_WAITING and room.players.count() == 0:
             if hasattr(room, 'cancel_game'):
@@ -355,114 +391,296 @@ def end_game(request, room_id):
         return JsonResponse({'success': False, 'error': 'Внутренняя ошибка сервера при завершении игры.'}, status=500)
 
 
+def _game_state_for(room, user):
+    # DurakGame constructor handles loading or pre-init state.
+    return DurakGame(room).get_game_state(for_player_user_obj=user)
+
+
 @login_required
-def game_status(request, room_id):
+async def game_status(request, room_id):
+    user = await request.auser()
     try:
-        room = GameRoom.objects.select_related('creator').prefetch_related('players').get(id=room_id)
+        room = await GameRoom.objects.select_related('creator').prefetch_related('players').aget(id=room_id)
     except GameRoom.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Комната не найдена.'}, status=404)
 
-    if request.user not in room.players.all():
+    if user not in room.players.all():
         return JsonResponse({'success': False, 'error': 'Вы не участник этой игры.'}, status=403)
-    
-    game_state_data = None
+
     try:
-        # DurakGame constructor handles loading or pre-init state.
-        game_logic = DurakGame(room)
-        game_state_data = game_logic.get_game_state(for_player_user_obj=request.user)
-            
+        # Отдельный пул чтения: опрос не ждет чужих ходов
+        game_state_data = await read_pool.run(_game_state_for, room, user)
     except Exception as e:
-        logger.error(f"Ошибка при получении статуса игры для комнаты {room.id}: {e}")
+        logger.error("Ошибка при получении статуса игры для комнаты %s: %s", room.id, e,
+                     extra={'room_id': room.id, 'player_id': user.id})
         return JsonResponse({'success': False, 'error': 'Ошибка при получении состояния игры.'}, status=500)
-            
+
     return JsonResponse({'success': True, 'game_state': game_state_data})
 
 
+async def _broadcast_move(room_id, user, action_type, result, state):
+    """Сообщает сокетам комнаты о сделанном ходе; state - DurakGame.broadcast_state() после хода."""
+    try:
+        await publish(room_id, {
+            'action': 'move_applied',
+            'player_id': user.id,
+            'action_type': action_type,
+            'message': result.get('message'),
+            'game_over': result.get('game_over', False),
+            **state,
+        })
+    except Exception as e:
+        logger.error("Не удалось разослать ход в комнате %s: %s", room_id, e, extra={'room_id': room_id, 'player_id': user.id})
+
+
+def _parse_move(data):
+    """Аргументы хода из тела запроса: (args, None) или (None, текст ошибки)."""
+    action_type = data.get('action_type')
+    if action_type == 'attack':
+        card_indices = data.get('card_indices')
+        if card_indices is None or not isinstance(card_indices, list):
+            return None, 'Не указаны карты для атаки.'
+        try:
+            return ([int(idx) for idx in card_indices],), None
+        except (TypeError, ValueError):
+            return None, 'Индексы карт должны быть числами.'
+
+    if action_type == 'defend':
+        attack_card_table_index = data.get('attack_card_table_index')
+        defense_card_hand_index = data.get('defense_card_hand_index')
+        if attack_card_table_index is None or defense_card_hand_index is None:
+            return None, 'Не указаны карты для защиты.'
+        try:
+            return (int(attack_card_table_index), int(defense_card_hand_index)), None
+        except (TypeError, ValueError):
+            return None, 'Индексы карт должны быть числами.'
+
+    if action_type in ('pass_bito', 'take'):
+        return (), None
+    return None, 'Неизвестный тип действия.'
+
+
+@transaction.atomic
+def _apply_move(room, user, action_type, args):
+    """Выполняется в пуле ходов под замком комнаты.
+
+    Загрузка, ход и сохранение - одна транзакция: она сразу берет блокировку
+    записи (BEGIN IMMEDIATE), и автоход по таймеру из другого потока или
+    процесса не вклинится между чтением состояния и его перезаписью.
+
+    Возвращает (ответ клиенту, состояние для рассылки или None).
+    """
+    room.refresh_from_db()
+    if room.status != GameRoom.STATUS_PLAYING:
+        return {'success': False, 'error': 'Игра не активна.'}, None
+
+    game_logic = DurakGame(room)
+    if not game_logic.game_model_instance:
+        return None, None
+
+    response_data = {'success': False, 'message': 'Неизвестное действие или ошибка.'}
+    if action_type == 'attack':
+        response_data.update(game_logic.attack(user, *args))
+    elif action_type == 'defend':
+        response_data.update(game_logic.defend(user, *args))
+    elif action_type == 'pass_bito':
+        response_data.update(game_logic.pass_or_bito_action(user))
+    elif action_type == 'take':
+        response_data.update(game_logic.take_cards_action(user))
+    if not response_data.get('success'):
+        return response_data, None
+    return response_data, game_logic.broadcast_state()
+
+
 @login_required
 @require_POST
-def make_move_view(request, room_id):
-    room = get_object_or_404(GameRoom, id=room_id)
-    user = request.user
+async def make_move_view(request, room_id):
+    user = await request.auser()
+    try:
+        room = await GameRoom.objects.aget(id=room_id)
+    except GameRoom.DoesNotExist:
+        raise Http404('Комната не найдена.')
 
-    if user not in room.players.all():
+    if not await room.players.filter(id=user.id).aexists():
         return JsonResponse({'success': False, 'error': 'Вы не являетесь участником этой игры.'}, status=403)
 
     if room.status != GameRoom.STATUS_PLAYING:
         return JsonResponse({'success': False, 'error': 'Игра не активна.'}, status=400)
 
     try:
-        data = json.loads(request.body)
-        action_type = data.get('action_type')
-        
-        game_logic = DurakGame(room)
+        data = json_loads(request.body)
+    except JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Некорректный JSON в теле запроса.'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'error': 'Тело запроса должно быть JSON-объектом.'}, status=400)
 
-        if not game_logic.game_model_instance:
-             return JsonResponse({'success': False, 'error': 'Состояние игры не найдено или не инициализировано.'}, status=500)
+    action_type = data.get('action_type')
+    args, error = _parse_move(data)
+    if error:
+        return JsonResponse({'success': False, 'error': error}, status=400)
 
-        response_data = {'success': False, 'message': 'Неизвестное действие или ошибка.'}
+    bus.register_loop()
+    try:
+        # Ходы одной комнаты - по очереди, разные комнаты - параллельно в пуле
+        async with room_locks.get(room.id):
+            response_data, state = await move_pool.run(_apply_move, room, user, action_type, args)
+    except Exception as e:
+        logger.error("Ошибка при обработке хода в комнате %s игроком %s: %s", room_id, user.username, e, exc_info=True,
+                     extra={'room_id': room_id, 'player_id': user.id})
+        return JsonResponse({'success': False, 'error': 'Внутренняя ошибка сервера при обработке хода.'}, status=500)
 
-        if action_type == 'attack':
-            card_indices = data.get('card_indices') 
-            if card_indices is None or not isinstance(card_indices, list):
-                return JsonResponse({'success': False, 'error': 'Не указаны карты для атаки.'}, status=400)
-            
-            try:
-                card_indices = [int(idx) for idx in card_indices]
-            except ValueError:
-                return JsonResponse({'success': False, 'error': 'Индексы карт должны быть числами.'}, status=400)
-
-            result = game_logic.attack(user, card_indices)
-            response_data.update(result)
-
-        elif action_type == 'defend':
-            attack_card_table_index = data.get('attack_card_table_index')
-            defense_card_hand_index = data.get('defense_card_hand_index')
-            if attack_card_table_index is None or defense_card_hand_index is None:
-                 return JsonResponse({'success': False, 'error': 'Не указаны карты для защиты.'}, status=400)
-            try:
-                attack_card_table_index = int(attack_card_table_index)
-                defense_card_hand_index = int(defense_card_hand_index)
-            except ValueError:
-                return JsonResponse({'success': False, 'error': 'Индексы карт должны быть числами.'}, status=400)
-
-
-            result = game_logic.defend(user, attack_card_table_index, defense_card_hand_index)
-            response_data.update(result)
-
-        elif action_type == 'pass_bito':
-            result = game_logic.pass_or_bito_action(user)
-            response_data.update(result)
-            
-        elif action_type == 'take':
-            result = game_logic.take_cards_action(user)
-            response_data.update(result)
-        else:
-            return JsonResponse({'success': False, 'error': 'Неизвестный тип действия.'}, status=400)
+    if response_data is None:
+        return JsonResponse({'success': False, 'error': 'Состояние игры не найдено или не инициализировано.'}, status=500)
+    if 'error' in response_data:
+        return JsonResponse(response_data, status=400)
 
-        return JsonResponse(response_data)
+    if response_data.get('success'):
+        await _broadcast_move(room.id, user, action_type, response_data, state)
 
-    except json.JSONDecodeError:
-        return JsonResponse({'success': False, 'error': 'Некорректный JSON в теле запроса.'}, status=400)
-    except Exception as e:
-        logger.error(f"Ошибка при обработке хода в комнате {room_id} игроком {user.username}: {e}", exc_info=True)
-        return JsonResponse({'success': False, 'error': 'Внутренняя ошибка сервера при обработке хода.'}, status=500)
+    return JsonResponse(response_data)
 
 
 @login_required
 @require_POST
-def ping(request, room_id):
-    try:
-        room = GameRoom.objects.get(id=room_id)
-    except GameRoom.DoesNotExist:
+async def ping(request, room_id):
+    user = await request.auser()
+    if not await GameRoom.objects.filter(id=room_id).aexists():
         return JsonResponse({'success': False, 'error': 'Комната не найдена'}, status=404)
 
-    if not room.players.filter(id=request.user.id).exists():
-        return JsonResponse({'success': False, 'error': 'Вы не участник этой комнаты.'}, status=403) 
-    
-    PlayerActivity.objects.update_or_create(
-        player=request.user,
+    if not await GameRoom.objects.filter(id=room_id, players=user).aexists():
+        return JsonResponse({'success': False, 'error': 'Вы не участник этой комнаты.'}, status=403)
+
+    await PlayerActivity.objects.aupdate_or_create(
+        player=user,
         room_id=room_id,
         defaults={'is_active': True, 'last_ping': timezone.now()}
     )
 
-    return JsonResponse({'success': True, 'message': 'Ping successful'})
\ No newline at end of file
+    return JsonResponse({'success': True, 'message': 'Ping successful'})
+
+LEADERBOARD_PAGE_SIZE = 20
+
+
+def _int_param(request, name, default):
+    try:
+        return int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+@login_required
+def leaderboard_view(request):
+    page = max(_int_param(request, 'page', 1), 1)
+    total = len(leaderboard)
+    context = {
+        'entries': leaderboard.top((page - 1) * LEADERBOARD_PAGE_SIZE, LEADERBOARD_PAGE_SIZE),
+        'my_entry': leaderboard.rank(request.user.id),
+        'page': page,
+        'has_prev': page > 1,
+        'has_next': page * LEADERBOARD_PAGE_SIZE < total,
+        'total': total,
+    }
+    return render(request, 'game/leaderboard.html', context)
+
+
+@login_required
+def leaderboard_api(request):
+    offset = _int_param(request, 'offset', 0)
+    limit = _int_param(request, 'limit', LEADERBOARD_PAGE_SIZE)
+    return JsonResponse({'success': True, 'total': len(leaderboard), 'entries': leaderboard.top(offset, limit)})
+
+
+@login_required
+def leaderboard_me(request):
+    return JsonResponse({'success': True, 'entry': leaderboard.rank(request.user.id)})
+
+
+HISTORY_PAGE_SIZE = 20
+
+
+@login_required
+def history_view(request):
+    try:
+        games, next_cursor = player_history(request.user.id, request.GET.get('cursor'), HISTORY_PAGE_SIZE)
+    except InvalidCursor:
+        return redirect('game:history')
+    context = {
+        'games': games,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+    }
+    return render(request, 'game/history.html', context)
+
+
+@login_required
+def history_api(request, player_id=None):
+    """История партий: своя или другого игрока; следующая страница - по next_cursor."""
+    if player_id is not None and not Player.objects.filter(id=player_id).exists():
+        return JsonResponse({'success': False, 'error': 'Игрок не найден.'}, status=404)
+    try:
+        games, next_cursor = player_history(player_id or request.user.id, request.GET.get('cursor'),
+                                            _int_param(request, 'limit', HISTORY_PAGE_SIZE))
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'error': 'Неверный курсор.'}, status=400)
+    return JsonResponse({'success': True, 'games': games, 'next_cursor': next_cursor})
+
+
+REPLAY_RANGE_LIMIT = 200
+REPLAY_STREAM_CHUNK = 16
+
+
+async def _replay_game_for(user, room_id):
+    """Законченная записанная партия, доступная пользователю, или (None, ответ с ошибкой)."""
+    game = await Game.objects.filter(room_id=room_id).afirst()
+    if game is None or game.status != GameRoom.STATUS_FINISHED:
+        return None, JsonResponse({'success': False, 'error': 'Партия не найдена или еще не закончена.'}, status=404)
+    if not game.seed:
+        return None, JsonResponse({'success': False, 'error': 'Для этой партии нет записи ходов.'}, status=404)
+    if user.id not in game.player_order and not user.is_staff:
+        return None, JsonResponse({'success': False, 'error': 'Повтор доступен только участникам партии.'}, status=403)
+    return game, None
+
+
+@login_required
+async def replay_state(request, room_id):
+    """Состояние законченной партии после хода ?move=k (0 - раздача)."""
+    game, error = await _replay_game_for(await request.auser(), room_id)
+    if error:
+        return error
+    state = await read_pool.run(replay.state_at, game, _int_param(request, 'move', 0))
+    return JsonResponse({'success': True, 'state': state})
+
+
+def _next_chunk(entries, size):
+    return list(itertools.islice(entries, size))
+
+
+@login_required
+async def replay_moves(request, room_id):
+    """Ходы ?from=a&to=b построчно (NDJSON) для перемотки; &states=1 - с состоянием после каждого."""
+    game, error = await _replay_game_for(await request.auser(), room_id)
+    if error:
+        return error
+    start = max(_int_param(request, 'from', 0), 0)
+    stop = min(_int_param(request, 'to', start + REPLAY_RANGE_LIMIT), start + REPLAY_RANGE_LIMIT)
+    entries = replay.iter_moves(game, start, stop, with_states=request.GET.get('states') == '1')
+
+    async def lines():
+        # Генератор продвигается порциями в пуле чтения: event loop не считает ходы сам
+        while chunk := await read_pool.run(_next_chunk, entries, REPLAY_STREAM_CHUNK):
+            for entry in chunk:
+                yield dumps_bytes(entry) + b'\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+def metrics_view(request):
+    """Метрики процесса в текстовом формате Prometheus."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in ('127.0.0.1', '::1')
+    if not allowed:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
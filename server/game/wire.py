@@ -0,0 +1,166 @@
+"""
+Кодеки кадров игрового сокета.
+
+По умолчанию сокет говорит JSON-текстом. Клиент может запросить бинарный
+подпротокол через Sec-WebSocket-Protocol: 'durak.msgpack.v1' - MessagePack,
+где ключи сообщений заменены короткими (KEYS), а id карт - номерами ячеек
+атласа (cards.all_card_ids()). Таблицы ключей и карт сервер отдает клиенту в
+первом кадре 'hello' (key_table, card_table), так что своей копии у клиента нет.
+
+Без пакета msgpack подпротокол не предлагается и сокет остается на JSON.
+"""
+from .cards import all_card_ids
+from .fastjson import dumps, loads
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SUBPROTOCOL_JSON = 'durak.json'
+SUBPROTOCOL_MSGPACK = 'durak.msgpack.v1'
+
+# Длинное имя -> короткое. Неизвестные ключи передаются как есть,
+# поэтому новые поля работают и без записи здесь (просто не сжимаются).
+KEYS = {
+    # Конверт сообщения
+    'action': 'a',
+    'seq': 's',
+    'epoch': 'e',
+    'messages': 'm',
+    'state': 'st',
+    'player': 'pl',
+    'player_id': 'p',
+    'action_type': 't',
+    'message': 'msg',
+    'game_over': 'go',
+    'room_id': 'r',
+    'last_seq': 'ls',
+    # Шапка комнаты
+    'room': 'rm',
+    'status_display': 'sd',
+    'bet_amount': 'ba',
+    'max_players': 'mx',
+    'creator_id': 'cr',
+    # Состояние игры
+    'players': 'ps',
+    'attacker_id': 'ai',
+    'defender_id': 'di',
+    'attacker_username': 'au',
+    'defender_username': 'du',
+    'trump_suit': 'ts',
+    'trump_card_revealed': 'tc',
+    'deck_count': 'dc',
+    'table': 'tb',
+    'attack_card': 'ac',
+    'defense_card': 'dfc',
+    'status': 'sts',
+    'winner_username': 'wu',
+    'is_game_over': 'igo',
+    'game_over_message': 'gom',
+    'is_game_initialized': 'ii',
+    'finish_order': 'fo',
+    'id': 'i',
+    'username': 'u',
+    'card_count': 'cc',
+    'is_current_player_for_state': 'me',
+    'cards': 'c',
+    # Команды хода
+    'card_indices': 'ci',
+    'attack_card_table_index': 'ati',
+    'defense_card_hand_index': 'dhi',
+}
+LONG_KEYS = {short: long for long, short in KEYS.items()}
+assert len(LONG_KEYS) == len(KEYS) and not set(LONG_KEYS) & set(KEYS), 'короткие ключи должны быть уникальны'
+
+# Поля, значения которых - id карт (или списки id)
+CARD_FIELDS = frozenset({'cards', 'attack_card', 'defense_card', 'trump_card_revealed'})
+CARD_IDS = all_card_ids()
+CARD_NUMBERS = {cid: number for number, cid in enumerate(CARD_IDS)}
+
+
+def _card_number(value):
+    return CARD_NUMBERS.get(value, value) if isinstance(value, str) else value
+
+
+def _card_id(value):
+    return CARD_IDS[value] if isinstance(value, int) and 0 <= value < len(CARD_IDS) else value
+
+
+def compact(obj):
+    """Длинные ключи -> короткие, id карт -> номера."""
+    if isinstance(obj, dict):
+        result = {}
+        for key, value in obj.items():
+            if key in CARD_FIELDS:
+                value = [_card_number(v) for v in value] if isinstance(value, list) else _card_number(value)
+            else:
+                value = compact(value)
+            result[KEYS.get(key, key)] = value
+        return result
+    if isinstance(obj, (list, tuple)):
+        return [compact(item) for item in obj]
+    return obj
+
+
+def expand(obj):
+    """Обратное compact: для входящих команд и для проверки."""
+    if isinstance(obj, dict):
+        result = {}
+        for key, value in obj.items():
+            key = LONG_KEYS.get(key, key)
+            if key in CARD_FIELDS:
+                value = [_card_id(v) for v in value] if isinstance(value, list) else _card_id(value)
+            else:
+                value = expand(value)
+            result[key] = value
+        return result
+    if isinstance(obj, list):
+        return [expand(item) for item in obj]
+    return obj
+
+
+class JsonCodec:
+    subprotocol = SUBPROTOCOL_JSON
+    binary = False
+
+    def encode(self, message: dict) -> str:
+        return dumps(message)
+
+    def decode(self, text_data=None, bytes_data=None) -> dict:
+        return loads(text_data if text_data is not None else bytes_data)
+
+    def hello(self, message: dict) -> dict:
+        return message
+
+
+class MsgpackCodec:
+    subprotocol = SUBPROTOCOL_MSGPACK
+    binary = True
+
+    def encode(self, message: dict) -> bytes:
+        return msgpack.packb(compact(message))
+
+    def decode(self, text_data=None, bytes_data=None) -> dict:
+        if bytes_data is None:
+            # Текстовый кадр в бинарной сессии - пусть будет JSON с длинными ключами
+            return loads(text_data)
+        return expand(msgpack.unpackb(bytes_data))
+
+    def hello(self, message: dict) -> dict:
+        # Имена таблиц не входят ни в KEYS, ни в CARD_FIELDS и доходят до клиента как есть
+        return {**message, 'key_table': LONG_KEYS, 'card_table': CARD_IDS}
+
+
+json_codec = JsonCodec()
+msgpack_codec = MsgpackCodec() if msgpack is not None else None
+CODECS = {codec.subprotocol: codec for codec in (json_codec, msgpack_codec) if codec is not None}
+
+
+def negotiate(requested) -> tuple:
+    """(кодек, подпротокол для accept) по списку из Sec-WebSocket-Protocol в порядке клиента."""
+    for name in requested or ():
+        codec = CODECS.get(name)
+        if codec is not None:
+            return codec, name
+    return json_codec, None
@@ -0,0 +1,53 @@
+"""
+Бэкенд аутентификации с кэшем игроков.
+
+get_user вызывается на каждый HTTP-запрос (AuthenticationMiddleware, в том
+числе request.auser() в async-view) и на каждое подключение сокета
+(AuthMiddlewareStack из channels) - и каждый раз читал строку Player. Теперь
+игрок берется из кэша (settings.CACHES) на PLAYER_CACHE_TTL секунд; вместе с
+сессиями в cached_db аутентификация на горячих путях (ping, game_status,
+подключение сокета) не делает запросов к БД.
+
+Кэш сбрасывается при Player.save() и там, где строки игроков меняются
+UPDATE-ом в обход save() (GameRoom.settle): forget_players(). Короткий TTL
+ограничивает устаревание в остальных случаях.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+
+def cache_key(player_id) -> str:
+    return f'player:{player_id}'
+
+
+def _ttl() -> int:
+    return getattr(settings, 'PLAYER_CACHE_TTL', 30)
+
+
+def forget_players(*player_ids):
+    """Сбрасывает кэш сейчас и еще раз после фиксации: читатель мог успеть положить старую строку."""
+    keys = [cache_key(player_id) for player_id in player_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        user = cache.get(cache_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(cache_key(user_id), user, _ttl())
+            return user
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        user = await cache.aget(cache_key(user_id))
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(cache_key(user_id), user, _ttl())
+            return user
+        return user if self.user_can_authenticate(user) else None
@@ -13,10 +13,41 @@ class Player(AbstractUser):
 
     games_played = models.IntegerField(default=0)
     games_won = models.IntegerField(default=0)
+    rating = models.FloatField(default=1500.0, help_text="Рейтинг Эло, пересчитывается при расчете партии")
 
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        from .backends import forget_players
+        super().save(*args, **kwargs)
+        forget_players(self.pk)
+
+    def delete(self, *args, **kwargs):
+        from .backends import forget_players
+        player_id = self.pk
+        result = super().delete(*args, **kwargs)
+        forget_players(player_id)
+        return result
+
+    def change_cash(self, delta: int, **fields) -> bool:
+        """
+        Меняет баланс в БД (cash = cash + delta) и заодно пишет fields.
+
+        Не записывать self.cash: request.user берется из кэша
+        (players/backends.py) и может не знать о выплате, сделанной в другом
+        процессе. Списание не проходит (False), если денег не хватает.
+        """
+        from .backends import forget_players
+        queryset = Player.objects.filter(pk=self.pk)
+        if delta < 0:
+            queryset = queryset.filter(cash__gte=-delta)
+        if not queryset.update(cash=models.F('cash') + delta, **fields):
+            return False
+        forget_players(self.pk)
+        self.refresh_from_db(fields=['cash', *fields])
+        return True
+
     @property
     def win_rate(self):
         return (self.games_won / self.games_played * 100) if self.games_played > 0 else 0
@@ -32,17 +63,17 @@ class Player(AbstractUser):
             return False, "Комната заполнена."
 
         self.current_room = room
-        room.players.add(self)
-        self.save()
+        room.add_player(self)
+        self.save(update_fields=['current_room'])
         return True, "Успешно присоединились."
 
     def leave_room(self):
         """Выход из текущей комнаты. Этот метод может быть частью логики view."""
         if self.current_room:
             room = self.current_room
-            room.players.remove(self)
+            room.remove_player(self)
             if self.current_room == room:
                 self.current_room = None
-            self.save()
+            self.save(update_fields=['current_room'])
             return True
         return False
\ No newline at end of file
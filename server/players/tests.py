@@ -1,3 +1,116 @@
-from django.test import TestCase
+from unittest import mock
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from . import throttle
+from .backends import CachedModelBackend, cache_key, forget_players
+from .models import Player
 
-# Create your tests here.
+
+class CachedModelBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.player = Player.objects.create_user(username='cached', password=None, cash=1000)
+        self.backend = CachedModelBackend()
+
+    def test_second_lookup_comes_from_cache(self):
+        self.assertEqual(self.backend.get_user(self.player.id).cash, 1000)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.player.id), self.player)
+
+    def test_update_needs_forget_players(self):
+        self.backend.get_user(self.player.id)
+        Player.objects.filter(id=self.player.id).update(cash=5)
+        # UPDATE в обход save() кэш не видит - для этого и есть forget_players
+        self.assertEqual(self.backend.get_user(self.player.id).cash, 1000)
+        forget_players(self.player.id)
+        self.assertEqual(self.backend.get_user(self.player.id).cash, 5)
+
+    def test_save_and_change_cash_invalidate(self):
+        self.backend.get_user(self.player.id)
+        self.player.change_cash(-300)
+        self.assertEqual(self.backend.get_user(self.player.id).cash, 700)
+        self.player.games_won = 3
+        self.player.save()
+        self.assertEqual(self.backend.get_user(self.player.id).games_won, 3)
+
+    def test_deleted_player_leaves_cache(self):
+        self.backend.get_user(self.player.id)
+        self.player.delete()
+        self.assertIsNone(cache.get(cache_key(self.player.id)))
+
+    def test_inactive_cached_player_is_refused(self):
+        self.player.is_active = False
+        cache.set(cache_key(self.player.id), self.player)
+        self.assertIsNone(self.backend.get_user(self.player.id))
+
+
+class ChangeCashTests(TestCase):
+    def setUp(self):
+        self.player = Player.objects.create_user(username='cash', password=None, cash=100)
+
+    def test_overdraw_is_refused(self):
+        self.assertFalse(self.player.change_cash(-101))
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.cash, 100)
+
+    def test_change_writes_fields(self):
+        self.assertTrue(self.player.change_cash(-100, games_played=2))
+        self.assertEqual((self.player.cash, self.player.games_played), (0, 2))
+        self.assertTrue(self.player.change_cash(50))
+        self.assertEqual(Player.objects.get(id=self.player.id).cash, 50)
+
+
+@override_settings(AUTH_THROTTLE_IP=3, AUTH_THROTTLE_USERNAME=2)
+class ThrottleTests(TestCase):
+    def setUp(self):
+        throttle.ip_buckets.clear()
+        throttle.username_buckets.clear()
+        self.request = RequestFactory().post('/login/', REMOTE_ADDR='10.0.0.1')
+
+    def test_bucket_allows_burst_then_refills(self):
+        bucket = throttle.TokenBucket('AUTH_THROTTLE_IP', 20)
+        with mock.patch.object(throttle.time, 'monotonic', return_value=100.0) as clock:
+            self.assertEqual([bucket.take('key') for _ in range(3)], [0, 0, 0])
+            # 3 попытки в минуту: следующая - через 20 секунд
+            self.assertAlmostEqual(bucket.take('key'), 20.0)
+            self.assertEqual(bucket.take('other'), 0)
+            clock.return_value = 120.0
+            self.assertEqual(bucket.take('key'), 0)
+            self.assertGreater(bucket.take('key'), 0)
+
+    def test_full_buckets_are_pruned(self):
+        bucket = throttle.TokenBucket('AUTH_THROTTLE_IP', 20, max_keys=2)
+        with mock.patch.object(throttle.time, 'monotonic', return_value=100.0) as clock:
+            bucket.take('a')
+            bucket.take('b')
+            clock.return_value = 200.0
+            bucket.take('c')
+        self.assertEqual(list(bucket._buckets), ['c'])
+
+    @override_settings(AUTH_THROTTLE_IP=100)
+    def test_username_limit_is_case_insensitive(self):
+        self.assertEqual(throttle.check(self.request, 'Alice'), 0)
+        self.assertEqual(throttle.check(self.request, ' alice'), 0)
+        # 2 попытки в минуту на логин: следующая - через 30 секунд
+        self.assertEqual(throttle.check(self.request, 'ALICE'), 30)
+        self.assertEqual(throttle.check(self.request, 'bob'), 0)
+
+    def test_ip_limit(self):
+        for _ in range(3):
+            self.assertEqual(throttle.check(self.request), 0)
+        self.assertEqual(throttle.check(self.request), 20)
+        other = RequestFactory().post('/login/', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(throttle.check(other), 0)
+
+    # Манифест статики есть только после collectstatic
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_login_view_answers_429(self):
+        for _ in range(2):
+            self.client.post(reverse('login'), {'username': 'nobody', 'password': 'x'})
+        response = self.client.post(reverse('login'), {'username': 'nobody', 'password': 'x'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(int(response['Retry-After']), range(1, 31))
@@ -0,0 +1,67 @@
+"""
+Ограничение частоты входов и регистраций: token bucket в памяти процесса.
+
+У каждого ключа (IP, логин) ведро на N попыток, которое пополняется со
+скоростью N в минуту: короткий всплеск пропускается, перебор паролей - нет.
+Состояние не переживает перезапуск и у каждого процесса daphne свое - это
+защита от перегрузки хэшированием, а не учет попыток.
+"""
+import math
+import threading
+import time
+from django.conf import settings
+
+
+class TokenBucket:
+    def __init__(self, setting: str, default: int, max_keys: int = 100000):
+        self.setting = setting
+        self.default = default
+        self.max_keys = max_keys
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return max(1, getattr(settings, self.setting, self.default))
+
+    def take(self, key: str) -> float:
+        """Забирает попытку; 0 - можно, иначе через сколько секунд появится следующая."""
+        capacity = self.capacity
+        rate = capacity / 60
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now, rate, capacity)
+        return 0
+
+    def _prune(self, now: float, rate: float, capacity: int):
+        # Полные ведра ничего не помнят - их можно выбросить
+        for key, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * rate >= capacity:
+                del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+ip_buckets = TokenBucket('AUTH_THROTTLE_IP', 20)
+username_buckets = TokenBucket('AUTH_THROTTLE_USERNAME', 5)
+
+
+def client_ip(request) -> str:
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def check(request, username: str = '') -> int:
+    """Секунд до следующей попытки (0 - можно) для IP запроса и, если задан, логина."""
+    wait = ip_buckets.take(client_ip(request))
+    if username and not wait:
+        wait = username_buckets.take(username.strip().lower())
+    return math.ceil(wait)
@@ -1,14 +1,84 @@
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth import login
+from django.contrib.auth.forms import AuthenticationForm
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.cache import never_cache
+from django.views.decorators.debug import sensitive_post_parameters
+from game.executor import PoolBusy, auth_pool
+from . import throttle
 from .forms import PlayerRegistrationForm
 
-def register_view(request):
+# Хэширование пароля (PBKDF2) - сотни миллисекунд CPU. Вход и регистрация
+# async: проверка формы и login() идут в auth_pool, а не в общий поток
+# sync-view, где они задерживали бы остальные запросы.
+
+
+def _refuse(request, template, form, status, retry_after):
+    if status == 429:
+        error = "Слишком много попыток. Попробуйте через несколько секунд."
+    else:
+        error = "Сервер перегружен. Попробуйте через несколько секунд."
+    response = render(request, template, {'form': form, 'error': error}, status=status)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def _register(request, form):
+    if not form.is_valid():
+        return False
+    user = form.save()
+    login(request, user)
+    return True
+
+
+@sensitive_post_parameters()
+@never_cache
+async def register_view(request):
+    # Для шаблона: ленивый request.user в async-view обратился бы к БД синхронно
+    request.user = await request.auser()
     if request.method == 'POST':
         form = PlayerRegistrationForm(request.POST)
-        if form.is_valid():
-            user = form.save()
-            login(request, user)
-            return redirect('lobby') 
+        wait = throttle.check(request)
+        if wait:
+            return _refuse(request, 'registration/register.html', form, 429, wait)
+        try:
+            registered = await auth_pool.run(_register, request, form)
+        except PoolBusy:
+            return _refuse(request, 'registration/register.html', form, 503, 2)
+        if registered:
+            return redirect('lobby')
     else:
         form = PlayerRegistrationForm()
-    return render(request, 'registration/register.html', {'form': form})
\ No newline at end of file
+    return render(request, 'registration/register.html', {'form': form})
+
+
+def _login(request, form):
+    if not form.is_valid():
+        return False
+    login(request, form.get_user())
+    return True
+
+
+@sensitive_post_parameters()
+@never_cache
+async def login_view(request):
+    request.user = await request.auser()
+    next_url = request.POST.get('next') or request.GET.get('next', '')
+    if request.method == 'POST':
+        form = AuthenticationForm(request, data=request.POST)
+        wait = throttle.check(request, request.POST.get('username', ''))
+        if wait:
+            return _refuse(request, 'registration/login.html', form, 429, wait)
+        try:
+            logged_in = await auth_pool.run(_login, request, form)
+        except PoolBusy:
+            return _refuse(request, 'registration/login.html', form, 503, 2)
+        if logged_in:
+            if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()},
+                                               require_https=request.is_secure()):
+                return redirect(next_url)
+            return redirect(settings.LOGIN_REDIRECT_URL)
+    else:
+        form = AuthenticationForm(request)
+    return render(request, 'registration/login.html', {'form': form, 'next': next_url})
@@ -1,12 +1,16 @@
 import os
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import game.routing
+from server.staticfiles import StaticFilesApp
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 
 django_asgi_app = get_asgi_application()
+if settings.SERVE_STATIC:
+    django_asgi_app = StaticFilesApp(django_asgi_app)
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -0,0 +1,584 @@
+"""
+Канальный слой Channels для нескольких процессов на одном хосте.
+
+InMemoryChannelLayer доставляет group_send только сокетам своего процесса,
+поэтому daphne нельзя запустить в несколько процессов. Здесь сообщения
+хранит маленький процесс-брокер, к которому все процессы ходят через
+Unix domain socket. Внешних сервисов не нужно: брокер поднимается сам
+(autostart) или командой ``manage.py run_ipc_broker``.
+
+Протокол: кадр = 4 байта длины (big-endian) + pickle кортежа
+``(op, request_id, *args)``. Тело сообщения сериализуется один раз на
+стороне клиента, а брокер раскладывает по каналам группы одни и те же
+байты. Кадры, записанные за один проход event loop, уходят одной записью
+в сокет (пакетная отправка), очереди каналов ограничены ``capacity``.
+
+Брокер же хранит outbox комнат (game/outbox.py): сквозной seq и буфер
+последних сообщений общие для всех процессов, так что сокет, переподключившийся
+к другому процессу, продолжает с того же seq.
+"""
+import argparse
+import asyncio
+import fcntl
+import logging
+import os
+import pickle
+import random
+import secrets
+import string
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import weakref
+from collections import OrderedDict, deque
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'durak-channels.sock')
+
+_HEADER = struct.Struct('!I')
+_PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+def _pack(frame: tuple) -> bytes:
+    payload = pickle.dumps(frame, protocol=_PICKLE_PROTOCOL)
+    return _HEADER.pack(len(payload)) + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> tuple:
+    header = await reader.readexactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    return pickle.loads(await reader.readexactly(length))
+
+
+# --- Брокер ---------------------------------------------------------------
+
+class _BrokerClient:
+    """Одно подключение процесса к брокеру."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.buffer: list[bytes] = []
+        self.flush_scheduled = False
+        self.closed = False
+
+    def reply(self, frame: tuple):
+        if self.closed:
+            return
+        self.buffer.append(_pack(frame))
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self.flush_scheduled = False
+        if self.buffer and not self.closed:
+            self.writer.write(b''.join(self.buffer))
+        self.buffer.clear()
+
+
+class IPCBroker:
+    """Хранит очереди каналов и группы, раздаёт сообщения ожидающим receive()."""
+
+    def __init__(self, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None, outbox_rooms=10000):
+        self.expiry = expiry
+        self.group_expiry = group_expiry
+        self.capacity = capacity
+        # Паттерны разбираем так же, как BaseChannelLayer, чтобы конфиг был общий
+        self._capacities = BaseChannelLayer(capacity=capacity)
+        self._capacities.channel_capacity = self._capacities.compile_capacities(channel_capacity or {})
+        self.channels: dict[str, deque] = {}
+        self.waiters: dict[str, deque] = {}
+        self.groups: dict[str, dict[str, float]] = {}
+        # Outbox комнат: room -> [seq, deque последних сообщений]; epoch меняется с рестартом брокера
+        self.epoch = secrets.token_hex(4)
+        self.outboxes: OrderedDict = OrderedDict()
+        self.outbox_rooms = outbox_rooms
+
+    # Очереди
+
+    def _deliver(self, channel: str, body: bytes) -> bool:
+        """Кладёт сообщение в канал. Возвращает False, если очередь заполнена."""
+        waiters = self.waiters.get(channel)
+        while waiters:
+            client, request_id = waiters.popleft()
+            if not waiters:
+                self.waiters.pop(channel, None)
+            if not client.closed:
+                client.reply(('msg', request_id, body))
+                return True
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = deque()
+        elif len(queue) >= self._capacities.get_capacity(channel):
+            return False
+        queue.append((time.time() + self.expiry, body))
+        return True
+
+    def _pop(self, channel: str):
+        queue = self.channels.get(channel)
+        now = time.time()
+        while queue:
+            expires_at, body = queue.popleft()
+            if expires_at >= now:
+                if not queue:
+                    self.channels.pop(channel, None)
+                return body
+            self._remove_from_groups(channel)
+        self.channels.pop(channel, None)
+        return None
+
+    def _remove_from_groups(self, channel: str):
+        for members in self.groups.values():
+            members.pop(channel, None)
+
+    def clean_expired(self):
+        now = time.time()
+        for channel, queue in list(self.channels.items()):
+            expired = False
+            while queue and queue[0][0] < now:
+                queue.popleft()
+                expired = True
+            if expired:
+                self._remove_from_groups(channel)
+            if not queue:
+                self.channels.pop(channel, None)
+
+        timeout = now - self.group_expiry
+        for group, members in list(self.groups.items()):
+            for channel, joined_at in list(members.items()):
+                if joined_at < timeout:
+                    members.pop(channel, None)
+            if not members:
+                self.groups.pop(group, None)
+
+    # Outbox комнат
+
+    def _outbox(self, room: str, size: int) -> list:
+        outbox = self.outboxes.get(room)
+        if outbox is None:
+            outbox = self.outboxes[room] = [0, deque(maxlen=max(size, 1))]
+            if len(self.outboxes) > self.outbox_rooms:
+                self.outboxes.popitem(last=False)
+        else:
+            self.outboxes.move_to_end(room)
+        return outbox
+
+    def outbox_publish(self, group: str, room: str, message: dict, size: int, envelope: dict) -> dict:
+        """Нумерует сообщение, кладет в буфер комнаты и рассылает группе - атомарно для всех процессов."""
+        outbox = self._outbox(room, size)
+        outbox[0] += 1
+        stamped = {**message, 'seq': outbox[0], 'epoch': self.epoch}
+        outbox[1].append(stamped)
+        body = pickle.dumps({**envelope, 'message': stamped}, protocol=_PICKLE_PROTOCOL)
+        for channel in list(self.groups.get(group, ())):
+            self._deliver(channel, body)
+        return stamped
+
+    def outbox_since(self, room: str, last_seq: int, epoch):
+        """Сообщения после last_seq или None, если epoch другой или буфер их уже не хранит."""
+        if epoch != self.epoch:
+            return None
+        seq, buffer = self.outboxes.get(room) or (0, ())
+        if last_seq >= seq:
+            return []
+        if not buffer or buffer[0]['seq'] > last_seq + 1:
+            return None
+        return [message for message in buffer if message['seq'] > last_seq]
+
+    # Обработка кадров
+
+    def handle(self, client: _BrokerClient, frame: tuple):
+        op, request_id = frame[0], frame[1]
+        if op == 'send':
+            _, _, channel, body = frame
+            client.reply(('ok' if self._deliver(channel, body) else 'full', request_id))
+        elif op == 'recv':
+            body = self._pop(frame[2])
+            if body is not None:
+                client.reply(('msg', request_id, body))
+            else:
+                self.waiters.setdefault(frame[2], deque()).append((client, request_id))
+        elif op == 'cancel':
+            _, _, channel = frame
+            waiters = self.waiters.get(channel)
+            if waiters and (client, request_id) in waiters:
+                waiters.remove((client, request_id))
+                if not waiters:
+                    self.waiters.pop(channel, None)
+                client.reply(('cancelled', request_id))
+        elif op == 'group_add':
+            _, _, group, channel = frame
+            self.groups.setdefault(group, {})[channel] = time.time()
+            client.reply(('ok', request_id))
+        elif op == 'group_discard':
+            _, _, group, channel = frame
+            members = self.groups.get(group)
+            if members:
+                members.pop(channel, None)
+                if not members:
+                    self.groups.pop(group, None)
+            client.reply(('ok', request_id))
+        elif op == 'group_send':
+            _, _, group, body = frame
+            # Переполненные каналы группы молча пропускаем, как InMemoryChannelLayer
+            for channel in list(self.groups.get(group, ())):
+                self._deliver(channel, body)
+            client.reply(('ok', request_id))
+        elif op == 'outbox_publish':
+            _, _, group, room, message, size, envelope = frame
+            client.reply(('ok', request_id, self.outbox_publish(group, room, message, size, envelope)))
+        elif op == 'outbox_since':
+            _, _, room, last_seq, epoch = frame
+            client.reply(('ok', request_id, self.outbox_since(room, last_seq, epoch)))
+        elif op == 'outbox_position':
+            _, _, room = frame
+            outbox = self.outboxes.get(room)
+            client.reply(('ok', request_id, outbox[0] if outbox else 0, self.epoch))
+        elif op == 'flush':
+            self.channels.clear()
+            self.groups.clear()
+            client.reply(('ok', request_id))
+        else:
+            logger.warning("IPC broker: unknown op %r", op)
+
+    def drop_client(self, client: _BrokerClient):
+        client.closed = True
+        for channel, waiters in list(self.waiters.items()):
+            kept = deque(w for w in waiters if w[0] is not client)
+            if kept:
+                self.waiters[channel] = kept
+            else:
+                self.waiters.pop(channel, None)
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = _BrokerClient(writer)
+        try:
+            while True:
+                frame = await _read_frame(reader)
+                self.handle(client, frame)
+                # Отдаём накопленные ответы, не дожидаясь следующего прохода
+                if len(client.buffer) > 64:
+                    client._flush()
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.drop_client(client)
+            writer.close()
+
+    async def serve(self, path: str):
+        if os.path.exists(path):
+            os.unlink(path)
+        # Сокет сразу создается с правами 0600: chmod после bind оставлял окно,
+        # в которое любой локальный пользователь мог подключиться и слать pickle
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.serve_client, path=path)
+        finally:
+            os.umask(old_umask)
+        logger.info("IPC channel broker listening on %s", path)
+
+        async def sweep():
+            while True:
+                await asyncio.sleep(1)
+                self.clean_expired()
+
+        sweeper = asyncio.create_task(sweep())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def run_broker(path=DEFAULT_SOCKET_PATH, **config):
+    """Запускает брокер в текущем процессе (блокирующий вызов)."""
+    # Лок не даёт двум брокерам занять один и тот же сокет
+    lock_file = open(path + '.lock', 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        logger.info("IPC channel broker for %s is already running", path)
+        lock_file.close()
+        return
+    try:
+        asyncio.run(IPCBroker(**config).serve(path))
+    finally:
+        lock_file.close()
+
+
+# --- Клиентская часть -----------------------------------------------------
+
+class _Connection:
+    """Подключение к брокеру в рамках одного event loop."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self.pending: dict[int, asyncio.Future] = {}
+        # request_id -> канал для receive(), отменённых до ответа брокера
+        self.cancelled: dict[int, str] = {}
+        self.stash: dict[str, deque] = {}
+        self.next_id = 0
+        self.buffer: list[bytes] = []
+        self.flush_scheduled = False
+        self.closed = False
+        self.reader_task = self.loop.create_task(self._read_loop())
+
+    def request(self, *frame) -> tuple[int, asyncio.Future]:
+        if self.closed:
+            raise ConnectionError("IPC channel broker connection is closed")
+        self.next_id += 1
+        request_id = self.next_id
+        future = self.loop.create_future()
+        self.pending[request_id] = future
+        self._write((frame[0], request_id) + frame[1:])
+        return request_id, future
+
+    def _write(self, frame: tuple):
+        self.buffer.append(_pack(frame))
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.loop.call_soon(self._flush)
+
+    def _flush(self):
+        self.flush_scheduled = False
+        if self.buffer and not self.closed:
+            self.writer.write(b''.join(self.buffer))
+        self.buffer.clear()
+
+    def cancel_receive(self, request_id: int, channel: str):
+        future = self.pending.pop(request_id, None)
+        if future is not None and not self.closed:
+            self.cancelled[request_id] = channel
+            self._write(('cancel', request_id, channel))
+
+    async def _read_loop(self):
+        try:
+            while True:
+                frame = await _read_frame(self.reader)
+                status, request_id = frame[0], frame[1]
+                future = self.pending.pop(request_id, None)
+                if future is None:
+                    channel = self.cancelled.pop(request_id, None)
+                    if status == 'msg' and channel is not None:
+                        # Брокер успел отдать сообщение до отмены: не теряем его
+                        self.stash.setdefault(channel, deque()).append(frame[2])
+                    continue
+                if not future.done():
+                    future.set_result(frame)
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            self._fail(e)
+        except asyncio.CancelledError:
+            self._fail(ConnectionError("IPC channel broker connection closed"))
+            raise
+
+    def _fail(self, exc: BaseException):
+        self.closed = True
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"IPC channel broker connection lost: {exc}"))
+        self.pending.clear()
+
+    async def close(self):
+        self.closed = True
+        self.reader_task.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+
+class IPCChannelLayer(BaseChannelLayer):
+    """
+    Канальный слой поверх процесса-брокера на Unix domain socket.
+
+    CONFIG: ``path`` — путь к сокету, ``autostart`` — поднять брокер, если
+    его нет; ``expiry``, ``group_expiry``, ``capacity``, ``channel_capacity``
+    передаются брокеру при автозапуске.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH, autostart=True, expiry=60, group_expiry=86400,
+                 capacity=100, channel_capacity=None, connect_timeout=5.0, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.path = path
+        self.autostart = autostart
+        self.group_expiry = group_expiry
+        self.connect_timeout = connect_timeout
+        self._broker_config = {
+            'expiry': expiry,
+            'group_expiry': group_expiry,
+            'capacity': capacity,
+            'channel_capacity': channel_capacity or {},
+        }
+        self.client_prefix = ''.join(random.choice(string.ascii_letters) for _ in range(8))
+        # async_to_sync создаёт свои event loop'ы, поэтому подключение своё на каждый loop
+        self._connections: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Connection]' = weakref.WeakKeyDictionary()
+        self._connect_locks: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]' = weakref.WeakKeyDictionary()
+
+    # Подключение
+
+    async def _connection(self) -> _Connection:
+        loop = asyncio.get_running_loop()
+        conn = self._connections.get(loop)
+        if conn is not None and not conn.closed:
+            return conn
+        lock = self._connect_locks.setdefault(loop, asyncio.Lock())
+        async with lock:
+            conn = self._connections.get(loop)
+            if conn is None or conn.closed:
+                reader, writer = await self._open()
+                conn = self._connections[loop] = _Connection(reader, writer)
+        return conn
+
+    async def _open(self):
+        try:
+            return await asyncio.open_unix_connection(self.path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not self.autostart:
+                raise
+        self._spawn_broker()
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.05)
+
+    def _spawn_broker(self):
+        logger.info("Starting IPC channel broker on %s", self.path)
+        args = [
+            sys.executable, '-m', __name__, '--path', self.path,
+            '--expiry', str(self.expiry), '--group-expiry', str(self.group_expiry),
+            '--capacity', str(self.capacity),
+        ]
+        for pattern, value in self._broker_config['channel_capacity'].items():
+            args += ['--channel-capacity', f'{pattern}={value}']
+        project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.Popen(
+            args, cwd=project_dir, start_new_session=True,
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+        )
+
+    async def _call(self, *frame) -> tuple:
+        conn = await self._connection()
+        _, future = conn.request(*frame)
+        return await future
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+        reply = await self._call('send', channel, pickle.dumps(message, protocol=_PICKLE_PROTOCOL))
+        if reply[0] == 'full':
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        conn = await self._connection()
+        stash = conn.stash.get(channel)
+        if stash:
+            body = stash.popleft()
+            if not stash:
+                conn.stash.pop(channel, None)
+            return pickle.loads(body)
+        request_id, future = conn.request('recv', channel)
+        try:
+            reply = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Ответ пришёл одновременно с отменой задачи
+                conn.stash.setdefault(channel, deque()).append(future.result()[2])
+            else:
+                conn.cancel_receive(request_id, channel)
+            raise
+        return pickle.loads(reply[2])
+
+    async def new_channel(self, prefix="specific."):
+        return "%s.%s!%s" % (
+            prefix,
+            self.client_prefix,
+            "".join(random.choice(string.ascii_letters) for _ in range(12)),
+        )
+
+    async def flush(self):
+        await self._call('flush')
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        conn = self._connections.pop(loop, None)
+        if conn is not None:
+            await conn.close()
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._call('group_add', group, channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        await self._call('group_discard', group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        await self._call('group_send', group, pickle.dumps(message, protocol=_PICKLE_PROTOCOL))
+
+    # Outbox комнат в брокере (см. game/outbox.py)
+
+    shared_outbox = True
+
+    async def outbox_publish(self, group: str, room: str, message: dict, size: int, envelope: dict) -> dict:
+        """group_send, для которого брокер сам проставляет seq/epoch и запоминает сообщение."""
+        self.require_valid_group_name(group)
+        return (await self._call('outbox_publish', group, room, message, size, envelope))[2]
+
+    async def outbox_since(self, room: str, last_seq: int, epoch):
+        return (await self._call('outbox_since', room, last_seq, epoch))[2]
+
+    async def outbox_position(self, room: str) -> tuple[int, str]:
+        reply = await self._call('outbox_position', room)
+        return reply[2], reply[3]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="IPC channel layer broker")
+    parser.add_argument('--path', default=DEFAULT_SOCKET_PATH)
+    parser.add_argument('--expiry', type=int, default=60)
+    parser.add_argument('--group-expiry', type=int, default=86400)
+    parser.add_argument('--capacity', type=int, default=100)
+    parser.add_argument('--channel-capacity', action='append', default=[],
+                        help="Паттерн канала и ёмкость в виде 'http.request*=200'")
+    args = parser.parse_args(argv)
+    channel_capacity = {}
+    for item in args.channel_capacity:
+        pattern, _, value = item.rpartition('=')
+        channel_capacity[pattern] = int(value)
+    logging.basicConfig(level=logging.INFO)
+    run_broker(
+        args.path, expiry=args.expiry, group_expiry=args.group_expiry,
+        capacity=args.capacity, channel_capacity=channel_capacity,
+    )
+
+
+if __name__ == '__main__':
+    main()
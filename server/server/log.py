@@ -0,0 +1,127 @@
+"""
+Логирование без блокировки потока запроса.
+
+* AsyncBatchHandler кладет записи в очередь, а фоновый поток форматирует их
+  и пишет в поток пачками. Если очередь переполнена, запись отбрасывается, а
+  число потерь попадает в следующую пачку.
+* JsonFormatter пишет одну JSON-строку на запись; поля из extra= (room_id,
+  player_id, ...) становятся полями объекта.
+* RoomSamplingFilter пропускает DEBUG только для 1 из N комнат. У выбранной
+  комнаты лог полный, у остальных DEBUG не пишется.
+
+Вызовы в горячем коде — в %-стиле с extra, например
+``logger.debug("Room %s loaded", room.id, extra={'room_id': room.id})``.
+Тогда строка собирается только в фоновом потоке и только если запись прошла
+фильтры. Поэтому в args передаем только неизменяемые значения: id, строки, числа.
+"""
+import atexit
+import datetime
+import json
+import logging
+import queue
+import sys
+import threading
+import zlib
+
+# Атрибуты, которые есть у любой LogRecord; все остальное пришло через extra=
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class RoomSamplingFilter(logging.Filter):
+    """DEBUG-записи с room_id проходят только для каждой rate-й комнаты (детерминированно по id)."""
+
+    def __init__(self, rate: int = 10):
+        super().__init__()
+        self.rate = max(1, int(rate))
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        room_id = getattr(record, 'room_id', None)
+        if room_id is None or self.rate == 1:
+            return True
+        return zlib.crc32(str(room_id).encode()) % self.rate == 0
+
+
+class AsyncBatchHandler(logging.Handler):
+    _STOP = object()
+
+    def __init__(self, stream=None, capacity: int = 10000, batch_size: int = 256):
+        super().__init__()
+        self.stream = stream or sys.stderr
+        self.batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue(maxsize=capacity)
+        self._dropped = 0
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, record):
+        if record.exc_info:
+            # traceback держит кадры живыми; текст собираем сразу, как QueueHandler
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._dropped += 1
+
+    def _run(self):
+        while True:
+            # Пока пишем одну пачку, в очереди копится следующая
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is self._STOP for item in batch)
+            self._write([item for item in batch if item is not self._STOP])
+            if stop:
+                return
+
+    def _write(self, records):
+        lines = []
+        if self._dropped:
+            dropped, self._dropped = self._dropped, 0
+            lines.append(self.format(logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': 'Log queue overflow: %s records dropped', 'args': (dropped,),
+            })))
+        for record in records:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        try:
+            self.stream.write('\n'.join(lines) + '\n')
+            self.stream.flush()
+        except Exception:
+            pass
+
+    def close(self):
+        if self._thread.is_alive():
+            # Дописываем хвост очереди перед выходом
+            self._queue.put(self._STOP)
+            self._thread.join(timeout=5)
+        super().close()
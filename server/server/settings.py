@@ -30,11 +30,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'game.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'game.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -66,6 +68,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Пишут и запросы, и воркеры задач (game/tasks.py): транзакция сразу берет
+        # блокировку записи, а занятую базу ждем, а не падаем с "database is locked"
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -85,31 +93,105 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# collectstatic хеширует имена и кладет рядом .gz/.br (server/staticfiles.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'server.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+# Раздавать STATIC_ROOT из самого daphne (когда перед ним нет nginx)
+SERVE_STATIC = os.getenv('SERVE_STATIC', '0' if DEBUG else '1') == '1'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'players.Player'
 
+# Игрок для request.user и сокетов берется из кэша (players/backends.py)
+AUTHENTICATION_BACKENDS = ['players.backends.CachedModelBackend']
+PLAYER_CACHE_TTL = int(os.getenv('PLAYER_CACHE_TTL', 30))
+# Сессия читается из кэша, БД - только при промахе и при записи
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Хэширование паролей в отдельном пуле (game/executor.py auth_pool): потоков и
+# мест в очереди; при полной очереди вход отвечает 503
+AUTH_HASH_WORKERS = int(os.getenv('AUTH_HASH_WORKERS', 2))
+AUTH_HASH_QUEUE = int(os.getenv('AUTH_HASH_QUEUE', 32))
+# Попыток входа/регистрации в минуту (players/throttle.py): с одного IP и на один логин
+AUTH_THROTTLE_IP = int(os.getenv('AUTH_THROTTLE_IP', 20))
+AUTH_THROTTLE_USERNAME = int(os.getenv('AUTH_THROTTLE_USERNAME', 5))
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'lobby'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Секунд на ход; по истечении сервер сам берет карты / пасует за игрока. 0 - без таймера
+GAME_TURN_TIMEOUT = int(os.getenv('GAME_TURN_TIMEOUT', 30))
+
+# Пулы потоков async-view (game/executor.py): ходы и чтение состояния раздельно
+GAME_MOVE_WORKERS = int(os.getenv('GAME_MOVE_WORKERS', 4))
+GAME_READ_WORKERS = int(os.getenv('GAME_READ_WORKERS', 4))
+
+# Фоновые задачи (game/tasks.py): потоки процесса; 0 - только manage.py run_tasks
+GAME_TASK_WORKERS = int(os.getenv('GAME_TASK_WORKERS', 2))
+
+# /metrics: с токеном - по заголовку Authorization: Bearer, без токена - только с localhost
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Сэмплирующий профайлер (game/profiling.py): каждый N-й запрос, стеки в GAME_PROFILE_DIR
+GAME_PROFILING = os.getenv('GAME_PROFILING') == '1'
+GAME_PROFILE_SAMPLE_RATE = int(os.getenv('GAME_PROFILE_SAMPLE_RATE', 100))
+GAME_PROFILE_DIR = os.getenv('GAME_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels.layers.InMemoryChannelLayer"
     },
 }
 
+# Несколько процессов daphne на одном хосте: DJANGO_CHANNEL_LAYER=ipc
+if os.getenv('DJANGO_CHANNEL_LAYER') == 'ipc':
+    CHANNEL_LAYERS['default'] = {
+        "BACKEND": "server.ipc_layer.IPCChannelLayer",
+        "CONFIG": {
+            "path": os.getenv('DJANGO_CHANNEL_SOCKET', os.path.join(BASE_DIR, 'channels.sock')),
+            "autostart": True,
+            "capacity": 100,
+        },
+    }
+
+# Логи пишет фоновый поток пачками (server/log.py); LOG_FORMAT=text - для чтения глазами
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'server.log.JsonFormatter',
+        },
+        'text': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+    },
+    'filters': {
+        'room_sampling': {
+            '()': 'server.log.RoomSamplingFilter',
+            'rate': int(os.getenv('LOG_DEBUG_ROOM_SAMPLE_RATE', 10)),
+        },
+    },
     'handlers': {
         'console': {
-            'class': 'logging.StreamHandler',
+            'class': 'server.log.AsyncBatchHandler',
+            'stream': 'ext://sys.stderr',
+            'formatter': 'json' if os.getenv('LOG_FORMAT', 'json') == 'json' else 'text',
+            'filters': ['room_sampling'],
         },
     },
     'root': {
         'handlers': ['console'],
-        'level': 'DEBUG',
+        'level': os.getenv('LOG_LEVEL', 'INFO'),
     },
     'loggers': {
         'django': {
@@ -118,4 +200,21 @@ LOGGING = {
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
+
+# Кэш процесса (сессии, игроки, повторы партий). Процессы daphne с ipc-слоем
+# должны видеть один кэш - иначе выход из аккаунта в одном процессе не виден
+# в другом, - поэтому для них кэш файловый (DJANGO_CACHE_DIR)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'durak',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+if os.getenv('DJANGO_CACHE_DIR') or os.getenv('DJANGO_CHANNEL_LAYER') == 'ipc':
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('DJANGO_CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
@@ -0,0 +1,143 @@
+"""
+Статика без обратного прокси перед daphne.
+
+CompressedManifestStaticFilesStorage - шаг collectstatic: к именам файлов
+добавляется хеш содержимого (ManifestStaticFilesStorage), а рядом
+заранее кладутся .gz и .br (brotli - если установлен пакет brotli).
+
+StaticFilesApp - ASGI-приложение для /static/: отдает файлы из STATIC_ROOT,
+выбирая .br/.gz по Accept-Encoding. Файлы с хешем в имени отдаются с
+Cache-Control: immutable на год, остальные - с no-cache и ETag.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+from urllib.parse import unquote
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.txt', '.html', '.map', '.xml')
+# Меньше этого сжатие не окупает лишний заголовок
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_CACHE_CONTROL = b'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        if brotli is None:
+            logger.warning("Пакет brotli не установлен: собираются только .gz")
+        # После хеширования сжимаем и исходные, и хешированные имена
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self._write_compressed(name)
+
+    def _write_compressed(self, name: str):
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+
+
+class StaticFilesApp:
+    """Раздача STATIC_ROOT c предсжатыми вариантами; остальное уходит в application."""
+
+    ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, application):
+        self.application = application
+        self.prefix = settings.STATIC_URL
+        self.root = os.path.realpath(settings.STATIC_ROOT) if settings.STATIC_ROOT else None
+        self._immutable_names: frozenset = frozenset()
+        self._manifest_mtime = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.root or not scope['path'].startswith(self.prefix):
+            return await self.application(scope, receive, send)
+        if scope['method'] not in ('GET', 'HEAD'):
+            return await self.application(scope, receive, send)
+
+        relative = posixpath.normpath(unquote(scope['path'][len(self.prefix):])).lstrip('/')
+        path = os.path.realpath(os.path.join(self.root, relative))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return await self.application(scope, receive, send)
+
+        headers = {key.lower(): value for key, value in scope.get('headers', [])}
+        served_path, encoding = self._negotiate(path, headers.get(b'accept-encoding', b''))
+        stat = os.stat(served_path)
+        etag = f'"{int(stat.st_mtime)}-{stat.st_size}-{encoding or "identity"}"'.encode()
+
+        content_type, _ = mimetypes.guess_type(path)
+        response_headers = [
+            (b'content-type', (content_type or 'application/octet-stream').encode()),
+            (b'etag', etag),
+            (b'vary', b'Accept-Encoding'),
+            (b'cache-control', IMMUTABLE_CACHE_CONTROL if self._is_immutable(relative) else b'no-cache'),
+        ]
+        if encoding:
+            response_headers.append((b'content-encoding', encoding.encode()))
+
+        if headers.get(b'if-none-match') == etag:
+            await send({'type': 'http.response.start', 'status': 304, 'headers': response_headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        response_headers.append((b'content-length', str(stat.st_size).encode()))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers})
+        if scope['method'] == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        with open(served_path, 'rb') as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+                more = len(chunk) == CHUNK_SIZE
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more})
+                if not more:
+                    break
+
+    def _negotiate(self, path: str, accept_encoding: bytes):
+        accepted = set()
+        for part in accept_encoding.split(b','):
+            token, _, params = part.partition(b';')
+            if params.replace(b' ', b'') not in (b'q=0', b'q=0.0'):
+                accepted.add(token.strip())
+        for encoding, suffix in self.ENCODINGS:
+            if encoding.encode() in accepted and os.path.isfile(path + suffix):
+                return path + suffix, encoding
+        return path, None
+
+    def _is_immutable(self, relative: str) -> bool:
+        """Хешированные имена берем из манифеста; перечитываем его после collectstatic."""
+        manifest_path = os.path.join(self.root, 'staticfiles.json')
+        try:
+            mtime = os.path.getmtime(manifest_path)
+        except OSError:
+            return False
+        if mtime != self._manifest_mtime:
+            with open(manifest_path) as f:
+                self._immutable_names = frozenset(json.load(f).get('paths', {}).values())
+            self._manifest_mtime = mtime
+        return relative in self._immutable_names
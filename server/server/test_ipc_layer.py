@@ -0,0 +1,217 @@
+"""
+Соответствие IPCChannelLayer контракту канального слоя Channels.
+
+Случаи перенесены из тестов InMemoryChannelLayer самого channels
+(send/receive, ёмкость, группы, истечение, flush) и гоняются против
+настоящего брокера на временном Unix-сокете.
+
+    python manage.py test server.test_ipc_layer
+"""
+import asyncio
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from channels.exceptions import ChannelFull
+
+from server.ipc_layer import IPCBroker, IPCChannelLayer
+
+
+class IPCLayerTestCase(unittest.IsolatedAsyncioTestCase):
+    broker_config = {'expiry': 60, 'group_expiry': 86400, 'capacity': 3}
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.mkdtemp(prefix='durak-ipc-test-')
+        self.path = os.path.join(self.directory, 'channels.sock')
+        self.broker = IPCBroker(**self.broker_config)
+        self.broker_task = asyncio.create_task(self.broker.serve(self.path))
+        for _ in range(100):
+            if os.path.exists(self.path):
+                break
+            await asyncio.sleep(0.01)
+        self.layer = self.make_layer()
+
+    def make_layer(self) -> IPCChannelLayer:
+        return IPCChannelLayer(path=self.path, autostart=False, **self.broker_config)
+
+    async def asyncTearDown(self):
+        await self.layer.close()
+        self.broker_task.cancel()
+        try:
+            await self.broker_task
+        except asyncio.CancelledError:
+            pass
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    async def assertNothingReceived(self, channel: str, layer=None, timeout: float = 0.2):
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for((layer or self.layer).receive(channel), timeout)
+
+
+class SendReceiveTests(IPCLayerTestCase):
+    async def test_send_receive(self):
+        await self.layer.send('test-channel-1', {'type': 'test.message', 'text': 'Ahoy-hoy!'})
+        message = await self.layer.receive('test-channel-1')
+        self.assertEqual(message['type'], 'test.message')
+        self.assertEqual(message['text'], 'Ahoy-hoy!')
+
+    async def test_send_receive_between_layers(self):
+        # Два процесса = два экземпляра слоя с общим брокером
+        other = self.make_layer()
+        try:
+            await other.send('test-channel-1', {'type': 'test.message', 'text': 'cross'})
+            message = await self.layer.receive('test-channel-1')
+            self.assertEqual(message['text'], 'cross')
+        finally:
+            await other.close()
+
+    async def test_multi_send_receive(self):
+        for number in range(3):
+            await self.layer.send('test-channel-3', {'type': f'message.{number}'})
+        received = [await self.layer.receive('test-channel-3') for _ in range(3)]
+        self.assertEqual([message['type'] for message in received], ['message.0', 'message.1', 'message.2'])
+
+    async def test_receive_waits_for_send(self):
+        receiver = asyncio.create_task(self.layer.receive('test-channel-wait'))
+        await asyncio.sleep(0.05)
+        self.assertFalse(receiver.done())
+        await self.layer.send('test-channel-wait', {'type': 'late'})
+        self.assertEqual((await asyncio.wait_for(receiver, 1))['type'], 'late')
+
+    async def test_send_capacity(self):
+        for _ in range(3):
+            await self.layer.send('test-channel-1', {'type': 'test.message'})
+        with self.assertRaises(ChannelFull):
+            await self.layer.send('test-channel-1', {'type': 'test.message'})
+
+    async def test_receive_cancel_keeps_message(self):
+        receiver = asyncio.create_task(self.layer.receive('test-channel-cancel'))
+        await asyncio.sleep(0.05)
+        receiver.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await receiver
+        await self.layer.send('test-channel-cancel', {'type': 'after.cancel'})
+        message = await asyncio.wait_for(self.layer.receive('test-channel-cancel'), 1)
+        self.assertEqual(message['type'], 'after.cancel')
+
+    async def test_new_channel(self):
+        channel = await self.layer.new_channel()
+        self.assertTrue(channel.startswith('specific.'))
+        self.assertIn('!', channel)
+        await self.layer.send(channel, {'type': 'test.message'})
+        self.assertEqual((await self.layer.receive(channel))['type'], 'test.message')
+
+    async def test_invalid_names(self):
+        with self.assertRaises(TypeError):
+            await self.layer.send('bad channel name', {'type': 'test.message'})
+        with self.assertRaises(TypeError):
+            await self.layer.group_add('bad group name', 'test-channel-1')
+
+
+class GroupTests(IPCLayerTestCase):
+    async def test_groups_basic(self):
+        await self.layer.group_add('test-group', 'test-gr-chan-1')
+        await self.layer.group_add('test-group', 'test-gr-chan-2')
+        await self.layer.group_add('test-group', 'test-gr-chan-3')
+        await self.layer.group_discard('test-group', 'test-gr-chan-2')
+        await self.layer.group_send('test-group', {'type': 'message.1'})
+        self.assertEqual((await self.layer.receive('test-gr-chan-1'))['type'], 'message.1')
+        self.assertEqual((await self.layer.receive('test-gr-chan-3'))['type'], 'message.1')
+        await self.assertNothingReceived('test-gr-chan-2')
+
+    async def test_groups_channel_full(self):
+        await self.layer.group_add('test-group', 'test-gr-chan-1')
+        # Переполненный канал группы пропускается без ошибки
+        for _ in range(5):
+            await self.layer.group_send('test-group', {'type': 'message.1'})
+        for _ in range(3):
+            await self.layer.receive('test-gr-chan-1')
+        await self.assertNothingReceived('test-gr-chan-1')
+
+    async def test_group_send_empty_group(self):
+        await self.layer.group_send('test-empty-group', {'type': 'message.1'})
+
+
+class ExpiryTests(IPCLayerTestCase):
+    broker_config = {'expiry': 0.1, 'group_expiry': 1, 'capacity': 3}
+
+    async def test_expiry_single(self):
+        await self.layer.send('test-channel-1', {'type': 'message.1'})
+        await asyncio.sleep(0.2)
+        await self.assertNothingReceived('test-channel-1')
+
+    async def test_expiry_unread_leaves_group(self):
+        await self.layer.group_add('test-group', 'test-gr-chan-1')
+        await self.layer.group_send('test-group', {'type': 'message.1'})
+        await asyncio.sleep(0.2)
+        await self.assertNothingReceived('test-gr-chan-1')
+        # Канал с просроченным сообщением выбывает из группы
+        await self.layer.group_send('test-group', {'type': 'message.2'})
+        await self.assertNothingReceived('test-gr-chan-1')
+
+    async def test_group_expiry(self):
+        await self.layer.group_add('test-group', 'test-gr-chan-1')
+        await asyncio.sleep(2.1)
+        await self.layer.group_send('test-group', {'type': 'message.1'})
+        await self.assertNothingReceived('test-gr-chan-1')
+
+
+class FlushTests(IPCLayerTestCase):
+    async def test_flush(self):
+        await self.layer.send('test-channel-1', {'type': 'message.1'})
+        await self.layer.group_add('test-group', 'test-gr-chan-1')
+        await self.layer.flush()
+        await self.assertNothingReceived('test-channel-1')
+        await self.layer.group_send('test-group', {'type': 'message.2'})
+        await self.assertNothingReceived('test-gr-chan-1')
+
+
+class SocketTests(IPCLayerTestCase):
+    async def test_socket_is_private(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+
+class OutboxTests(IPCLayerTestCase):
+    envelope = {'type': 'game_message'}
+
+    async def test_position_before_publish(self):
+        self.assertEqual((await self.layer.outbox_position('1'))[0], 0)
+        for number in range(3):
+            await self.layer.outbox_publish('game_1', '1', {'action': f'move.{number}'}, 8, self.envelope)
+        _, epoch = await self.layer.outbox_position('1')
+        self.assertEqual(len(await self.layer.outbox_since('1', 0, epoch)), 3)
+
+    async def test_publish_stamps_and_delivers(self):
+        await self.layer.group_add('game_1', 'test-gr-chan-1')
+        envelope = {**self.envelope, 'id': 'abc:1'}
+        stamped = await self.layer.outbox_publish('game_1', '1', {'action': 'move'}, 8, envelope)
+        self.assertEqual(stamped['seq'], 1)
+        event = await self.layer.receive('test-gr-chan-1')
+        self.assertEqual(event['type'], 'game_message')
+        # id конверта доходит до consumer'а - по нему отсекаются копии
+        self.assertEqual(event['id'], 'abc:1')
+        self.assertEqual(event['message'], stamped)
+
+    async def test_resume_on_another_process(self):
+        # Сообщения опубликовал один процесс, сокет переподключился к другому
+        other = self.make_layer()
+        try:
+            for number in range(3):
+                await self.layer.outbox_publish('game_1', '1', {'action': f'move.{number}'}, 8, self.envelope)
+            seq, epoch = await other.outbox_position('1')
+            self.assertEqual(seq, 3)
+            missed = await other.outbox_since('1', 1, epoch)
+            self.assertEqual([message['action'] for message in missed], ['move.1', 'move.2'])
+            self.assertEqual(await other.outbox_since('1', 3, epoch), [])
+            self.assertIsNone(await other.outbox_since('1', 1, 'stale-epoch'))
+        finally:
+            await other.close()
+
+    async def test_buffer_overrun_needs_snapshot(self):
+        for number in range(5):
+            await self.layer.outbox_publish('game_1', '1', {'action': f'move.{number}'}, 2, self.envelope)
+        _, epoch = await self.layer.outbox_position('1')
+        self.assertIsNone(await self.layer.outbox_since('1', 1, epoch))
+        self.assertEqual(len(await self.layer.outbox_since('1', 3, epoch)), 2)
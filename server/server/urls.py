@@ -9,11 +9,12 @@ urlpatterns = [
     path('', game_views.lobby_view, name='lobby'),
     path('admin/', admin.site.urls),
 
-    path('login/', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
+    path('login/', player_views.login_view, name='login'),
     path('logout/', auth_views.LogoutView.as_view(next_page='login'), name='logout'),
     path('register/', player_views.register_view, name='register'),
 
     path('game/', include(('game.urls', 'game'), namespace='game')),
+    path('metrics', game_views.metrics_view, name='metrics'),
 
-    path('accounts/login/', auth_views.LoginView.as_view(template_name='registration/login.html'), name='account_login_duplicate_check'),
+    path('accounts/login/', player_views.login_view, name='account_login_duplicate_check'),
 ]
\ No newline at end of file
@@ -0,0 +1,158 @@
+// Отрисовка блока #room-state на клиенте из сообщений сокета (move_applied,
+// turn_timeout, room_updated, snapshot) - та же разметка, что у game_room.html,
+// без повторного запроса страницы. Карты приходят своими id ('10-hearts').
+
+const SUIT_SYMBOLS = { hearts: '♥', diamonds: '♦', clubs: '♣', spades: '♠' };
+
+function cardLabel(cardId) {
+    if (!cardId || cardId === 'back') {
+        return 'рубашка';
+    }
+    const [rank, suit] = cardId.split('-');
+    return rank + (SUIT_SYMBOLS[suit] || suit);
+}
+
+function el(tag, attrs = {}, ...children) {
+    const node = document.createElement(tag);
+    Object.entries(attrs).forEach(([name, value]) => node.setAttribute(name, value));
+    children.forEach((child) => {
+        if (child !== null && child !== undefined) {
+            node.append(child);
+        }
+    });
+    return node;
+}
+
+// То же, что тег {% card_sprite %}
+function cardSprite(cardId, cssClass, title = '') {
+    const id = cardId || 'back';
+    const label = cardLabel(id);
+    return el('span', {
+        class: `card-sprite card-${id} ${cssClass}`,
+        role: 'img',
+        'aria-label': label,
+        title: title + label,
+    });
+}
+
+function renderPlayers(room, state) {
+    const list = el('ul');
+    room.players.forEach((player) => {
+        let text = player.username;
+        if (state && player.id === state.attacker_id) text += ' (Атакует)';
+        if (state && player.id === state.defender_id) text += ' (Защищается)';
+        if (player.id === room.creator_id) text += ' (Создатель)';
+        list.append(el('li', {}, text));
+    });
+    return list;
+}
+
+function renderWaiting(room, options) {
+    const count = room.players.length;
+    const isCreator = room.creator_id === options.userId;
+    if (isCreator && count >= 2 && count <= room.max_players) {
+        return [el('form', { id: 'start-game-form', action: options.startGameUrl, method: 'POST', style: 'margin-bottom: 10px;' },
+            el('input', { type: 'hidden', name: 'csrfmiddlewaretoken', value: options.csrfToken() }),
+            el('button', { type: 'submit', class: 'btn' }, 'Начать игру'))];
+    }
+    const nodes = [el('p', {}, 'Ожидание игроков... ' + (count < 2 ? 'Нужно хотя бы 2 игрока.' : ''))];
+    if (!isCreator && count >= 2) {
+        nodes.push(el('p', {}, 'Создатель комнаты может начать игру.'));
+    }
+    return nodes;
+}
+
+function renderGame(state, options) {
+    const nodes = [];
+    const trump = el('p', {}, 'Козырь: ', el('strong', {}, (state.trump_suit || '').toUpperCase()));
+    if (state.trump_card_revealed) {
+        trump.append(' ', cardSprite(state.trump_card_revealed, 'game-card-image', 'Козырь: '));
+    }
+    nodes.push(trump, el('p', {}, `Карт в колоде: ${state.deck_count}`));
+    if (state.attacker_username) {
+        nodes.push(el('p', {}, 'Атакующий: ', el('strong', {}, state.attacker_username)));
+    }
+    if (state.defender_username) {
+        nodes.push(el('p', {}, 'Защищающийся: ', el('strong', {}, state.defender_username)));
+    }
+
+    nodes.push(el('h3', {}, 'Ваши карты:'));
+    const hand = el('div', { id: 'player-hand', class: 'player-hand-container' });
+    const me = state.players.find((player) => player.id === options.userId);
+    if (me) {
+        if (me.cards && me.cards.length) {
+            me.cards.forEach((cardId, index) => {
+                hand.append(el('div', { class: 'card-wrapper card-in-hand', 'data-hand-index': index },
+                    cardSprite(cardId, 'game-card-image')));
+            });
+        } else {
+            hand.append(el('p', {}, 'У вас нет карт.'));
+        }
+    }
+    nodes.push(hand);
+
+    nodes.push(el('h3', {}, 'Карты на столе:'));
+    const table = el('div', { id: 'game-table', class: 'game-table-container' });
+    if (state.table.length) {
+        state.table.forEach((pair) => {
+            const defense = el('div', { class: 'defense-card', style: 'margin-top: 5px;' });
+            if (pair.defense_card) {
+                defense.append('Защита: ', cardSprite(pair.defense_card, 'table-card-image', 'Защита: '));
+            } else {
+                defense.append('(не отбита)');
+            }
+            table.append(el('div', { class: 'table-pair card-wrapper' },
+                el('div', { class: 'attack-card' }, 'Атака: ', cardSprite(pair.attack_card, 'table-card-image', 'Атака: ')),
+                defense));
+        });
+    } else {
+        table.append(el('p', {}, 'Стол пуст.'));
+    }
+    nodes.push(table);
+
+    if (state.status === 'playing') {
+        const actions = el('div', { style: 'margin-top: 20px;' });
+        if (options.userId === state.attacker_id) {
+            actions.append(el('button', { id: 'action-pass-bito', class: 'btn' }, 'Пас / Бито'));
+        }
+        if (options.userId === state.defender_id) {
+            actions.append(el('button', { id: 'action-take', class: 'btn' }, 'Взять карты'));
+        }
+        nodes.push(actions);
+    }
+    return nodes;
+}
+
+function renderFinished(state) {
+    const nodes = [el('p', {}, el('strong', {}, 'Игра завершена!'))];
+    if (state && state.winner_username && state.winner_username !== 'Ничья') {
+        nodes.push(el('p', {}, `Победитель: ${state.winner_username}`));
+    } else if (state && state.winner_username === 'Ничья') {
+        nodes.push(el('p', {}, 'Результат: Ничья.'));
+    } else {
+        nodes.push(el('p', {}, 'Результаты игры обрабатываются.'));
+    }
+    return nodes;
+}
+
+// options: { userId, startGameUrl, csrfToken() }
+function renderRoomState(root, room, state, options) {
+    const nodes = [
+        el('p', {}, 'Статус комнаты: ', el('strong', {}, room.status_display)),
+        el('p', {}, `Ставка: ${room.bet_amount}`),
+        el('p', {}, `Игроки (${room.players.length}/${room.max_players}):`),
+        renderPlayers(room, state),
+    ];
+    if (room.status === 'waiting') {
+        nodes.push(...renderWaiting(room, options));
+    }
+    nodes.push(el('hr'), el('h2', {}, 'Состояние игры:'));
+    if (state && state.is_game_initialized && room.status === 'playing') {
+        nodes.push(...renderGame(state, options));
+    } else if (room.status === 'playing') {
+        nodes.push(el('p', {}, 'Загрузка состояния игры...'));
+    } else if (room.status === 'finished') {
+        nodes.push(...renderFinished(state));
+    }
+    root.replaceChildren(...nodes);
+}
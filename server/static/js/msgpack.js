@@ -0,0 +1,109 @@
+// Минимальный MessagePack для игрового сокета (подпротокол durak.msgpack.v1).
+// Поддерживает только то, что шлет сервер: nil, bool, int, float, str, bin, array, map.
+const MsgPack = (() => {
+    const textDecoder = new TextDecoder();
+    const textEncoder = new TextEncoder();
+
+    function decode(buffer) {
+        const view = new DataView(buffer);
+        const bytes = new Uint8Array(buffer);
+        let offset = 0;
+
+        function str(length) {
+            const value = textDecoder.decode(bytes.subarray(offset, offset + length));
+            offset += length;
+            return value;
+        }
+        function array(length) {
+            const result = new Array(length);
+            for (let i = 0; i < length; i++) result[i] = read();
+            return result;
+        }
+        function map(length) {
+            const result = {};
+            for (let i = 0; i < length; i++) {
+                const key = read();
+                result[key] = read();
+            }
+            return result;
+        }
+        function read() {
+            const type = bytes[offset++];
+            if (type <= 0x7f) return type;
+            if (type >= 0xe0) return type - 0x100;
+            if ((type & 0xf0) === 0x80) return map(type & 0x0f);
+            if ((type & 0xf0) === 0x90) return array(type & 0x0f);
+            if ((type & 0xe0) === 0xa0) return str(type & 0x1f);
+            let value;
+            switch (type) {
+                case 0xc0: return null;
+                case 0xc2: return false;
+                case 0xc3: return true;
+                case 0xc4: value = bytes[offset]; offset += 1 + value; return bytes.slice(offset - value, offset);
+                case 0xca: value = view.getFloat32(offset); offset += 4; return value;
+                case 0xcb: value = view.getFloat64(offset); offset += 8; return value;
+                case 0xcc: return bytes[offset++];
+                case 0xcd: value = view.getUint16(offset); offset += 2; return value;
+                case 0xce: value = view.getUint32(offset); offset += 4; return value;
+                case 0xcf: value = Number(view.getBigUint64(offset)); offset += 8; return value;
+                case 0xd0: value = view.getInt8(offset); offset += 1; return value;
+                case 0xd1: value = view.getInt16(offset); offset += 2; return value;
+                case 0xd2: value = view.getInt32(offset); offset += 4; return value;
+                case 0xd3: value = Number(view.getBigInt64(offset)); offset += 8; return value;
+                case 0xd9: value = bytes[offset]; offset += 1; return str(value);
+                case 0xda: value = view.getUint16(offset); offset += 2; return str(value);
+                case 0xdb: value = view.getUint32(offset); offset += 4; return str(value);
+                case 0xdc: value = view.getUint16(offset); offset += 2; return array(value);
+                case 0xdd: value = view.getUint32(offset); offset += 4; return array(value);
+                case 0xde: value = view.getUint16(offset); offset += 2; return map(value);
+                case 0xdf: value = view.getUint32(offset); offset += 4; return map(value);
+            }
+            throw new Error('MessagePack: неподдерживаемый тип 0x' + type.toString(16));
+        }
+        return read();
+    }
+
+    // Команды клиента маленькие: хватает fix/16/32-форм и float64
+    function encode(value) {
+        const out = [];
+        function uint(n, size) {
+            for (let shift = (size - 1) * 8; shift >= 0; shift -= 8) out.push((n / 2 ** shift) & 0xff);
+        }
+        function write(v) {
+            if (v === null || v === undefined) { out.push(0xc0); return; }
+            if (v === true) { out.push(0xc3); return; }
+            if (v === false) { out.push(0xc2); return; }
+            if (typeof v === 'number') {
+                if (Number.isInteger(v) && v >= 0 && v <= 0x7f) { out.push(v); return; }
+                if (Number.isInteger(v) && v < 0 && v >= -32) { out.push(v + 0x100); return; }
+                if (Number.isInteger(v) && v >= 0 && v <= 0xffffffff) { out.push(0xce); uint(v, 4); return; }
+                const buffer = new DataView(new ArrayBuffer(8));
+                buffer.setFloat64(0, v);
+                out.push(0xcb, ...new Uint8Array(buffer.buffer));
+                return;
+            }
+            if (typeof v === 'string') {
+                const bytes = textEncoder.encode(v);
+                if (bytes.length < 32) out.push(0xa0 | bytes.length);
+                else if (bytes.length <= 0xffff) { out.push(0xda); uint(bytes.length, 2); }
+                else { out.push(0xdb); uint(bytes.length, 4); }
+                out.push(...bytes);
+                return;
+            }
+            if (Array.isArray(v)) {
+                if (v.length < 16) out.push(0x90 | v.length);
+                else { out.push(0xdc); uint(v.length, 2); }
+                v.forEach(write);
+                return;
+            }
+            const keys = Object.keys(v);
+            if (keys.length < 16) out.push(0x80 | keys.length);
+            else { out.push(0xde); uint(keys.length, 2); }
+            keys.forEach((key) => { write(key); write(v[key]); });
+        }
+        write(value);
+        return new Uint8Array(out);
+    }
+
+    return { decode, encode };
+})();
@@ -1,31 +1,130 @@
 class GameConnection {
-    constructor(roomId) {
+    // onMessage(data) получает каждое сообщение комнаты один раз и по порядку seq
+    constructor(roomId, onMessage = null) {
+        this.roomId = roomId;
+        this.onMessage = onMessage;
+        // Последнее увиденное сообщение комнаты: по нему сервер досылает пропущенное
+        this.lastSeq = 0;
+        this.epoch = null;
+        this.reconnectDelay = 500;
+        // Таблицы бинарного подпротокола приходят в 'hello' (см. game/wire.py)
+        this.keyTable = null;
+        this.shortKeys = null;
+        this.cardTable = null;
+        this.connect();
+    }
+
+    connect() {
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        // MessagePack, если подключен msgpack.js; сервер может выбрать JSON
+        const protocols = typeof MsgPack !== 'undefined' ? ['durak.msgpack.v1', 'durak.json'] : [];
         this.socket = new WebSocket(
-            `ws://${window.location.host}/ws/game/${roomId}/`
+            `${scheme}://${window.location.host}/ws/game/${this.roomId}/`,
+            protocols
         );
-        
+        this.socket.binaryType = 'arraybuffer';
+
+        this.socket.onopen = () => {
+            this.reconnectDelay = 500;
+            if (this.epoch !== null) {
+                this.sendAction('resume', { last_seq: this.lastSeq, epoch: this.epoch });
+            }
+        };
+
         this.socket.onmessage = (e) => {
-            const data = JSON.parse(e.data);
-            this.handleMessage(data);
+            const data = typeof e.data === 'string' ? JSON.parse(e.data) : this.decodeBinary(e.data);
+            this.receive(data);
+        };
+
+        this.socket.onclose = () => {
+            // Мобильные клиенты теряют сокет постоянно: переподключаемся с нарастающей паузой
+            setTimeout(() => this.connect(), this.reconnectDelay);
+            this.reconnectDelay = Math.min(this.reconnectDelay * 2, 10000);
         };
     }
 
+    decodeBinary(buffer) {
+        const raw = MsgPack.decode(buffer);
+        if (raw.key_table) {
+            this.keyTable = raw.key_table;
+            this.cardTable = raw.card_table;
+            this.shortKeys = {};
+            Object.entries(this.keyTable).forEach(([short, long]) => { this.shortKeys[long] = short; });
+            delete raw.key_table;
+            delete raw.card_table;
+        }
+        return this.expand(raw);
+    }
+
+    // Короткие ключи -> длинные, номера карт -> id ('10-hearts')
+    expand(value, cardField = false) {
+        if (Array.isArray(value)) {
+            return value.map((item) => this.expand(item, cardField));
+        }
+        if (cardField && typeof value === 'number') {
+            return this.cardTable[value];
+        }
+        if (value === null || typeof value !== 'object') {
+            return value;
+        }
+        const result = {};
+        Object.entries(value).forEach(([key, item]) => {
+            const long = this.keyTable[key] || key;
+            result[long] = this.expand(item, GameConnection.CARD_FIELDS.has(long));
+        });
+        return result;
+    }
+
+    compact(data) {
+        const result = {};
+        Object.entries(data).forEach(([key, value]) => {
+            result[this.shortKeys[key] || key] = value;
+        });
+        return result;
+    }
+
+    receive(data) {
+        if (data.action === 'batch') {
+            // Сервер склеивает события одного тика в один кадр
+            data.messages.forEach((message) => this.receive(message));
+            return;
+        }
+        if (data.action === 'resync') {
+            // Сервер сбросил нашу очередь: догоняемся с последнего seq
+            this.sendAction('resume', { last_seq: this.lastSeq, epoch: this.epoch });
+            return;
+        }
+        if (data.action === 'hello') {
+            if (this.epoch === null) {
+                this.epoch = data.epoch;
+                this.lastSeq = data.seq;
+            }
+            return;
+        }
+        if (data.seq !== undefined) {
+            if (data.epoch === this.epoch && data.seq <= this.lastSeq) {
+                return; // дубликат после resume
+            }
+            this.lastSeq = data.seq;
+            this.epoch = data.epoch;
+        }
+        this.handleMessage(data);
+    }
+
     handleMessage(data) {
-        switch(data.action) {
-            case 'game_state':
-                this.updateGameState(data.state);
-                break;
-            case 'player_joined':
-                this.notifyPlayerJoined(data.player);
-                break;
-            // ... другие обработчики
+        if (this.onMessage) {
+            this.onMessage(data);
         }
     }
 
     sendAction(action, data = {}) {
-        this.socket.send(JSON.stringify({
-            action,
-            ...data
-        }));
+        const message = { action, ...data };
+        if (this.socket.protocol === 'durak.msgpack.v1' && this.shortKeys) {
+            this.socket.send(MsgPack.encode(this.compact(message)));
+        } else {
+            this.socket.send(JSON.stringify(message));
+        }
     }
-}
\ No newline at end of file
+}
+
+GameConnection.CARD_FIELDS = new Set(['cards', 'attack_card', 'defense_card', 'trump_card_revealed']);